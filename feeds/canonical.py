@@ -0,0 +1,128 @@
+'''Canonical form of shared urls, so that every share of an article
+points to a single UrlContent which is fetched once.
+
+Rules are settings: CANONICAL_HOST_ALIASES maps hosts(like mobile
+sites) to the host they mirror, CANONICAL_STRIP_HOST_PREFIXES are
+dropped from the start of hosts and query parameters matching
+CANONICAL_DROP_PARAMS(fnmatch patterns, like utm_*) are removed.
+Statuses on Twitter are keyed by their id, whoever the url names as
+the author. Urls of SHORTENER_HOSTS are resolved to where they
+redirect, once, and cached for REDIRECT_CACHE_TTL seconds.
+
+'''
+from fnmatch import fnmatchcase
+import re
+from urllib import parse
+
+from django.conf import settings
+from django.db import transaction
+import requests
+
+from feeds.models import UrlContent, UrlShared
+from feeds.utils import get_redis
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TWITTER_STATUS_RE = re.compile(r'^https?://(?:www\.|mobile\.)?twitter\.com/[^/]+/status(?:es)?/(\d+)', re.IGNORECASE)
+
+
+def clean_url(url, host_rules=False):
+    '''`url` without fragment, default port and query parameters of
+    CANONICAL_DROP_PARAMS, with hosts rewritten as well when
+    `host_rules` is set.'''
+    parsed_url = parse.urlsplit(url.strip())
+    scheme = parsed_url.scheme.lower()
+    host = (parsed_url.hostname or '').lower()
+    if host_rules:
+        host = settings.CANONICAL_HOST_ALIASES.get(host, host)
+        for prefix in settings.CANONICAL_STRIP_HOST_PREFIXES:
+            if host.startswith(prefix) and host.count('.') > 1:
+                host = host[len(prefix):]
+                break
+    if parsed_url.port and parsed_url.port != DEFAULT_PORTS.get(scheme):
+        host = '%s:%s' % (host, parsed_url.port)
+    query = [(key, value) for key, value in parse.parse_qsl(parsed_url.query, keep_blank_values=True)
+             if not any(fnmatchcase(key.lower(), pattern) for pattern in settings.CANONICAL_DROP_PARAMS)]
+    return parse.urlunsplit((scheme, host, parsed_url.path or '/', parse.urlencode(sorted(query)), ''))
+
+
+def get_status_id(url):
+    '''Id of the status `url` points to on Twitter, None for other
+    urls.'''
+    match = TWITTER_STATUS_RE.match(url)
+    return match.group(1) if match else None
+
+
+def canonicalize(url):
+    status_id = get_status_id(url)
+    if status_id:
+        return 'https://twitter.com/i/status/%s' % status_id
+    return clean_url(url, host_rules=True)
+
+
+def is_shortened(url):
+    return parse.urlsplit(url).hostname in settings.SHORTENER_HOSTS
+
+
+def redirect_key(url):
+    return 'redirect:%s' % url
+
+
+def fit_canonical(url, canonical_url):
+    '''`canonical_url`, or `url` itself when the canonical url is too
+    long to be stored.'''
+    if len(canonical_url) > UrlContent._meta.get_field('canonical_url').max_length:
+        return url
+    return canonical_url
+
+
+def canonical_urls(urls):
+    '''Map `urls` to their canonical urls, shortened ones to where they
+    are known to redirect.'''
+    canonical = {url: fit_canonical(url, canonicalize(url)) for url in urls}
+    shortened = sorted({url for url in canonical.values() if is_shortened(url)})
+    if shortened:
+        resolved = dict(zip(shortened, get_redis().mget([redirect_key(url) for url in shortened])))
+        for url, canonical_url in canonical.items():
+            if resolved.get(canonical_url):
+                canonical[url] = resolved[canonical_url].decode('utf-8')
+    return canonical
+
+
+def resolve(url):
+    '''Where shortened `url` redirects to, None if it can't be
+    resolved.'''
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=settings.REDIRECT_TIMEOUT)
+    except requests.RequestException as e:
+        print('Not able to resolve url: %s for %s' % (url, e))
+        return None
+    if len(response.url) > UrlContent._meta.get_field('url').max_length:
+        return None
+    return response.url
+
+
+def resolve_content(content):
+    '''Move shares of a shortened url `content` to the UrlContent of
+    where it redirects, remembering the redirect. Returns the
+    UrlContent shares now point to.
+
+    `content` is locked first, so shares being stored by ingests which
+    picked it already are committed, and moved, before the move. It is
+    kept without shares rather than deleted, shares stored by an ingest
+    which picked it just before the move would otherwise be deleted
+    along with it, or fail the ingest.
+
+    '''
+    resolved_url = resolve(content.url)
+    if resolved_url is None:
+        return content
+    canonical_url = fit_canonical(resolved_url, canonicalize(resolved_url))
+    if canonical_url == content.canonical_url:
+        return content
+    get_redis().set(redirect_key(content.canonical_url), canonical_url, ex=settings.REDIRECT_CACHE_TTL)
+    with transaction.atomic():
+        UrlContent.objects.select_for_update().filter(uuid=content.uuid).exists()
+        resolved, created = UrlContent.objects.get_or_create(canonical_url=canonical_url,
+                                                             defaults={'url': resolved_url})
+        UrlShared.objects.filter(content=content).update(content=resolved)
+    return resolved
@@ -0,0 +1,83 @@
+'''Store of extracted articles, see ContentBlob.
+
+Html and text of an article are zlib compressed and keyed by their
+sha256, so content shared under many urls, or fetched again unchanged,
+is kept once. UrlContent points to its blob and reads it only when
+cleaned_text or text_content are accessed. Blobs no content points to
+any more, like previous versions of articles fetched again, are
+deleted by collect.
+
+'''
+from datetime import timedelta
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from feeds.ingest import bulk_insert_ignore
+from feeds.models import ContentBlob, UrlContent
+from feeds.sanitize import sanitize
+
+
+def get_digest(html, text):
+    digest = hashlib.sha256(html.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compress(value):
+    return zlib.compress(value.encode('utf-8'), settings.CONTENT_COMPRESS_LEVEL)
+
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode('utf-8') if data else ''
+
+
+def store(html, text=''):
+    '''Digest of the ContentBlob of `html` and `text`, sanitized, which
+    gets inserted unless it is stored already. None if there is nothing
+    to store.'''
+    html = sanitize(html)
+    text = sanitize(text)
+    if not html and not text:
+        return None
+    digest = get_digest(html, text)
+    blob = ContentBlob(digest=digest, html=compress(html), text=compress(text),
+                       size=len(html) + len(text), sanitized=True)
+    # A blob stored already is touched so that collect leaves it to the
+    # content about to point to it, and stored again if collect just
+    # deleted it
+    while not bulk_insert_ignore(ContentBlob, [blob], ('digest',)):
+        if ContentBlob.objects.filter(digest=digest).update(stored=timezone.now()):
+            break
+    return digest
+
+
+COLLECT_SQL = '''
+DELETE FROM {blob} WHERE digest IN (
+    SELECT digest FROM {blob} blob
+    WHERE blob.stored < %s AND NOT EXISTS (SELECT 1 FROM {content} content WHERE content.blob_id = blob.digest)
+    LIMIT %s
+) AND stored < %s
+'''
+
+
+def collect():
+    '''Delete blobs no UrlContent points to, stored more than
+    CONTENT_GC_GRACE seconds ago, CONTENT_GC_BATCH at a time. Returns
+    number of blobs deleted.'''
+    before = timezone.now() - timedelta(seconds=settings.CONTENT_GC_GRACE)
+    sql = COLLECT_SQL.format(blob=ContentBlob._meta.db_table, content=UrlContent._meta.db_table)
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            # stored is checked again on the row being deleted, a blob
+            # stored meanwhile is kept
+            cursor.execute(sql, [before, settings.CONTENT_GC_BATCH, before])
+            count = cursor.rowcount
+        deleted += count
+        if count < settings.CONTENT_GC_BATCH:
+            return deleted
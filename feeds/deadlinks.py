@@ -0,0 +1,69 @@
+'''Failure tracking of link fetches per host, shared by all workers
+through Redis.
+
+Every fetch of a host is counted along with its failures and the
+seconds they took, so `get_stats` tells which hosts waste worker time.
+A host failing(see politeness.is_host_failure) HOST_DEAD_AFTER times
+in a row is considered dead for HOST_DEAD_TTL seconds and its links
+aren't fetched meanwhile. Failures of single links are tracked on
+UrlContent, see feeds.fetchstate.
+
+'''
+from django.conf import settings
+
+from feeds.utils import get_redis
+
+FAILURES_KEY = 'linkstats:failures'
+WASTED_KEY = 'linkstats:wasted'
+
+
+def stats_key(host):
+    return 'linkstats:%s' % host
+
+
+def dead_key(host):
+    return 'deadhost:%s' % host
+
+
+def record(host, seconds, failed=False, host_failure=False):
+    '''Count a fetch of `host` which took `seconds`.'''
+    redis = get_redis()
+    key = stats_key(host)
+    pipe = redis.pipeline()
+    pipe.hincrby(key, 'fetches', 1)
+    if failed:
+        pipe.hincrby(key, 'failures', 1)
+        pipe.hincrbyfloat(key, 'failed_seconds', seconds)
+        pipe.zincrby(FAILURES_KEY, host, 1)
+        pipe.zincrby(WASTED_KEY, host, seconds)
+    if not host_failure:
+        pipe.hset(key, 'consecutive', 0)
+    pipe.expire(key, settings.LINK_STATS_TTL)
+    # Only the worst LINK_STATS_HOSTS hosts are ranked
+    pipe.zremrangebyrank(FAILURES_KEY, 0, -settings.LINK_STATS_HOSTS - 1)
+    pipe.zremrangebyrank(WASTED_KEY, 0, -settings.LINK_STATS_HOSTS - 1)
+    pipe.execute()
+    if host_failure and redis.hincrby(key, 'consecutive', 1) >= settings.HOST_DEAD_AFTER:
+        redis.set(dead_key(host), 1, ex=settings.HOST_DEAD_TTL)
+
+
+def dead_for(host):
+    '''Seconds for which `host` stays dead, 0 if it isn't.'''
+    return max(0, get_redis().ttl(dead_key(host)) or 0)
+
+
+def get_stats(limit=20, by=WASTED_KEY):
+    '''Hosts which wasted most time on failures(or failed most with
+    `by` FAILURES_KEY), with their counts.'''
+    redis = get_redis()
+    stats = []
+    for host, score in redis.zrevrange(by, 0, limit - 1, withscores=True):
+        host = host.decode('utf-8')
+        counts = {key.decode('utf-8'): float(value) for key, value in redis.hgetall(stats_key(host)).items()}
+        stats.append({'host': host,
+                      'fetches': int(counts.get('fetches', 0)),
+                      'failures': int(counts.get('failures', 0)),
+                      'failed_seconds': counts.get('failed_seconds', 0),
+                      'consecutive': int(counts.get('consecutive', 0)),
+                      'dead_for': dead_for(host)})
+    return stats
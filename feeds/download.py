@@ -0,0 +1,133 @@
+'''Download of links for extraction. Bodies are streamed, at most
+LINK_MAX_BYTES of them, and the type of the resource is decided from
+Content-Type and the first bytes before reading further, so that
+workers never hold PDFs, images, videos or huge pages in memory.
+
+'''
+import hashlib
+import posixpath
+from urllib import parse
+
+from django.conf import settings
+
+EXTRACTABLE_TYPES = ('text/html', 'application/xhtml+xml')
+# Types which don't tell what the body is
+UNTOLD_TYPES = ('', 'text/plain', 'application/octet-stream', 'binary/octet-stream')
+MAGIC_BYTES = [(b'%PDF', 'application/pdf'),
+               (b'\x89PNG', 'image/png'),
+               (b'GIF8', 'image/gif'),
+               (b'\xff\xd8\xff', 'image/jpeg'),
+               (b'RIFF', 'application/octet-stream'),
+               (b'ID3', 'audio/mpeg'),
+               (b'PK\x03\x04', 'application/zip'),
+               (b'\x1f\x8b', 'application/gzip'),
+               (b'\x1aE\xdf\xa3', 'video/webm')]
+CHUNK_SIZE = 16 * 1024
+
+
+class Page(object):
+    def __init__(self, url, status_code, headers, content_type, size, body=None, too_large=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content_type = content_type
+        self.size = size
+        self.body = body
+        self.too_large = too_large
+
+    @property
+    def extractable(self):
+        return self.body is not None
+
+    @property
+    def text(self):
+        charset = parse_content_type(self.headers.get('content-type', ''))[1]
+        try:
+            return self.body.decode(charset or 'utf-8', 'replace')
+        except LookupError:
+            return self.body.decode('utf-8', 'replace')
+
+    def digest(self):
+        '''sha1 of the body, or of what is known of resources which
+        weren't downloaded.'''
+        if self.extractable:
+            return hashlib.sha1(self.body).hexdigest()
+        return hashlib.sha1(('%s:%s' % (self.content_type, self.size)).encode('utf-8')).hexdigest()
+
+    def get_metadata(self):
+        '''url_json of resources which aren't extracted.'''
+        title = posixpath.basename(parse.unquote(parse.urlsplit(self.url).path.rstrip('/'))) or self.url
+        return {'title': title,
+                'type': self.content_type,
+                'size': self.size,
+                'excerpt': '', 'byline': ''}
+
+
+def parse_content_type(header):
+    '''Type and charset of a Content-Type header.'''
+    parts = [part.strip() for part in header.split(';')]
+    charset = None
+    for part in parts[1:]:
+        if part.lower().startswith('charset='):
+            charset = part[len('charset='):].strip('"\'') or None
+    return parts[0].lower(), charset
+
+
+def parse_content_length(header):
+    '''Size given by a Content-Length header, None if it is missing or
+    malformed.'''
+    try:
+        size = int(header or 0)
+    except ValueError:
+        return None
+    return size if size > 0 else None
+
+
+def sniff(head):
+    '''Type of a body starting with `head`, None if it isn't known.'''
+    for magic, content_type in MAGIC_BYTES:
+        if head.startswith(magic):
+            return content_type
+    if head[4:8] == b'ftyp':
+        return 'video/mp4'
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:256].lower()
+    if start.startswith((b'<!doctype html', b'<html', b'<head', b'<body')) or b'<html' in start:
+        return 'text/html'
+    return None
+
+
+def download(session, url, headers=None):
+    '''GET `url` streaming at most LINK_MAX_BYTES of its body, returns a
+    Page whose body is None unless it can be extracted. Raises
+    requests.RequestException on failure.'''
+    response = session.get(url, headers=headers or {}, timeout=settings.LINK_FETCH_TIMEOUT, stream=True)
+    try:
+        response.raise_for_status()
+        content_type = parse_content_type(response.headers.get('content-type', ''))[0]
+        size = parse_content_length(response.headers.get('content-length'))
+        page = Page(response.url, response.status_code, response.headers, content_type, size)
+        if response.status_code == 304 or (content_type not in EXTRACTABLE_TYPES + UNTOLD_TYPES):
+            return page
+        if size and size > settings.LINK_MAX_BYTES:
+            page.too_large = True
+            return page
+        body = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if not body:
+                sniffed = sniff(chunk)
+                if sniffed and sniffed not in EXTRACTABLE_TYPES:
+                    page.content_type = sniffed
+                    return page
+                if content_type in UNTOLD_TYPES:
+                    if sniffed is None:
+                        return page
+                    page.content_type = sniffed
+            body.extend(chunk)
+            if len(body) > settings.LINK_MAX_BYTES:
+                page.too_large = True
+                return page
+        page.size = len(body)
+        page.body = bytes(body) or None
+        return page
+    finally:
+        response.close()
@@ -0,0 +1,157 @@
+'''Readable content of links through a pool of warm node workers
+(EXTRACT_WORKER_COMMAND, running feeds/static/js/extract_worker.js)
+so that a link costs its fetch and not startup of node, jsdom and
+readability.
+
+Workers speak json lines over stdin/stdout. Each one is used by a
+single caller at a time, at most EXTRACT_WORKERS of them per process.
+Workers idle for longer than EXTRACT_PING_INTERVAL are pinged before
+being used again and are replaced when they die, time out, grow past
+EXTRACT_WORKER_MAX_RSS bytes or served EXTRACT_WORKER_MAX_JOBS
+requests.
+
+'''
+import json
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+_pool = None
+_pool_pid = None
+
+
+class ExtractError(Exception):
+    pass
+
+
+class Worker(object):
+    def __init__(self):
+        self.process = subprocess.Popen(settings.EXTRACT_WORKER_COMMAND,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.buffer = b''
+        self.jobs = 0
+        self.rss = 0
+        self.last_used = time.time()
+
+    def request(self, message, timeout):
+        '''Send `message` and wait at most `timeout` seconds for its
+        response.'''
+        message = dict(message, id=uuid.uuid4().hex)
+        self.last_used = time.time()
+        self.process.stdin.write((json.dumps(message) + '\n').encode('utf-8'))
+        self.process.stdin.flush()
+        deadline = time.time() + timeout
+        while True:
+            response = json.loads(self.readline(deadline).decode('utf-8'))
+            if response.get('id') == message['id']:
+                break
+        self.jobs += 1
+        self.rss = response.get('rss', 0)
+        self.last_used = time.time()
+        return response
+
+    def readline(self, deadline):
+        stdout = self.process.stdout.fileno()
+        while b'\n' not in self.buffer:
+            timeout = deadline - time.time()
+            if timeout <= 0 or not select.select([stdout], [], [], timeout)[0]:
+                raise ExtractError('Worker timed out')
+            chunk = os.read(stdout, 64 * 1024)
+            if not chunk:
+                raise ExtractError('Worker exited with %s' % self.process.poll())
+            self.buffer += chunk
+        line, self.buffer = self.buffer.split(b'\n', 1)
+        return line
+
+    def ping(self):
+        try:
+            self.request({'ping': True}, settings.EXTRACT_PING_TIMEOUT)
+        except (ExtractError, OSError, ValueError):
+            return False
+        return True
+
+    def is_healthy(self):
+        return (self.process.poll() is None
+                and self.rss < settings.EXTRACT_WORKER_MAX_RSS
+                and self.jobs < settings.EXTRACT_WORKER_MAX_JOBS)
+
+    def stop(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+
+class ExtractorPool(object):
+    def __init__(self, size=None):
+        self.size = size or settings.EXTRACT_WORKERS
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.idle = queue.LifoQueue()
+
+    def checkout(self):
+        try:
+            worker = self.idle.get_nowait()
+        except queue.Empty:
+            return Worker()
+        if time.time() - worker.last_used > settings.EXTRACT_PING_INTERVAL and not worker.ping():
+            worker.stop()
+            return Worker()
+        return worker
+
+    def checkin(self, worker):
+        if worker.is_healthy():
+            self.idle.put(worker)
+        else:
+            worker.stop()
+
+    def extract(self, url, html=None, timeout=None):
+        '''Readability article(dict with title, content, textContent,
+        excerpt and byline) of `html`, or of `url` when html isn't
+        given, None when readability finds nothing.
+
+        Raises ExtractError when the page can't be extracted.
+
+        '''
+        with self.slots:
+            worker = self.checkout()
+            try:
+                response = worker.request({'url': url, 'html': html},
+                                          timeout or settings.EXTRACT_TIMEOUT)
+            except (ExtractError, OSError, ValueError) as e:
+                worker.stop()
+                raise ExtractError('Extracting %s failed: %s' % (url, e))
+            self.checkin(worker)
+        if response.get('error'):
+            raise ExtractError('Extracting %s failed: %s' % (url, response['error']))
+        return response.get('article')
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+def get_pool():
+    '''ExtractorPool of the current process, a forked celery worker
+    starts its own.'''
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ExtractorPool()
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def extract(url, html=None, timeout=None):
+    return get_pool().extract(url, html, timeout)
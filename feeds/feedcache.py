@@ -0,0 +1,180 @@
+'''Incremental Atom feeds of links shared by accounts a user follows.
+
+A feed is put together from rendered <entry> fragments, one for every
+cluster of near-duplicate links(see feeds.neardup). Fragments are
+cached in Redis under the latest link of the cluster and a version of
+its links, sharers and content, so they are rendered again only when
+one of them changes.
+
+Every feed keeps in Redis the entries it is made of, scored by their
+publish time, and when, and for which followed accounts, it was last
+built. A build queries(see feeds.feedquery) and renders only the
+clusters of links added or shared again, or whose content got fetched,
+since then(less FEED_CHANGE_SLACK, so links committed after a build
+which timestamped them before it aren't missed), drops entries older than FEED_WINDOW and writes the document out of
+the fragments.
+
+'''
+from datetime import datetime, timedelta
+import hashlib
+import io
+import os
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from feeds import feedquery
+from feeds.contentstore import decompress
+from feeds.models import UrlShared
+from feeds.sanitize import sanitize
+from feeds.utils import get_redis
+from feeds.xmlwriter import AtomWriter
+
+
+def entries_key(uuid):
+    return 'feed:%s:entries' % uuid
+
+
+def fragments_key(uuid):
+    return 'feed:%s:fragments' % uuid
+
+
+def built_key(uuid):
+    return 'feed:%s:built' % uuid
+
+
+def fragment_key(entry):
+    '''Key of the rendered `entry`(feedquery.Entry), under its latest
+    link and a digest of what it is rendered from.'''
+    version = hashlib.sha1('\0'.join([entry.links, str(entry.blob_id), entry.sharers]).encode('utf-8')).hexdigest()
+    return 'feedentry:%s:%s' % (entry.link, version)
+
+
+def render_entry(entry):
+    quoted_text = entry.quoted_text if entry.sanitized else sanitize(entry.quoted_text)
+    cleaned_text = decompress(entry.html)
+    if entry.blob_id and not entry.html_sanitized:
+        # Stored before text got sanitized on the way in
+        cleaned_text = sanitize(cleaned_text)
+    content = 'Quote: ' + quoted_text + '<br/>' + cleaned_text
+    fragment = io.BytesIO()
+    writer = AtomWriter(fragment)
+    writer.entry(entry.url, entry.url, entry.published, entry.sharers, content)
+    writer.end_document()
+    return fragment.getvalue()
+
+
+def get_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_changed(links, since):
+    '''Clusters of `links` with links added, or content fetched, after
+    `since`. Content which moved to another cluster changes its
+    previous one(itself) as well.'''
+    clusters = set()
+    for content, cluster in links.filter(Q(added__gte=since) | Q(content__fetch_updated__gte=since)).values_list(
+            'content', 'content__cluster'):
+        clusters.add(str(content))
+        if cluster:
+            clusters.add(str(cluster))
+    return clusters
+
+
+def update(auth_token, accounts, now=None):
+    '''Bring cached entries of the feed of `auth_token` up to date with
+    links shared by `accounts`. Returns number of entries rendered.'''
+    redis = get_redis()
+    uuid = auth_token.uuid
+    now = now or timezone.now()
+    since = now - timedelta(seconds=settings.FEED_WINDOW)
+    account_uuids = sorted(str(account.uuid) for account in accounts)
+    # Feed is built from scratch when followed accounts change
+    following = hashlib.sha1(','.join(account_uuids).encode('utf-8')).hexdigest()
+    built = (redis.get(built_key(uuid)) or b'').decode('utf-8').split(':')
+    changed = None
+    if len(built) == 2 and built[1] == following:
+        links = UrlShared.objects.filter(shared_from__in=account_uuids, url_shared__gte=since)
+        built_at = datetime.fromtimestamp(float(built[0]), timezone.utc)
+        changed = get_changed(links, built_at - timedelta(seconds=settings.FEED_CHANGE_SLACK))
+    rendered = 0
+    pipe = redis.pipeline()
+    if changed is None:
+        pipe.delete(entries_key(uuid), fragments_key(uuid))
+    entries = set()
+    if changed is None or changed:
+        for chunk in get_chunks(feedquery.get_entries(account_uuids, since, changed), settings.FEED_CURSOR_ITERSIZE):
+            keys = [fragment_key(entry) for entry in chunk]
+            cached = redis.pipeline()
+            for key in keys:
+                cached.exists(key)
+            for entry, key, exists in zip(chunk, keys, cached.execute()):
+                entries.add(entry.entry)
+                if not exists:
+                    pipe.set(key, render_entry(entry), ex=settings.FEED_WINDOW + settings.FEED_FRAGMENT_SLACK)
+                    rendered += 1
+                pipe.zadd(entries_key(uuid), entry.published.timestamp(), entry.entry)
+                pipe.hset(fragments_key(uuid), entry.entry, key)
+    # Changed clusters left without links of their own and ones out of
+    # the window are gone
+    gone = set(changed or ())
+    gone.update(entry.decode('utf-8') for entry in redis.zrangebyscore(
+        entries_key(uuid), '-inf', '(%f' % since.timestamp()))
+    gone -= entries
+    if gone:
+        pipe.zrem(entries_key(uuid), *gone)
+        pipe.hdel(fragments_key(uuid), *gone)
+    pipe.set(built_key(uuid), '%f:%s' % (now.timestamp(), following), ex=settings.FEED_WINDOW)
+    pipe.execute()
+    return rendered
+
+
+def write(auth_token, path, now=None):
+    '''Write the feed of `auth_token` out of its cached entries, newest
+    first. Returns False if any fragment is gone from the cache, the
+    feed has to be updated from scratch then.'''
+    redis = get_redis()
+    uuid = auth_token.uuid
+    entries = redis.zrevrange(entries_key(uuid), 0, -1)
+    keys = redis.hmget(fragments_key(uuid), *entries) if entries else []
+    fragments = []
+    for i in range(0, len(keys), 500):
+        fragments.extend(redis.mget(keys[i:i + 500]))
+    if None in keys or None in fragments:
+        return False
+    url = 'https://twitter.com/%s' % auth_token.screen_name
+    with open(path + '.tmp', 'wb') as feed:
+        writer = AtomWriter(feed)
+        writer.start_feed(url, auth_token.screen_name, now or timezone.now(), url,
+                          subtitle='Links shared by people you follow')
+        for fragment in fragments:
+            writer.raw(fragment)
+        writer.end_feed()
+    os.replace(path + '.tmp', path)
+    return True
+
+
+def build(auth_token, accounts, path):
+    '''Update the feed of `auth_token` and write it to `path`.'''
+    now = timezone.now()
+    started = time.time()
+    rendered = update(auth_token, accounts, now)
+    if not write(auth_token, path, now):
+        reset(auth_token)
+        rendered = update(auth_token, accounts, now)
+        write(auth_token, path, now)
+    print('Rendered %d entries for %s in %.2fs' % (rendered, auth_token.screen_name, time.time() - started))
+    return rendered
+
+
+def reset(auth_token):
+    get_redis().delete(entries_key(auth_token.uuid), fragments_key(auth_token.uuid), built_key(auth_token.uuid))
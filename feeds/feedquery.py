@@ -0,0 +1,114 @@
+'''Queries feeds are written from.
+
+Each one returns deduplicated links of accounts a user follows, newest
+first, along with names of the accounts which shared them, in a single
+query. Rows are streamed through a server side cursor FEED_CURSOR_ITERSIZE
+at a time, so neither the number of round trips nor memory grows with
+the feed.
+
+'''
+from collections import namedtuple
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from feeds.models import ContentBlob, LinkInbox, TwitterAccount, UrlContent, UrlShared
+
+Entry = namedtuple('Entry', ['entry', 'link', 'url', 'quoted_text', 'sanitized', 'published',
+                             'sharers', 'links', 'blob_id', 'html', 'html_sanitized'])
+Link = namedtuple('Link', ['url', 'published', 'sharers'])
+
+
+def get_tables():
+    shared_from = UrlShared.shared_from.through
+    followed_from = TwitterAccount.followed_from.through
+    return {'link': UrlShared._meta.db_table,
+            'content': UrlContent._meta.db_table,
+            'blob': ContentBlob._meta.db_table,
+            'account': TwitterAccount._meta.db_table,
+            'inbox': LinkInbox._meta.db_table,
+            'shared_from': shared_from._meta.db_table,
+            'followed_from': followed_from._meta.db_table}
+
+
+def stream(sql, params):
+    '''Rows of `sql` fetched from a server side cursor.'''
+    with transaction.atomic():
+        connection.ensure_connection()
+        with connection.connection.cursor(name='feed_%s' % uuid.uuid4().hex) as cursor:
+            cursor.itersize = settings.FEED_CURSOR_ITERSIZE
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+
+
+ENTRIES_SQL = '''
+WITH shares AS (
+    SELECT link.uuid, link.url, link.quoted_text, link.sanitized, link.url_shared, link.content_id,
+           COALESCE(content.cluster_id, content.uuid) AS entry, account.screen_name
+    FROM {link} link
+    JOIN {shared_from} shared_from ON shared_from.urlshared_id = link.uuid
+    JOIN {account} account ON account.uuid = shared_from.twitteraccount_id
+    JOIN {content} content ON content.uuid = link.content_id
+    WHERE shared_from.twitteraccount_id = ANY(%s) AND link.url_shared >= %s {where}
+), latest AS (
+    SELECT DISTINCT ON (entry) entry, uuid, url, quoted_text, sanitized, url_shared, content_id
+    FROM shares
+    ORDER BY entry, url_shared DESC, uuid
+), entries AS (
+    SELECT entry,
+           string_agg(DISTINCT screen_name, ', ' ORDER BY screen_name) AS sharers,
+           string_agg(DISTINCT uuid, ',' ORDER BY uuid) AS links
+    FROM shares
+    GROUP BY entry
+)
+SELECT latest.entry, latest.uuid, latest.url, latest.quoted_text, latest.sanitized, latest.url_shared,
+       entries.sharers, entries.links, content.blob_id, blob.html, blob.sanitized
+FROM latest
+JOIN entries ON entries.entry = latest.entry
+JOIN {content} content ON content.uuid = latest.content_id
+LEFT JOIN {blob} blob ON blob.digest = content.blob_id
+ORDER BY latest.url_shared DESC, latest.entry
+'''
+
+
+def get_entries(account_uuids, since, entries=None):
+    '''One Entry for every cluster of near-duplicate links(see
+    feeds.neardup) shared by `account_uuids` since `since`, only
+    `entries`(cluster uuids) if given, newest first. It carries the
+    latest link of the cluster, its compressed article and names of
+    the accounts which shared any link of the cluster.'''
+    where = ''
+    params = [[str(account_uuid) for account_uuid in account_uuids], since]
+    if entries is not None:
+        where = 'AND COALESCE(content.cluster_id, content.uuid) = ANY(%s)'
+        params.append(list(entries))
+    for row in stream(ENTRIES_SQL.format(where=where, **get_tables()), params):
+        yield Entry(*row)
+
+
+LINKS_SQL = '''
+SELECT link.url, MAX(inbox.shared) AS published,
+       string_agg(DISTINCT account.screen_name, ', ' ORDER BY account.screen_name) AS sharers
+FROM {inbox} inbox
+JOIN {link} link ON link.uuid = inbox.link_id
+JOIN {shared_from} shared_from ON shared_from.urlshared_id = link.uuid
+JOIN {followed_from} followed_from ON followed_from.twitteraccount_id = shared_from.twitteraccount_id
+    AND followed_from.authtoken_id = inbox.auth_token_id
+JOIN {account} account ON account.uuid = shared_from.twitteraccount_id
+WHERE inbox.auth_token_id = %s AND inbox.shared >= %s
+GROUP BY link.url
+ORDER BY published DESC, link.url
+'''
+
+
+def get_links(auth_token_uuid, since):
+    '''One Link for every url shared since `since` by accounts
+    `auth_token_uuid` follows, newest first. Links come out of its
+    inbox(see feeds.inbox).'''
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    for row in stream(LINKS_SQL.format(**get_tables()), [str(auth_token_uuid), since]):
+        yield Link(*row)
@@ -0,0 +1,134 @@
+'''Registry of fetch state of UrlContent, so that fetch_links is queued
+only when a fetch is actually needed and duplicate messages are
+dropped.
+
+    new       never queued
+    queued    fetch_links is queued
+    fetching  fetch_links is running
+    done      fetched(or found unchanged)
+    failed    to be queued again after fetch_retry_at
+    dead      failed FETCH_MAX_FAILURES times in a row or for good(like
+              a 404), queued again after fetch_retry_at, FETCH_DEAD_TTL
+              seconds later
+
+Failed fetches are retried after FETCH_RETRY_AFTER seconds, doubling
+with every consecutive failure up to FETCH_MAX_RETRY_AFTER. Queued and
+fetching content whose task got lost is queued again once it is
+FETCH_STALE_AFTER seconds old. Content shared in the last
+FETCH_REFRESH_WINDOW seconds is fetched again(conditionally, see
+feeds.httpcache) once it is FETCH_REFRESH_AFTER seconds old.
+
+'''
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from feeds.models import UrlContent
+
+NEW = 'new'
+QUEUED = 'queued'
+FETCHING = 'fetching'
+DONE = 'done'
+FAILED = 'failed'
+DEAD = 'dead'
+
+
+def needs_fetch(now, refetch=False):
+    '''Condition(SQL with params) of content to be queued.'''
+    condition = ("fetch_state = %s OR (fetch_state IN (%s, %s) AND fetch_retry_at <= %s) OR "
+                 "(fetch_state IN (%s, %s) AND fetch_updated <= %s)")
+    params = [NEW, FAILED, DEAD, now, QUEUED, FETCHING,
+              now - datetime.timedelta(seconds=settings.FETCH_STALE_AFTER)]
+    if refetch:
+        condition += ' OR fetch_state = %s'
+        params.append(DONE)
+    return condition, params
+
+
+def mark_queued(content_uuids, refetch=False):
+    '''Mark content of `content_uuids` which needs a fetch as queued, in
+    a single statement so that concurrent callers never both queue the
+    same content. Returns canonical urls of content marked by uuid.'''
+    if not content_uuids:
+        return {}
+    now = timezone.now()
+    condition, params = needs_fetch(now, refetch)
+    sql = ('UPDATE %s SET fetch_state = %%s, fetch_updated = %%s WHERE uuid IN %%s AND (%s) '
+           'RETURNING uuid, canonical_url') % (connection.ops.quote_name(UrlContent._meta.db_table), condition)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [QUEUED, now, tuple(str(content_uuid) for content_uuid in content_uuids)] + params)
+        return dict(cursor.fetchall())
+
+
+def due(limit):
+    '''Uuids of failed and stale content to be queued again.'''
+    now = timezone.now()
+    return list(UrlContent.objects.filter(
+        Q(fetch_state__in=(FAILED, DEAD), fetch_retry_at__lte=now)
+        | Q(fetch_state__in=(QUEUED, FETCHING),
+            fetch_updated__lte=now - datetime.timedelta(seconds=settings.FETCH_STALE_AFTER))
+    ).values_list('uuid', flat=True)[:limit])
+
+
+def due_refresh(limit):
+    '''Uuids of fetched content still being shared, to be fetched
+    again.'''
+    now = timezone.now()
+    return list(UrlContent.objects.filter(
+        fetch_state=DONE,
+        fetch_updated__lte=now - datetime.timedelta(seconds=settings.FETCH_REFRESH_AFTER),
+        shares__url_shared__gte=now - datetime.timedelta(seconds=settings.FETCH_REFRESH_WINDOW),
+    ).distinct().values_list('uuid', flat=True)[:limit])
+
+
+def move(content_uuid, from_states, to_state, **fields):
+    return UrlContent.objects.filter(uuid=content_uuid, fetch_state__in=from_states).update(
+        fetch_state=to_state, fetch_updated=timezone.now(), **fields) == 1
+
+
+def claim(content_uuid):
+    '''Start fetching queued content, False if it isn't queued(like for
+    a duplicate message).'''
+    return move(content_uuid, (QUEUED,), FETCHING)
+
+
+def claim_all(content_uuids):
+    '''Start fetching those of `content_uuids` which are queued, returns
+    their uuids.'''
+    if not content_uuids:
+        return []
+    sql = 'UPDATE %s SET fetch_state = %%s, fetch_updated = %%s WHERE uuid IN %%s AND fetch_state = %%s RETURNING uuid' % (
+        connection.ops.quote_name(UrlContent._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [FETCHING, timezone.now(), tuple(str(content_uuid) for content_uuid in content_uuids), QUEUED])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def requeue(content_uuid):
+    '''Put fetching content back in the queue, for a retry of the
+    task.'''
+    return move(content_uuid, (FETCHING,), QUEUED)
+
+
+def done(content_uuid):
+    return move(content_uuid, (FETCHING,), DONE, fetch_retry_at=None, fetch_failures=0)
+
+
+def get_retry_after(failures):
+    return min(settings.FETCH_MAX_RETRY_AFTER, settings.FETCH_RETRY_AFTER * 2 ** (failures - 1))
+
+
+def failed(content_uuid, failures, permanent=False, retry_after=None):
+    '''Record failure of a fetch, the `failures`th in a row. `retry_after`
+    overrides the backoff, like when the host is dead.'''
+    state = FAILED
+    if retry_after is None:
+        retry_after = get_retry_after(failures)
+        if permanent or failures >= settings.FETCH_MAX_FAILURES:
+            state = DEAD
+            retry_after = settings.FETCH_DEAD_TTL
+    return move(content_uuid, (FETCHING,), state, fetch_failures=failures,
+                fetch_retry_at=timezone.now() + datetime.timedelta(seconds=retry_after))
@@ -0,0 +1,91 @@
+'''Conditional GET of links, so that re-fetching a page which didn't
+change costs a 304 and no extraction.
+
+ETag, Last-Modified and sha1 of the body of the last page extracted
+for a canonical url are kept in Redis for HTTP_CACHE_TTL seconds. At
+most HTTP_CACHE_MAX_ENTRIES urls are kept, the least recently fetched
+ones are dropped first.
+
+'''
+import time
+
+from django.conf import settings
+import requests
+
+from feeds.download import download
+from feeds.utils import get_redis
+
+LRU_KEY = 'httpcache:lru'
+
+_session = None
+
+
+def cache_key(canonical_url):
+    return 'httpcache:%s' % canonical_url
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def touch(redis, canonical_url):
+    pipe = redis.pipeline()
+    pipe.expire(cache_key(canonical_url), settings.HTTP_CACHE_TTL)
+    pipe.zadd(LRU_KEY, time.time(), canonical_url)
+    pipe.execute()
+
+
+def fetch(url, canonical_url):
+    '''Download `url`(see feeds.download), conditionally on what was
+    cached for `canonical_url`.
+
+    Returns the Page, or None when the page didn't change since it
+    was last remembered. Raises requests.RequestException on failure.
+
+    '''
+    redis = get_redis()
+    cached = {key.decode('utf-8'): value.decode('utf-8')
+              for key, value in redis.hgetall(cache_key(canonical_url)).items()}
+    headers = {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    page = download(get_session(), url, headers)
+    if page.status_code == 304 and cached:
+        touch(redis, canonical_url)
+        return None
+    if cached.get('body_hash') == page.digest():
+        touch(redis, canonical_url)
+        return None
+    return page
+
+
+def remember(canonical_url, page):
+    '''Cache validators of `page` once it has been stored.'''
+    redis = get_redis()
+    entry = {'body_hash': page.digest(),
+             'etag': page.headers.get('etag', ''),
+             'last_modified': page.headers.get('last-modified', '')}
+    pipe = redis.pipeline()
+    pipe.delete(cache_key(canonical_url))
+    pipe.hmset(cache_key(canonical_url), entry)
+    pipe.execute()
+    touch(redis, canonical_url)
+    evict(redis)
+
+
+def evict(redis):
+    '''Drop least recently fetched entries beyond HTTP_CACHE_MAX_ENTRIES,
+    and those which expired.'''
+    excess = redis.zcard(LRU_KEY) - settings.HTTP_CACHE_MAX_ENTRIES
+    pipe = redis.pipeline()
+    if excess > 0:
+        for canonical_url in redis.zrange(LRU_KEY, 0, excess - 1):
+            pipe.delete(cache_key(canonical_url.decode('utf-8')))
+        pipe.zremrangebyrank(LRU_KEY, 0, excess - 1)
+    pipe.zremrangebyscore(LRU_KEY, 0, time.time() - settings.HTTP_CACHE_TTL)
+    pipe.execute()
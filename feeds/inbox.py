@@ -0,0 +1,83 @@
+'''Inbox of every user(AuthToken) with links shared by accounts they
+follow, one row per link.
+
+Rows are written when links get stored and when follows change(fan-out
+on write), so listing links of a user is a range scan of the
+(auth_token, shared) index of LinkInbox instead of joining links,
+their sharers and follows on every read.
+
+'''
+from django.db import connection
+
+from feeds.feedquery import get_tables
+from feeds.models import UrlShared
+
+DELIVER_SQL = '''
+INSERT INTO {inbox} (auth_token_id, link_id, shared)
+SELECT followed_from.authtoken_id, link.uuid, link.url_shared
+FROM {followed_from} followed_from, {link} link
+WHERE followed_from.twitteraccount_id = %s AND link.uuid = ANY(%s)
+ON CONFLICT (auth_token_id, link_id) DO NOTHING
+'''
+
+FOLLOW_SQL = '''
+INSERT INTO {inbox} (auth_token_id, link_id, shared)
+SELECT DISTINCT %s, link.uuid, link.url_shared
+FROM {link} link
+JOIN {shared_from} shared_from ON shared_from.urlshared_id = link.uuid
+WHERE shared_from.twitteraccount_id = ANY(%s)
+ON CONFLICT (auth_token_id, link_id) DO NOTHING
+'''
+
+UNFOLLOW_SQL = '''
+DELETE FROM {inbox} inbox
+USING {shared_from} shared_from
+WHERE inbox.auth_token_id = %s AND shared_from.urlshared_id = inbox.link_id
+  AND shared_from.twitteraccount_id = ANY(%s)
+  AND NOT EXISTS (SELECT 1 FROM {shared_from} other
+                  JOIN {followed_from} followed_from ON followed_from.twitteraccount_id = other.twitteraccount_id
+                  WHERE other.urlshared_id = inbox.link_id AND followed_from.authtoken_id = inbox.auth_token_id)
+'''
+
+
+def execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**get_tables()), params)
+        return cursor.rowcount
+
+
+def deliver(account_uuid, link_uuids):
+    '''Put links of `link_uuids` shared by `account_uuid` in inboxes of
+    everyone following it.'''
+    if not link_uuids:
+        return 0
+    return execute(DELIVER_SQL, [str(account_uuid), [str(link_uuid) for link_uuid in link_uuids]])
+
+
+def follow(auth_token_uuid, account_uuids):
+    '''Put every link shared by newly followed `account_uuids` in the
+    inbox of `auth_token_uuid`.'''
+    account_uuids = [str(account_uuid) for account_uuid in account_uuids]
+    if not account_uuids:
+        return 0
+    return execute(FOLLOW_SQL, [str(auth_token_uuid), account_uuids])
+
+
+def unfollow(auth_token_uuid, account_uuids):
+    '''Take links of `account_uuids`, which are no longer followed, out
+    of the inbox of `auth_token_uuid` unless an account still followed
+    shared them as well.'''
+    account_uuids = [str(account_uuid) for account_uuid in account_uuids]
+    if not account_uuids:
+        return 0
+    return execute(UNFOLLOW_SQL, [str(auth_token_uuid), account_uuids])
+
+
+def get_links(auth_token_uuid, since=None):
+    '''Links in the inbox of `auth_token_uuid`, shared since `since` if
+    given, latest first.'''
+    # A single filter() so that both conditions are on the same row
+    conditions = {'inboxes__auth_token': auth_token_uuid}
+    if since is not None:
+        conditions['inboxes__shared__gte'] = since
+    return UrlShared.objects.filter(**conditions).order_by('-inboxes__shared')
@@ -0,0 +1,154 @@
+import datetime
+from urllib import parse
+
+from django.db import connection, models, transaction
+from django.utils import timezone
+import pytz
+
+from feeds import inbox
+from feeds.canonical import canonical_urls
+from feeds.models import TwitterStatus, UrlContent, UrlShared
+from feeds.sanitize import sanitize
+
+
+def bulk_insert_ignore(model, objs, conflict_target=()):
+    '''Insert `objs` in a single statement, skipping rows which conflict
+    with an existing unique constraint(Postgres `ON CONFLICT DO
+    NOTHING`).
+
+    Returns primary keys of the rows which actually got inserted.
+
+    '''
+    if not objs:
+        return []
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields
+              if not isinstance(field, models.AutoField)]
+    quote_name = connection.ops.quote_name
+    params = []
+    for obj in objs:
+        params.extend(field.get_db_prep_save(field.pre_save(obj, True), connection=connection)
+                      for field in fields)
+    row = '(%s)' % ', '.join(['%s'] * len(fields))
+    conflict = ''
+    if conflict_target:
+        conflict = '(%s)' % ', '.join(quote_name(column) for column in conflict_target)
+    sql = 'INSERT INTO %s (%s) VALUES %s ON CONFLICT %s DO NOTHING RETURNING %s' % (
+        quote_name(opts.db_table),
+        ', '.join(quote_name(field.column) for field in fields),
+        ', '.join([row] * len(objs)),
+        conflict,
+        quote_name(opts.pk.column))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [inserted[0] for inserted in cursor.fetchall()]
+
+
+def parse_created_at(created_at):
+    '''Twitter timestamps look like "Wed Aug 27 13:08:45 +0000 2008".'''
+    return pytz.utc.localize(datetime.datetime.strptime(created_at, '%a %b %d %H:%M:%S +0000 %Y'))
+
+
+def get_status_text(status):
+    retweeted_status = status.get('retweeted_status')
+    if retweeted_status and status['text'].endswith(u'\u2026'):
+        return retweeted_status['user']['screen_name'] + ': ' + retweeted_status['text']
+    return status['text']
+
+
+def get_status_urls(status):
+    '''Yields expanded urls of a status which fit in UrlShared.url'''
+    for url_entity in status['entities'].get('urls', []):
+        expanded_url = url_entity.get('expanded_url', '') or ''
+        if not expanded_url or expanded_url.startswith('https://twitter.com/i/web/status/'):
+            continue
+        if len(expanded_url) > 200:
+            parsed_url = parse.urlparse(expanded_url)
+            expanded_url = parsed_url.scheme + "://" + parsed_url.netloc + parsed_url.path
+        # If after cleaning parameters len is still beyond 200 chars
+        # we skip it. Django URLField has limit.
+        if len(expanded_url) > 200:
+            continue
+        yield expanded_url
+
+
+def ingest_timeline(twitter_account, auth_token, statuses):
+    '''Store a page of timeline `statuses`(raw status json) of
+    `twitter_account`.
+
+    Whatever the size of the page, it costs one insert for statuses,
+    one insert and one select for content of links, one select and one
+    insert for links(and an update of ones stored already, which get a
+    new sharer), one insert for link authors and one insert
+    delivering links to inboxes of its followers(see feeds.inbox), all
+    in a single transaction along with saving `twitter_account` with its
+    new last_status_id.
+
+    Returns number of statuses tweeted by `twitter_account` in the
+    page and uuids of UrlContent which were seen for the first time and
+    are to be fetched.
+
+    '''
+    status_objs = []
+    status_links = {}
+    for status in statuses:
+        if not status['user']['screen_name'] == twitter_account.screen_name:
+            # skipping tweets where someone else is talking to friend
+            # FIXME: We have to consider case when user 'favourites' a tweet <- They could be treasure trove
+            continue
+        tweeted_at = parse_created_at(status['created_at'])
+        if tweeted_at > twitter_account.last_updated:
+            twitter_account.last_updated = tweeted_at
+        if int(status['id_str']) > (twitter_account.last_status_id or 0):
+            twitter_account.last_status_id = int(status['id_str'])
+        url = 'https://twitter.com/' + twitter_account.screen_name + '/status/' + status['id_str']
+        text = sanitize(get_status_text(status))
+        status_objs.append(TwitterStatus(tweet_from=twitter_account,
+                                         followed_from=auth_token,
+                                         status_text=text,
+                                         status_created=tweeted_at,
+                                         status_url=url))
+        # In case of "quoted tweets" the original tweets is part of the url entities
+        # FIXME: I have to handle it better, in case quoted tweet has an external link?
+        status_links[url] = [(link_url, text, tweeted_at) for link_url in get_status_urls(status)]
+
+    with transaction.atomic():
+        inserted = set(bulk_insert_ignore(TwitterStatus, status_objs, ('status_url',)))
+        shared_links = set()
+        for status_obj in status_objs:
+            if str(status_obj.uuid) in inserted:
+                shared_links.update(status_links[status_obj.status_url])
+        link_uuids = {}
+        new_contents = []
+        if shared_links:
+            canonical = canonical_urls({link[0] for link in shared_links})
+            first_urls = {}
+            for url in sorted(canonical):
+                first_urls.setdefault(canonical[url], url)
+            new_contents = bulk_insert_ignore(UrlContent,
+                                              [UrlContent(canonical_url=canonical_url, url=url)
+                                               for canonical_url, url in first_urls.items()],
+                                              ('canonical_url',))
+            content_uuids = dict(UrlContent.objects.filter(canonical_url__in=set(canonical.values())).values_list(
+                'canonical_url', 'uuid'))
+            for link in UrlShared.objects.filter(url__in={link[0] for link in shared_links}).values_list(
+                    'uuid', 'url', 'quoted_text', 'url_shared'):
+                link_uuids[link[1:]] = link[0]
+            new_links = [UrlShared(url=url, quoted_text=text, url_shared=shared_at, sanitized=True,
+                                   content_id=content_uuids[canonical[url]])
+                         for (url, text, shared_at) in shared_links
+                         if (url, text, shared_at) not in link_uuids]
+            if link_uuids:
+                # Links stored already get a new sharer, see feeds.feedcache
+                UrlShared.objects.filter(uuid__in=list(link_uuids.values())).update(added=timezone.now())
+            bulk_insert_ignore(UrlShared, new_links)
+            for link_obj in new_links:
+                link_uuids[(link_obj.url, link_obj.quoted_text, link_obj.url_shared)] = str(link_obj.uuid)
+            through = UrlShared.shared_from.through
+            bulk_insert_ignore(through,
+                               [through(urlshared_id=link_uuids[link], twitteraccount_id=str(twitter_account.uuid))
+                                for link in shared_links],
+                               ('urlshared_id', 'twitteraccount_id'))
+            inbox.deliver(twitter_account.uuid, [link_uuids[link] for link in shared_links])
+        twitter_account.save()
+    return len(status_objs), new_contents
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from feeds import tasks
+from feeds.models import AuthToken, TwitterStatus, UrlShared
+from feeds.replay import FakeTwitter
+from sofee.celery import app
+
+
+class Command(BaseCommand):
+    help = '''Replays timelines of a local fake Twitter(feeds.replay) through
+update_accounts_task, update_feed and fetch_links on a throwaway test
+database and reports their throughput. Fails when a budget given with
+the --max-* options is exceeded, so that CI catches regressions.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Accounts followed by every user')
+        parser.add_argument('--tweets', type=int, default=20,
+                            help='Statuses in timeline of every account')
+        parser.add_argument('--links', type=int, default=20,
+                            help='Number of links to run fetch_links for')
+        parser.add_argument('--json', action='store_true',
+                            help='Print results as json')
+        parser.add_argument('--max-queries-per-status', type=float,
+                            help='Budget of queries per status stored by update_accounts_task')
+        parser.add_argument('--max-queries-per-link', type=float,
+                            help='Budget of queries per link of fetch_links')
+        parser.add_argument('--max-seconds-per-link', type=float,
+                            help='Budget of seconds per link of fetch_links')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        eager = app.conf.CELERY_ALWAYS_EAGER, app.conf.CELERY_EAGER_PROPAGATES_EXCEPTIONS
+        app.conf.CELERY_ALWAYS_EAGER = app.conf.CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
+        try:
+            with FakeTwitter(users=options['users'], follows=options['follows'], tweets=options['tweets']) as twitter:
+                with override_settings(TWITTER_API_URL=twitter.api_url,
+                                       TWITTER_OEMBED_URL=twitter.oembed_url,
+                                       TWITTER_RATE_LIMITS={'default': 10 ** 6},
+                                       # Every article is served by the same fake host
+                                       HOST_CONCURRENCY=10 ** 6, HOST_MIN_DELAY=0):
+                    results = self.benchmark(twitter, options)
+        finally:
+            app.conf.CELERY_ALWAYS_EAGER, app.conf.CELERY_EAGER_PROPAGATES_EXCEPTIONS = eager
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self.report(results)
+        self.check_budgets(results, options)
+
+    def report(self, results):
+        accounts = results['update_accounts_task']
+        self.stdout.write('update_accounts_task: %(wall_time).2fs, %(statuses)d statuses(%(statuses_per_sec).1f/sec), '
+                          '%(queries_per_friend).2f queries per friend, %(queries_per_status).2f per status' % accounts)
+        feeds = results['update_feed']
+        self.stdout.write('update_feed: %(feeds)d feeds in %(wall_time).2fs(%(seconds_per_feed).3fs each), '
+                          '%(queries_per_feed).1f queries per feed' % feeds)
+        links = results['fetch_links']
+        self.stdout.write('fetch_links: %(links)d links in %(wall_time).2fs(%(seconds_per_link).3fs each), '
+                          '%(queries_per_link).1f queries per link' % links)
+        embeds = results['fetch_embeds']
+        self.stdout.write('fetch_embeds: %(statuses)d statuses in %(wall_time).2fs(%(seconds_per_status).3fs each)' % embeds)
+
+    def check_budgets(self, results, options):
+        budgets = [('update_accounts_task', 'queries_per_status', options['max_queries_per_status']),
+                   ('fetch_links', 'queries_per_link', options['max_queries_per_link']),
+                   ('fetch_links', 'seconds_per_link', options['max_seconds_per_link'])]
+        if options['max_queries_per_link'] is not None or options['max_seconds_per_link'] is not None:
+            if not results['fetch_links']['links']:
+                raise CommandError('No links were fetched to check the budget of fetch_links against')
+        exceeded = ['%s %s is %.3f, over budget of %.3f' % (task, name, results[task][name], budget)
+                    for task, name, budget in budgets
+                    if budget is not None and results[task][name] > budget]
+        if exceeded:
+            raise CommandError('\n'.join(exceeded))
+
+    def benchmark(self, twitter, options):
+        for user in range(options['users']):
+            AuthToken.objects.create(screen_name='replay_user_%d' % user,
+                                     access_token=twitter.access_token(user),
+                                     access_token_secret='secret')
+        link_uuids = []
+        embed_batches = []
+        feed_uuids = []
+        # Links and feeds are benchmarked on their own, they are only
+        # collected while accounts get updated.
+        with mock.patch.object(tasks.fetch_links, 'apply_async', lambda args, **kwargs: link_uuids.append(args[0])), \
+                mock.patch.object(tasks.fetch_embeds, 'apply_async', lambda args, **kwargs: embed_batches.append(args[0])), \
+                mock.patch.object(tasks.update_feed, 'apply_async', lambda args, **kwargs: feed_uuids.append(args[0])), \
+                mock.patch.object(tasks.update_user_cache, 'apply_async', lambda args, **kwargs: None):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.time()
+                tasks.update_accounts_task.apply()
+                wall_time = time.time() - started
+        statuses = TwitterStatus.objects.count()
+        follows = options['users'] * options['follows']
+        results = {'update_accounts_task': {'wall_time': wall_time,
+                                            'statuses': statuses,
+                                            'statuses_per_sec': statuses / wall_time,
+                                            'links': UrlShared.objects.count(),
+                                            'queries': len(queries),
+                                            'queries_per_friend': len(queries) / follows,
+                                            'queries_per_status': len(queries) / max(statuses, 1),
+                                            'twitter_requests': twitter.requests}}
+
+        feed_uuids = sorted(set(feed_uuids))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            for uuid in feed_uuids:
+                tasks.update_feed(uuid)
+            wall_time = time.time() - started
+        for uuid in feed_uuids:
+            if os.path.exists('feeds/static/xml/%s-feed.xml' % uuid):
+                os.remove('feeds/static/xml/%s-feed.xml' % uuid)
+        results['update_feed'] = {'wall_time': wall_time,
+                                  'feeds': len(feed_uuids),
+                                  'seconds_per_feed': wall_time / max(len(feed_uuids), 1),
+                                  'queries_per_feed': len(queries) / max(len(feed_uuids), 1)}
+
+        link_uuids = link_uuids[:options['links']]
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            for uuid in link_uuids:
+                tasks.fetch_links(uuid)
+            wall_time = time.time() - started
+        results['fetch_links'] = {'wall_time': wall_time,
+                                  'links': len(link_uuids),
+                                  'seconds_per_link': wall_time / max(len(link_uuids), 1),
+                                  'queries_per_link': len(queries) / max(len(link_uuids), 1)}
+
+        statuses = sum(len(batch) for batch in embed_batches)
+        started = time.time()
+        for batch in embed_batches:
+            tasks.fetch_embeds(batch)
+        wall_time = time.time() - started
+        results['fetch_embeds'] = {'wall_time': wall_time,
+                                   'statuses': statuses,
+                                   'seconds_per_status': wall_time / max(statuses, 1)}
+        return results
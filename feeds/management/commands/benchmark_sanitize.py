@@ -0,0 +1,54 @@
+import json
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from feeds.sanitize import sanitize
+
+
+def valid_xml_char_ordinal(c):
+    '''Per character filter feeds used to run on every rebuild.'''
+    codepoint = ord(c)
+    # conditions ordered by presumed frequency
+    return (
+        0x20 <= codepoint <= 0xD7FF
+        or codepoint in (0x9, 0xA, 0xD)
+        or 0xE000 <= codepoint <= 0xFFFD
+        or 0x10000 <= codepoint <= 0x10FFFF
+    )
+
+
+def filter_characters(text):
+    return ''.join(c for c in text if valid_xml_char_ordinal(c))
+
+
+class Command(BaseCommand):
+    help = '''Compares the per character XML filter with feeds.sanitize on
+generated articles.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=200000,
+                            help='Characters in an article')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--json', action='store_true',
+                            help='Print results as json')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        words = ['<p>', 'lorem', 'ipsum', 'dölor', 'साइट', '\U0001f600', '&amp;', '\x0b', '\x00']
+        article = ' '.join(rnd.choice(words) for i in range(options['size'] // 6))[:options['size']]
+        assert filter_characters(article) == sanitize(article)
+        results = {}
+        for name, function in (('per_character', filter_characters), ('compiled', sanitize)):
+            seconds = min(timeit.repeat(lambda: function(article), number=1, repeat=options['repeat']))
+            results[name] = {'seconds': seconds,
+                             'chars_per_sec': len(article) / seconds}
+        results['speedup'] = results['per_character']['seconds'] / results['compiled']['seconds']
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+            return
+        for name in ('per_character', 'compiled'):
+            self.stdout.write('%s: %.4fs per %d character article(%.1fM chars/sec)' % (
+                name, results[name]['seconds'], len(article), results[name]['chars_per_sec'] / 10 ** 6))
+        self.stdout.write('speedup: %.1fx' % results['speedup'])
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from feeds import deadlinks
+
+
+class Command(BaseCommand):
+    help = '''Lists hosts whose failing link fetches waste most worker time,
+or fail most often with --by failures.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--by', choices=['wasted', 'failures'], default='wasted')
+        parser.add_argument('--json', action='store_true',
+                            help='Print results as json')
+
+    def handle(self, *args, **options):
+        by = deadlinks.WASTED_KEY if options['by'] == 'wasted' else deadlinks.FAILURES_KEY
+        stats = deadlinks.get_stats(options['limit'], by)
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+            return
+        for host in stats:
+            line = ('%(host)s: %(failures)d of %(fetches)d fetches failed, %(failed_seconds).1fs wasted, '
+                    '%(consecutive)d failures in a row' % host)
+            if host['dead_for']:
+                line += ', dead for %ds' % host['dead_for']
+            self.stdout.write(line)
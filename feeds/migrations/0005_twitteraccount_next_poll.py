@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0004_pushnotificationtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitteraccount',
+            name='next_poll',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='twitteraccount',
+            name='poll_interval',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
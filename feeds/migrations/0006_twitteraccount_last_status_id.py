@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# Id of a status is the last part of its url
+BACKFILL_LAST_STATUS_ID = r'''
+UPDATE feeds_twitteraccount account SET last_status_id = latest.status_id
+FROM (SELECT tweet_from_id, max(substring(rtrim(status_url, '/') from '(\d+)$')::bigint) AS status_id
+      FROM feeds_twitterstatus
+      WHERE rtrim(status_url, '/') ~ '\d+$'
+      GROUP BY tweet_from_id) latest
+WHERE account.uuid = latest.tweet_from_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0005_twitteraccount_next_poll'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitteraccount',
+            name='last_status_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(BACKFILL_LAST_STATUS_ID, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_twitter_id(apps, schema_editor):
+    TwitterAccount = apps.get_model('feeds', 'TwitterAccount')
+    seen = set()
+    for twitter_account in TwitterAccount.objects.all().iterator():
+        twitter_id = twitter_account.account_json.get('id')
+        # Renamed accounts might have been stored twice, the other
+        # one is matched again by screen name on next sync.
+        if not twitter_id or twitter_id in seen:
+            continue
+        seen.add(twitter_id)
+        TwitterAccount.objects.filter(uuid=twitter_account.uuid).update(twitter_id=twitter_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0006_twitteraccount_last_status_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitteraccount',
+            name='twitter_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_twitter_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+from fnmatch import fnmatchcase
+from urllib import parse
+import uuid
+
+# Rules of feeds.canonical as they were when this migration was
+# written, so it keeps giving the same result whatever they become
+DROP_PARAMS = ['utm_*', 'fbclid', 'gclid', 'dclid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'ref_src',
+               'ref_url', 'smid', 'smtyp', 'cmpid', 'ocid', 'share', 'mbid', 'rss', 'feed_*']
+HOST_ALIASES = {'mobile.twitter.com': 'twitter.com',
+                'mobile.nytimes.com': 'nytimes.com'}
+STRIP_HOST_PREFIXES = ['www.', 'm.', 'mobile.']
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize(url):
+    parsed_url = parse.urlsplit(url.strip())
+    scheme = parsed_url.scheme.lower()
+    host = (parsed_url.hostname or '').lower()
+    host = HOST_ALIASES.get(host, host)
+    for prefix in STRIP_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count('.') > 1:
+            host = host[len(prefix):]
+            break
+    if parsed_url.port and parsed_url.port != DEFAULT_PORTS.get(scheme):
+        host = '%s:%s' % (host, parsed_url.port)
+    query = [(key, value) for key, value in parse.parse_qsl(parsed_url.query, keep_blank_values=True)
+             if not any(fnmatchcase(key.lower(), pattern) for pattern in DROP_PARAMS)]
+    return parse.urlunsplit((scheme, host, parsed_url.path or '/', parse.urlencode(sorted(query)), ''))
+
+
+def backfill_content(apps, schema_editor):
+    UrlContent = apps.get_model('feeds', 'UrlContent')
+    UrlShared = apps.get_model('feeds', 'UrlShared')
+    contents = {}
+    for link in UrlShared.objects.all().order_by('url_shared').iterator():
+        canonical_url = canonicalize(link.url)
+        if len(canonical_url) > 255:
+            canonical_url = link.url
+        content = contents.get(canonical_url)
+        if content is None:
+            content = contents[canonical_url] = UrlContent.objects.create(canonical_url=canonical_url, url=link.url)
+        if link.cleaned_text and not content.cleaned_text:
+            content.cleaned_text = link.cleaned_text
+            content.url_json = link.url_json
+            content.save()
+        UrlShared.objects.filter(uuid=link.uuid).update(content=content)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0007_twitteraccount_twitter_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UrlContent',
+            fields=[
+                ('uuid', models.CharField(db_index=True, default=uuid.uuid4, editable=False, max_length=64, primary_key=True, serialize=False)),
+                ('canonical_url', models.URLField(max_length=255, unique=True)),
+                ('url', models.URLField(max_length=255)),
+                ('cleaned_text', models.TextField(blank=True)),
+                ('url_json', django.contrib.postgres.fields.jsonb.JSONField(default={})),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='urlshared',
+            name='content',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='feeds.UrlContent'),
+        ),
+        migrations.RunPython(backfill_content, migrations.RunPython.noop),
+    ]
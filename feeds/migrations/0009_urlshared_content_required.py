@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Apart from 0008 as Postgres doesn't alter a table with pending
+    # deferred constraint checks of the backfill.
+
+    dependencies = [
+        ('feeds', '0008_urlcontent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='urlshared',
+            name='content',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='feeds.UrlContent'),
+        ),
+        migrations.RemoveField(
+            model_name='urlshared',
+            name='cleaned_text',
+        ),
+        migrations.RemoveField(
+            model_name='urlshared',
+            name='url_json',
+        ),
+    ]
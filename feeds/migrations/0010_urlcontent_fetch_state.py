@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_fetch_state(apps, schema_editor):
+    UrlContent = apps.get_model('feeds', 'UrlContent')
+    UrlContent.objects.exclude(cleaned_text='').update(fetch_state='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0009_urlshared_content_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlcontent',
+            name='fetch_state',
+            field=models.CharField(db_index=True, default='new', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='urlcontent',
+            name='fetch_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='urlcontent',
+            name='fetch_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_fetch_state, migrations.RunPython.noop),
+    ]
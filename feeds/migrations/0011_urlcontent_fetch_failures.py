@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0010_urlcontent_fetch_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlcontent',
+            name='fetch_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
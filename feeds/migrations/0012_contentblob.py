@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import hashlib
+import zlib
+
+
+# Blobs as feeds.contentstore stored them when this migration was
+# written
+def get_digest(html, text):
+    digest = hashlib.sha256(html.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compress(value):
+    return zlib.compress(value.encode('utf-8'), 6)
+
+
+def move_content(apps, schema_editor):
+    ContentBlob = apps.get_model('feeds', 'ContentBlob')
+    UrlContent = apps.get_model('feeds', 'UrlContent')
+    stored = set()
+    for content in UrlContent.objects.all().iterator():
+        html = content.cleaned_text
+        url_json = dict(content.url_json)
+        text = url_json.pop('textContent', '') or ''
+        if not html and not text:
+            continue
+        digest = get_digest(html, text)
+        if digest not in stored and not ContentBlob.objects.filter(digest=digest).exists():
+            ContentBlob.objects.create(digest=digest, html=compress(html), text=compress(text),
+                                       size=len(html) + len(text))
+        stored.add(digest)
+        UrlContent.objects.filter(uuid=content.uuid).update(blob=digest, url_json=url_json)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0011_urlcontent_fetch_failures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('html', models.BinaryField()),
+                ('text', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='urlcontent',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contents', to='feeds.ContentBlob'),
+        ),
+        migrations.RunPython(move_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Apart from 0012 as Postgres doesn't alter a table with pending
+    # deferred constraint checks of the move.
+
+    dependencies = [
+        ('feeds', '0012_contentblob'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='urlcontent',
+            name='cleaned_text',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0014_urlcontent_simhash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlshared',
+            name='added',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0015_urlshared_added'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblob',
+            name='sanitized',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='urlshared',
+            name='sanitized',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_inbox(apps, schema_editor):
+    LinkInbox = apps.get_model('feeds', 'LinkInbox')
+    UrlShared = apps.get_model('feeds', 'UrlShared')
+    TwitterAccount = apps.get_model('feeds', 'TwitterAccount')
+    schema_editor.execute('''
+    INSERT INTO {inbox} (auth_token_id, link_id, shared)
+    SELECT DISTINCT followed_from.authtoken_id, link.uuid, link.url_shared
+    FROM {link} link
+    JOIN {shared_from} shared_from ON shared_from.urlshared_id = link.uuid
+    JOIN {followed_from} followed_from ON followed_from.twitteraccount_id = shared_from.twitteraccount_id
+    '''.format(inbox=LinkInbox._meta.db_table,
+               link=UrlShared._meta.db_table,
+               shared_from=UrlShared.shared_from.through._meta.db_table,
+               followed_from=TwitterAccount.followed_from.through._meta.db_table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0016_sanitized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkInbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared', models.DateTimeField()),
+                ('auth_token', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='feeds.AuthToken')),
+                ('link', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inboxes', to='feeds.UrlShared')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='linkinbox',
+            unique_together=set([('auth_token', 'link')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='linkinbox',
+            index_together=set([('auth_token', 'shared')]),
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
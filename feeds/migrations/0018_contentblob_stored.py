@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0017_linkinbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblob',
+            name='stored',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
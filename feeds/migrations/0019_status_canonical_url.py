@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import re
+
+# Status urls as feeds.canonical keys them since statuses are embedded
+# by id
+TWITTER_STATUS_RE = re.compile(r'^https?://(?:www\.|mobile\.)?twitter\.com/[^/]+/status(?:es)?/(\d+)', re.IGNORECASE)
+
+
+def merge_statuses(apps, schema_editor):
+    '''Key content of statuses by their id, merging content of a status
+    shared under urls naming different authors.'''
+    UrlContent = apps.get_model('feeds', 'UrlContent')
+    UrlShared = apps.get_model('feeds', 'UrlShared')
+    merged = {}
+    for content in UrlContent.objects.filter(canonical_url__iregex=r'^https?://([^/]+\.)?twitter\.com/[^/]+/status').order_by(
+            'canonical_url').iterator():
+        match = TWITTER_STATUS_RE.match(content.canonical_url)
+        if not match:
+            continue
+        canonical_url = 'https://twitter.com/i/status/%s' % match.group(1)
+        if canonical_url == content.canonical_url:
+            continue
+        target = merged.get(canonical_url)
+        if target is None:
+            target = UrlContent.objects.filter(canonical_url=canonical_url).first()
+        if target is None:
+            UrlContent.objects.filter(uuid=content.uuid).update(canonical_url=canonical_url)
+            merged[canonical_url] = content
+            continue
+        merged[canonical_url] = target
+        UrlShared.objects.filter(content=content.uuid).update(content=target.uuid)
+        if content.blob_id and not target.blob_id:
+            target.blob_id = content.blob_id
+            target.fetch_state = content.fetch_state
+            target.fetch_updated = content.fetch_updated
+            target.save(update_fields=['blob', 'fetch_state', 'fetch_updated'])
+        content.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0018_contentblob_stored'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_statuses, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import zlib
+
 from django.db import models
 from feeds.mixins import UUIDMixin
 from django.contrib.postgres.fields import JSONField
@@ -16,9 +18,16 @@ class AuthToken(UUIDMixin):
 
 class TwitterAccount(UUIDMixin):
     screen_name = models.CharField(max_length=60, unique=True)
+    twitter_id = models.BigIntegerField(null=True, blank=True, unique=True)
     followed_from = models.ManyToManyField(AuthToken)
     last_updated = models.DateTimeField(default=timezone.now)
     account_json = JSONField(default={})
+    # Timeline is polled once next_poll is due, poll_interval(in
+    # seconds) adapts to how often account tweets, see feeds.schedule
+    next_poll = models.DateTimeField(default=timezone.now, db_index=True)
+    poll_interval = models.PositiveIntegerField(default=0)
+    # Id of the latest status stored, used as since_id of next poll
+    last_status_id = models.BigIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.screen_name
@@ -51,19 +60,96 @@ class TwitterStatus(UUIDMixin):
         return self.tweet_from, self.status_text
 
 
+class ContentBlob(models.Model):
+    # Compressed html and text of an article keyed by their digest, see
+    # feeds.contentstore
+    digest = models.CharField(max_length=64, primary_key=True)
+    html = models.BinaryField()
+    text = models.BinaryField()
+    # Uncompressed length
+    size = models.PositiveIntegerField(default=0)
+    # Stripped of characters not allowed in XML, see feeds.sanitize
+    sanitized = models.BooleanField(default=False)
+    # When it was last stored, blobs no content points to are deleted a
+    # while after, see contentstore.collect
+    stored = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def get_html(self):
+        return zlib.decompress(bytes(self.html)).decode('utf-8')
+
+    def get_text(self):
+        return zlib.decompress(bytes(self.text)).decode('utf-8')
+
+
+class UrlContent(UUIDMixin):
+    # Content of an article, shared once or many times under different
+    # urls, see feeds.canonical. It is fetched from `url`, the first
+    # url it was shared with.
+    canonical_url = models.URLField(max_length=255, unique=True)
+    url = models.URLField(max_length=255)
+    # Extracted article, url_json keeps only its metadata(title,
+    # excerpt, byline)
+    blob = models.ForeignKey(ContentBlob, null=True, blank=True, on_delete=models.SET_NULL, related_name='contents')
+    url_json = JSONField(default={})
+    # See feeds.fetchstate
+    fetch_state = models.CharField(max_length=10, default='new', db_index=True)
+    fetch_updated = models.DateTimeField(null=True, blank=True)
+    fetch_retry_at = models.DateTimeField(null=True, blank=True)
+    fetch_failures = models.PositiveIntegerField(default=0)
+    # Near-duplicates of an article point to the same cluster, see
+    # feeds.neardup
+    simhash = models.BigIntegerField(null=True, blank=True)
+    cluster = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    def __str__(self):
+        return self.canonical_url
+
+    @property
+    def cleaned_text(self):
+        return self.blob.get_html() if self.blob_id else ''
+
+    @property
+    def text_content(self):
+        return self.blob.get_text() if self.blob_id else ''
+
+
+class SimHashBand(models.Model):
+    # Index of UrlContent by bands of its simhash, see feeds.neardup
+    key = models.BigIntegerField(db_index=True)
+    content = models.ForeignKey(UrlContent, on_delete=models.CASCADE, related_name='+')
+
+
 class UrlShared(UUIDMixin):
     # Reason I am not storing TwitterStatus is to allow URLs being
     # archived/shared from other sources too(browser-extension etc).
     url = models.URLField(db_index=True)
+    content = models.ForeignKey(UrlContent, on_delete=models.CASCADE, related_name='shares')
     shared_from = models.ManyToManyField(TwitterAccount)
     url_shared = models.DateTimeField()
+    # When it got stored or last got a new sharer, feeds.feedcache
+    # renders links added since a feed was last built
+    added = models.DateTimeField(default=timezone.now, db_index=True)
     url_seen = models.BooleanField(default=False)
     quoted_text = models.TextField(blank=True)
-    cleaned_text = models.TextField(blank=True)
-    url_json = JSONField(default={})
+    # quoted_text is stripped of characters not allowed in XML, see
+    # feeds.sanitize
+    sanitized = models.BooleanField(default=False)
 
     class Meta:
         ordering = ('-url_shared',)
 
     def __str__(self):
         return self.shared_from, self.url
+
+
+class LinkInbox(models.Model):
+    # Links shared by accounts a user follows, written when links are
+    # stored and follows change so they are listed with a range scan,
+    # see feeds.inbox
+    auth_token = models.ForeignKey(AuthToken, on_delete=models.CASCADE, related_name='+')
+    link = models.ForeignKey(UrlShared, on_delete=models.CASCADE, related_name='inboxes')
+    shared = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('auth_token', 'link')
+        index_together = [('auth_token', 'shared')]
@@ -0,0 +1,146 @@
+'''Clusters of near-duplicate articles, like syndicated copies or AMP
+pages of a story, found by SimHash of their text.
+
+A 64 bit SimHash of word shingles changes in only a few bits between
+near-duplicates. It is split in NEARDUP_DISTANCE + 1 bands, each of
+them indexed in SimHashBand, so any article within NEARDUP_DISTANCE
+bits shares at least one band with it and is found through the index
+without scanning the corpus.
+
+UrlContent.cluster points to the first article of the cluster, the
+cluster of content which isn't fetched(or is too short to compare) is
+itself.
+
+'''
+from collections import OrderedDict
+import hashlib
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from feeds.models import SimHashBand, UrlContent, UrlShared
+
+BITS = 64
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_features(text):
+    '''Word 3-shingles of `text` with their counts.'''
+    words = WORD_RE.findall(text.lower())
+    features = {}
+    for i in range(max(1, len(words) - 2)):
+        feature = ' '.join(words[i:i + 3])
+        features[feature] = features.get(feature, 0) + 1
+    return features
+
+
+def simhash(text):
+    '''SimHash of `text`, None if it has less than NEARDUP_MIN_WORDS.'''
+    if len(WORD_RE.findall(text)) < settings.NEARDUP_MIN_WORDS:
+        return None
+    weights = [0] * BITS
+    for feature, count in get_features(text).items():
+        value = int.from_bytes(hashlib.md5(feature.encode('utf-8')).digest()[:8], 'big')
+        for bit in range(BITS):
+            if value >> bit & 1:
+                weights[bit] += count
+            else:
+                weights[bit] -= count
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def distance(first, second):
+    return bin(first ^ second).count('1')
+
+
+def to_signed(value):
+    '''`value` as stored in a BigIntegerField.'''
+    return value - (1 << BITS) if value >= 1 << (BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << BITS) if value < 0 else value
+
+
+def get_bands(fingerprint):
+    '''SimHashBand keys of `fingerprint`, band index in the high bits.'''
+    bands = settings.NEARDUP_DISTANCE + 1
+    width = BITS // bands
+    keys = []
+    for band in range(bands):
+        # Last band takes the remaining bits
+        bits = width if band < bands - 1 else BITS - width * band
+        keys.append(band << BITS // 2 | fingerprint >> (width * band) & ((1 << bits) - 1))
+    return keys
+
+
+def find_cluster(fingerprint, exclude=None):
+    '''Cluster of the nearest article within NEARDUP_DISTANCE bits of
+    `fingerprint`, None if there is none.'''
+    candidates = SimHashBand.objects.filter(key__in=get_bands(fingerprint))
+    if exclude is not None:
+        candidates = candidates.exclude(content=exclude)
+    nearest = None
+    for content, other, cluster in candidates.values_list(
+            'content', 'content__simhash', 'content__cluster')[:settings.NEARDUP_MAX_CANDIDATES]:
+        bits = distance(fingerprint, to_unsigned(other))
+        if bits <= settings.NEARDUP_DISTANCE and (nearest is None or bits < nearest[0]):
+            nearest = bits, cluster or content
+    return nearest[1] if nearest else None
+
+
+def add(content, text):
+    '''Index `content` by SimHash of its `text` and put it in the cluster
+    of its nearest article. Returns uuid of the cluster.'''
+    fingerprint = simhash(text)
+    cluster = str(content.uuid)
+    if fingerprint is not None:
+        cluster = find_cluster(fingerprint, exclude=cluster) or cluster
+    with transaction.atomic():
+        SimHashBand.objects.filter(content=content.uuid).delete()
+        if fingerprint is not None:
+            SimHashBand.objects.bulk_create([SimHashBand(content_id=content.uuid, key=key)
+                                             for key in get_bands(fingerprint)])
+        UrlContent.objects.filter(uuid=content.uuid).update(
+            simhash=None if fingerprint is None else to_signed(fingerprint), cluster=cluster)
+    content.simhash = None if fingerprint is None else to_signed(fingerprint)
+    content.cluster_id = cluster
+    return cluster
+
+
+def get_cluster(content):
+    return str(content.cluster_id or content.uuid)
+
+
+def collapse(links):
+    '''`links` grouped by cluster of their content, groups ordered by
+    their first link.'''
+    clusters = OrderedDict()
+    for link in links:
+        clusters.setdefault(get_cluster(link.content), []).append(link)
+    return list(clusters.values())
+
+
+def get_latest(links):
+    '''uuids of the latest of `links` of every cluster, mapped to uuids
+    of all of `links` in its cluster.'''
+    clusters = OrderedDict()
+    for uuid, content, cluster in links.order_by('-url_shared').values_list('uuid', 'content', 'content__cluster'):
+        clusters.setdefault(str(cluster or content), []).append(str(uuid))
+    return {uuids[0]: uuids for uuids in clusters.values()}
+
+
+def set_cluster_sharers(links, latest):
+    '''Set `cluster_shared_from` of `links` to accounts which shared any
+    link of their cluster, see get_latest.'''
+    uuids = [uuid for link in links for uuid in latest[str(link.uuid)]]
+    sharers = {}
+    for shared in UrlShared.shared_from.through.objects.filter(urlshared__in=uuids).select_related('twitteraccount'):
+        sharers.setdefault(shared.urlshared_id, []).append(shared.twitteraccount)
+    for link in links:
+        accounts = OrderedDict()
+        for uuid in latest[str(link.uuid)]:
+            for account in sharers.get(uuid, []):
+                accounts.setdefault(account.uuid, account)
+        link.cluster_shared_from = list(accounts.values())
@@ -0,0 +1,71 @@
+'''Embed html of statuses on Twitter(TWITTER_OEMBED_URL), cached by
+status id for OEMBED_CACHE_TTL seconds as quoted and retweeted
+statuses are shared by many accounts. Statuses missing from the cache
+are resolved concurrently over a pool of OEMBED_CONCURRENCY keep-alive
+connections.
+
+'''
+import asyncio
+
+import aiohttp
+from django.conf import settings
+
+from feeds.canonical import get_status_id
+from feeds.utils import get_redis
+
+
+class OEmbedError(Exception):
+    def __init__(self, url, status):
+        self.status = status
+        super(OEmbedError, self).__init__('oEmbed of %s responded with %s' % (url, status))
+
+
+def cache_key(status_id):
+    return 'oembed:%s' % status_id
+
+
+async def fetch_embed(session, url):
+    async with session.get(settings.TWITTER_OEMBED_URL, params={'url': url}) as response:
+        if response.status != 200:
+            raise OEmbedError(url, response.status)
+        return (await response.json())['html']
+
+
+async def _fetch_embeds(urls, loop):
+    connector = aiohttp.TCPConnector(limit=settings.OEMBED_CONCURRENCY, loop=loop)
+    async with aiohttp.ClientSession(connector=connector, loop=loop) as session:
+        return await asyncio.gather(*[fetch_embed(session, url) for url in urls],
+                                    loop=loop, return_exceptions=True)
+
+
+def get_embeds(urls):
+    '''Embed html of status `urls`, a dict of url to html or to the
+    exception resolving it raised.'''
+    urls = sorted(set(urls))
+    if not urls:
+        return {}
+    redis = get_redis()
+    keys = [cache_key(get_status_id(url) or url) for url in urls]
+    embeds = {url: html.decode('utf-8') for url, html in zip(urls, redis.mget(keys)) if html}
+    # One url of each status missing from the cache
+    missing = {}
+    for url, key in zip(urls, keys):
+        if url not in embeds:
+            missing.setdefault(key, url)
+    if missing:
+        missing = sorted(missing.items())
+        loop = asyncio.new_event_loop()
+        try:
+            results = dict(zip([key for key, url in missing],
+                               loop.run_until_complete(_fetch_embeds([url for key, url in missing], loop))))
+        finally:
+            loop.close()
+        pipe = redis.pipeline()
+        for key, result in results.items():
+            if not isinstance(result, Exception):
+                pipe.set(key, result, ex=settings.OEMBED_CACHE_TTL)
+        pipe.execute()
+        for url, key in zip(urls, keys):
+            if url not in embeds:
+                embeds[url] = results[key]
+    return embeds
@@ -0,0 +1,148 @@
+'''Politeness towards hosts we fetch links from, shared by all workers
+through Redis.
+
+A host gets at most HOST_CONCURRENCY fetches at a time, started at
+least HOST_MIN_DELAY seconds apart. The delay doubles with every
+consecutive failure of the host(connection errors, timeouts, 429 and
+5xx responses) up to HOST_MAX_BACKOFF and is back to normal after a
+success. Instead of waiting for a busy host callers get `HostBusy`
+with a start time reserved for them. Slots of a host are handed out a
+delay apart in the order they are asked for, so workers move on to
+links of other hosts meanwhile and come back once, at their own slot.
+
+'''
+from contextlib import contextmanager
+import math
+import time
+from urllib import parse
+import uuid
+
+from django.conf import settings
+import requests
+
+from feeds.utils import get_redis
+
+# KEYS[1]: fetches in flight(sorted set of leases by expiry),
+# KEYS[2]: state of the host(next_at, paused_until, failures). ARGV:
+# now, concurrency, min delay, max backoff, lease ttl, lease, slot
+# reserved earlier or 0. Returns 0 with the lease taken or start time
+# of the slot reserved for the caller.
+ACQUIRE_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local concurrency = tonumber(ARGV[2])
+local min_delay = tonumber(ARGV[3])
+local max_backoff = tonumber(ARGV[4])
+local lease_ttl = tonumber(ARGV[5])
+local reserved_at = tonumber(ARGV[7])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local state = redis.call('HMGET', KEYS[2], 'next_at', 'paused_until', 'failures')
+local next_at = tonumber(state[1]) or 0
+local paused_until = tonumber(state[2]) or 0
+local failures = tonumber(state[3]) or 0
+local delay = math.min(max_backoff, min_delay * math.pow(2, failures))
+local full = redis.call('ZCARD', KEYS[1]) >= concurrency
+-- next_at is already past a slot reserved earlier
+local start = math.max(reserved_at > 0 and reserved_at or next_at, paused_until)
+if start <= now and not full then
+    redis.call('ZADD', KEYS[1], now + lease_ttl, ARGV[6])
+    redis.call('EXPIRE', KEYS[1], lease_ttl)
+    if reserved_at == 0 then
+        next_at = now + delay
+        redis.call('HSET', KEYS[2], 'next_at', tostring(next_at))
+    end
+    redis.call('EXPIRE', KEYS[2], math.ceil(math.max(next_at - now, 0)) + max_backoff * 2)
+    return '0'
+end
+-- Next free slot, a delay after the last one handed out
+local slot = math.max(next_at, paused_until, now)
+if full then
+    slot = math.max(slot, now + delay)
+end
+redis.call('HSET', KEYS[2], 'next_at', tostring(slot + delay))
+redis.call('EXPIRE', KEYS[2], math.ceil(slot + delay - now) + max_backoff * 2)
+return tostring(slot)
+'''
+
+_acquire_script = None
+
+
+class HostBusy(Exception):
+    def __init__(self, host, retry_after, reserved_at):
+        self.host = host
+        self.retry_after = retry_after
+        self.reserved_at = reserved_at
+        super(HostBusy, self).__init__('%s is busy, retry after %ds' % (host, retry_after))
+
+
+def get_host(url):
+    return (parse.urlsplit(url).hostname or '').lower()
+
+
+def inflight_key(host):
+    return 'politeness:%s:inflight' % host
+
+
+def state_key(host):
+    return 'politeness:%s' % host
+
+
+def acquire(host, reserved_at=None):
+    '''Take a fetch slot of `host`, returns its lease. Raises HostBusy
+    with a slot reserved for the caller if the host can't be fetched
+    yet, the slot is taken by passing its `reserved_at` back.'''
+    global _acquire_script
+    if _acquire_script is None:
+        _acquire_script = get_redis().register_script(ACQUIRE_SCRIPT)
+    lease = uuid.uuid4().hex
+    now = time.time()
+    slot = float(_acquire_script(keys=[inflight_key(host), state_key(host)],
+                                 args=[now, settings.HOST_CONCURRENCY, settings.HOST_MIN_DELAY,
+                                       settings.HOST_MAX_BACKOFF, settings.HOST_LEASE_TTL, lease,
+                                       reserved_at or 0]))
+    if slot:
+        raise HostBusy(host, int(math.ceil(slot - now)), slot)
+    return lease
+
+
+def release(host, lease, failed=False):
+    '''Give back slot `lease` of `host`, a failed fetch backs the host
+    off.'''
+    redis = get_redis()
+    pipe = redis.pipeline()
+    pipe.zrem(inflight_key(host), lease)
+    if failed:
+        pipe.hincrby(state_key(host), 'failures', 1)
+    else:
+        pipe.hdel(state_key(host), 'failures')
+    pipe.execute()
+    if failed:
+        failures = int(redis.hget(state_key(host), 'failures') or 1)
+        backoff = min(settings.HOST_MAX_BACKOFF, settings.HOST_MIN_DELAY * 2 ** failures)
+        redis.hset(state_key(host), 'paused_until', time.time() + backoff)
+        # Slots may be reserved further ahead than the backoff
+        redis.expire(state_key(host), max(redis.ttl(state_key(host)) or 0, settings.HOST_MAX_BACKOFF * 2))
+
+
+def is_host_failure(error):
+    '''Whether `error` says the host is struggling rather than the page
+    being missing.'''
+    if not isinstance(error, requests.RequestException):
+        return False
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+
+@contextmanager
+def slot(url, reserved_at=None):
+    '''Fetch `url` within the limits of its host, at the slot
+    `reserved_at` if one was reserved.'''
+    host = get_host(url)
+    lease = acquire(host, reserved_at)
+    failed = False
+    try:
+        yield
+    except Exception as e:
+        failed = is_host_failure(e)
+        raise
+    finally:
+        release(host, lease, failed)
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+
+from feeds.utils import get_redis
+
+
+class ProgressReporter(object):
+    '''Reports PROGRESS state of a celery task, coalescing updates so
+    that the result backend is written at most once every
+    PROGRESS_INTERVAL seconds unless progress moved by PROGRESS_STEP
+    percent since the last write. `finish` is always written.
+
+    Updates of a task(`task_id`) coming from several workers, like
+    batches of update_accounts_task, are throttled together through
+    Redis when `shared` is set, `reported` is then the count known to
+    be done before this worker's share.
+
+    '''
+    def __init__(self, task, total, task_id=None, shared=False, reported=0, interval=None, step=None):
+        self.task = task
+        self.total = total
+        self.task_id = task_id
+        self.shared = shared
+        self.interval = settings.PROGRESS_INTERVAL if interval is None else interval
+        self.step = settings.PROGRESS_STEP if step is None else step
+        self.last_reported = None
+        self.last_count = reported
+
+    def percent(self, count):
+        return 100.0 * count / self.total if self.total else 100.0
+
+    def is_due(self, count):
+        if self.percent(count) - self.percent(self.last_count) >= self.step:
+            return True
+        if self.shared:
+            key = 'progress-throttle:%s' % (self.task_id or self.task.request.id)
+            return bool(get_redis().set(key, 1, nx=True, px=int(self.interval * 1000)))
+        return self.last_reported is None or time.time() - self.last_reported >= self.interval
+
+    def update(self, count, info, force=False):
+        '''Report `count` out of total done, returns True if it got
+        written.'''
+        if not force and not self.is_due(count):
+            return False
+        meta = {'info': info,
+                'count': count,
+                'total': self.total,
+                }
+        self.task.update_state(task_id=self.task_id, state='PROGRESS', meta=meta)
+        self.last_reported = time.time()
+        self.last_count = count
+        return True
+
+    def finish(self, count, info):
+        return self.update(count, info, force=True)
@@ -0,0 +1,120 @@
+'''Token bucket budgets of Twitter API calls, per AuthToken and per
+endpoint, shared by all workers through Redis.
+
+Buckets hold as many calls as the endpoint allows in a rate limit
+window and refill continuously. Instead of sleeping when a bucket is
+empty callers get `RateLimited` with the number of seconds after which
+the call can be made, to reschedule the work or to move it to another
+token.
+
+'''
+import math
+import time
+
+from django.conf import settings
+
+from feeds.utils import get_redis
+
+# KEYS[1]: bucket, ARGV: capacity, refill rate(calls/second), now,
+# calls requested. Calls are taken only if there are enough of them,
+# returns calls left in the bucket and seconds to wait for requested
+# calls otherwise.
+TAKE_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return {tostring(tokens), tostring(wait)}
+'''
+
+_take_script = None
+
+
+class RateLimited(Exception):
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super(RateLimited, self).__init__('Rate limit of %s exhausted, retry after %ds' % (endpoint, retry_after))
+
+
+def bucket_key(auth_token_uuid, endpoint):
+    return 'ratelimit:%s:%s' % (auth_token_uuid, endpoint)
+
+
+def get_capacity(endpoint):
+    return settings.TWITTER_RATE_LIMITS.get(endpoint, settings.TWITTER_RATE_LIMITS['default'])
+
+
+def get_rate(endpoint):
+    '''Calls of `endpoint` regained per second.'''
+    return get_capacity(endpoint) / settings.TWITTER_RATE_LIMIT_WINDOW
+
+
+def _take(auth_token_uuid, endpoint, count):
+    global _take_script
+    if _take_script is None:
+        _take_script = get_redis().register_script(TAKE_SCRIPT)
+    tokens, wait = _take_script(keys=[bucket_key(auth_token_uuid, endpoint)],
+                                args=[get_capacity(endpoint), get_rate(endpoint), time.time(), count])
+    return float(tokens), float(wait)
+
+
+def acquire(auth_token_uuid, endpoint, count=1):
+    '''Take `count` calls of `endpoint` from budget of the token, raises
+    RateLimited if there aren't enough left.'''
+    tokens, wait = _take(auth_token_uuid, endpoint, count)
+    if wait:
+        raise RateLimited(endpoint, int(math.ceil(wait)))
+
+
+def remaining(auth_token_uuid, endpoint):
+    return int(_take(auth_token_uuid, endpoint, 0)[0])
+
+
+def get_retry_after(auth_token_uuid, endpoint):
+    '''Seconds after which `endpoint` can be called with the token.'''
+    tokens = _take(auth_token_uuid, endpoint, 0)[0]
+    return int(math.ceil(max(0, 1 - tokens) / get_rate(endpoint)))
+
+
+def update(auth_token_uuid, endpoint, calls_left, reset_at):
+    '''Align budget with what Twitter reports(x-rate-limit-* headers).
+
+    Empty bucket is pushed below zero so that it refills exactly by
+    `reset_at`.
+
+    '''
+    now = time.time()
+    tokens = calls_left
+    if calls_left <= 0:
+        tokens = -max(0, reset_at - now) * get_rate(endpoint)
+    key = bucket_key(auth_token_uuid, endpoint)
+    redis = get_redis()
+    redis.hmset(key, {'tokens': tokens, 'ts': now})
+    redis.expire(key, settings.TWITTER_RATE_LIMIT_WINDOW * 2)
+
+
+def exhaust(auth_token_uuid, endpoint, reset_at=None):
+    if reset_at is None:
+        reset_at = time.time() + settings.TWITTER_RATE_LIMIT_WINDOW
+    update(auth_token_uuid, endpoint, 0, reset_at)
+
+
+def get_budget(auth_token_uuid):
+    '''Remaining calls of the token for every endpoint we use.'''
+    return {endpoint: {'remaining': remaining(auth_token_uuid, endpoint),
+                       'limit': limit}
+            for endpoint, limit in settings.TWITTER_RATE_LIMITS.items()
+            if endpoint != 'default'}
@@ -0,0 +1,200 @@
+'''Local fake of the parts of Twitter(and of the web) we talk to, for
+replaying realistic timelines without network access.
+
+`FakeTwitter` serves friends/ids, users/lookup, statuses/user_timeline,
+oEmbed and the articles linked from statuses, all generated
+deterministically from the scale it is created with:
+
+    users              AuthTokens, with access tokens `replay-<n>`
+    follows            accounts followed by every user, drawn from a
+                       shared pool of `accounts` so follows overlap
+    tweets             statuses in the timeline of every account
+    articles           pool of articles linked from statuses, so that
+                       the same article is shared by several accounts
+    suspended          ids of accounts users/lookup doesn't return,
+                       it answers 404 when none of the ids are found
+
+`friends` maps a user to ids it follows instead of the generated ones,
+to replay follows changing.
+
+Point TWITTER_API_URL and TWITTER_OEMBED_URL to `api_url` and
+`oembed_url` of a started FakeTwitter.
+
+'''
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib import parse
+import json
+import re
+import threading
+
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod '
+             'tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, '
+             'quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. ')
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeTwitter(object):
+    def __init__(self, users=1, follows=10, tweets=20, accounts=None, articles=None,
+                 article_size=8000, now=None, suspended=()):
+        self.users = users
+        self.follows = follows
+        self.tweets = tweets
+        self.accounts = accounts or max(follows, follows * users // 2)
+        self.articles = articles or max(1, self.accounts * tweets // 2)
+        self.article_size = article_size
+        self.suspended = set(suspended)
+        self.friends = {}
+        self.now = now or datetime.utcnow().replace(microsecond=0)
+        self.server = None
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%s' % self.server.server_port
+
+    @property
+    def api_url(self):
+        return self.base_url + '/1.1/'
+
+    @property
+    def oembed_url(self):
+        return self.base_url + '/oembed'
+
+    def start(self):
+        fake = self
+
+        class Handler(FakeTwitterHandler):
+            twitter = fake
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count_request(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def access_token(self, user):
+        return 'replay-%d' % user
+
+    def friend_ids(self, user):
+        if user in self.friends:
+            return list(self.friends[user])
+        first = user * self.follows // 2
+        return [self.account_id((first + i) % self.accounts) for i in range(self.follows)]
+
+    def account_id(self, account):
+        return 1000 + account
+
+    def user(self, account_id):
+        account = account_id - 1000
+        return {'id': account_id,
+                'id_str': str(account_id),
+                'screen_name': 'account_%d' % account,
+                'name': 'Account %d' % account,
+                'url': '%s/accounts/%d' % (self.base_url, account),
+                'profile_image_url_https': '%s/accounts/%d.png' % (self.base_url, account)}
+
+    def status(self, account, tweet):
+        '''`tweet`th status of `account`, the latest one being tweets - 1'''
+        status_id = (account + 1) * 1000000 + tweet
+        article = (account * self.tweets + tweet) % self.articles
+        urls = [{'expanded_url': '%s/articles/%d' % (self.base_url, article)}]
+        if tweet % 5 == 4:
+            # Every fifth status quotes a status of another account
+            quoted_account = (account + 1) % self.accounts
+            urls.append({'expanded_url': 'https://twitter.com/account_%d/status/%d' % (
+                quoted_account, (quoted_account + 1) * 1000000 + tweet - 1)})
+        created_at = self.now - timedelta(minutes=10 * (self.tweets - tweet))
+        return {'id': status_id,
+                'id_str': str(status_id),
+                'created_at': created_at.strftime(CREATED_AT_FORMAT),
+                'text': 'Status %d of account_%d about article %d' % (tweet, account, article),
+                'user': self.user(self.account_id(account)),
+                'entities': {'urls': urls}}
+
+    def has_status(self, status_id):
+        account, tweet = divmod(status_id, 1000000)
+        return 0 < account <= self.accounts and tweet < self.tweets
+
+    def timeline(self, screen_name, since_id=0, count=20):
+        account = int(screen_name.rsplit('_', 1)[-1])
+        statuses = [self.status(account, tweet) for tweet in reversed(range(self.tweets))]
+        return [status for status in statuses if status['id'] > since_id][:count]
+
+    def article(self, article):
+        paragraphs = '\n'.join('<p>%s</p>' % PARAGRAPH for i in range(max(1, self.article_size // len(PARAGRAPH))))
+        return ('<html><head><title>Article %d</title></head><body><article><h1>Article %d</h1>'
+                '<p class="byline">By Replay</p>%s</article></body></html>' % (article, article, paragraphs))
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    twitter = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json', status=200):
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-rate-limit-remaining', '1000000')
+        self.send_header('x-rate-limit-reset', '0')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_user(self):
+        match = re.search(r'oauth_token="replay-(\d+)"', self.headers.get('Authorization', ''))
+        return int(match.group(1)) if match else None
+
+    def do_GET(self):
+        parsed_url = parse.urlparse(self.path)
+        params = dict(parse.parse_qsl(parsed_url.query))
+        path = parsed_url.path
+        twitter = self.twitter
+        twitter.count_request('/articles' if path.startswith('/articles/') else path)
+        if path.startswith('/1.1/') and self.get_user() is None:
+            return self.send_body(json.dumps({'errors': [{'code': 89}]}), status=401)
+        if path == '/1.1/friends/ids.json':
+            return self.send_body(json.dumps({'ids': twitter.friend_ids(self.get_user()),
+                                              'next_cursor': 0,
+                                              'previous_cursor': 0}))
+        if path == '/1.1/users/lookup.json':
+            users = [twitter.user(int(user_id)) for user_id in params['user_id'].split(',')
+                     if int(user_id) not in twitter.suspended]
+            if not users:
+                return self.send_body(json.dumps({'errors': [{'code': 17}]}), status=404)
+            return self.send_body(json.dumps(users))
+        if path == '/1.1/statuses/user_timeline.json':
+            return self.send_body(json.dumps(twitter.timeline(params['screen_name'],
+                                                              int(params.get('since_id', 0)),
+                                                              int(params.get('count', 20)))))
+        if path == '/oembed':
+            match = re.search(r'/status/(\d+)', params.get('url', ''))
+            if not match or not twitter.has_status(int(match.group(1))):
+                return self.send_body(json.dumps({'errors': [{'code': 34}]}), status=404)
+            return self.send_body(json.dumps({'html': '<blockquote class="twitter-tweet">%s</blockquote>' % params['url']}))
+        match = re.match(r'^/articles/(\d+)$', path)
+        if match:
+            return self.send_body(twitter.article(int(match.group(1))), 'text/html; charset=utf-8')
+        self.send_body(json.dumps({'errors': [{'code': 34}]}), status=404)
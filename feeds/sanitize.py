@@ -0,0 +1,13 @@
+'''Removal of characters which aren't allowed in XML 1.0, done once
+when text is stored so that feeds are written out of it as is.
+
+'''
+import re
+
+# Complement of https://www.w3.org/TR/xml/#charsets
+INVALID_XML_CHARS = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def sanitize(text):
+    '''`text` without characters which can't be written in XML.'''
+    return INVALID_XML_CHARS.sub('', text)
@@ -0,0 +1,77 @@
+'''Adaptive polling cadence of TwitterAccount timelines.
+
+Accounts are polled about as often as it takes them to tweet
+POLL_STATUSES_PER_POLL statuses, clamped between POLL_INTERVAL_MIN and
+POLL_INTERVAL_MAX seconds. Every poll which finds nothing new backs
+off the interval by POLL_BACKOFF, so dormant accounts drift towards
+POLL_INTERVAL_MAX. A full page of TIMELINE_COUNT statuses may have
+left statuses out, those accounts are polled at POLL_INTERVAL_MIN.
+
+'''
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from feeds.models import TwitterAccount
+
+
+def get_poll_interval(twitter_account, last_updated, tweeted_at, full=False):
+    '''Seconds until next poll of `twitter_account` given when it had
+    last tweeted before this poll(`last_updated`), timestamps of the
+    new statuses found(`tweeted_at`) and whether they came in a `full`
+    page.'''
+    if not tweeted_at:
+        interval = max(twitter_account.poll_interval, settings.POLL_INTERVAL_MIN) * settings.POLL_BACKOFF
+    elif full:
+        interval = settings.POLL_INTERVAL_MIN
+    else:
+        now = timezone.now()
+        since = now - datetime.timedelta(seconds=settings.POLL_RATE_WINDOW)
+        # Rate is measured from the previous status when it is recent,
+        # from the oldest status found otherwise(like for accounts seen
+        # for the first time)
+        since = last_updated if last_updated >= since else min(tweeted_at)
+        # Mean seconds between statuses over the recent window
+        gap = max((now - since).total_seconds(), 0) / len(tweeted_at)
+        interval = gap * settings.POLL_STATUSES_PER_POLL
+    return int(min(max(interval, settings.POLL_INTERVAL_MIN), settings.POLL_INTERVAL_MAX))
+
+
+def schedule_next_poll(twitter_account, last_updated, tweeted_at, full=False):
+    twitter_account.poll_interval = get_poll_interval(twitter_account, last_updated, tweeted_at, full)
+    twitter_account.next_poll = timezone.now() + datetime.timedelta(seconds=twitter_account.poll_interval)
+
+
+LEASE_SQL = '''
+UPDATE {account} account SET next_poll = %s
+WHERE EXISTS (SELECT 1 FROM {followed_from} followed_from
+              WHERE followed_from.twitteraccount_id = account.uuid {followers}) {due}
+RETURNING account.uuid
+'''
+
+
+def lease_polls(auth_token_uuids=None, due=True):
+    '''Push next_poll of followed accounts(only of `auth_token_uuids` if
+    given) which are due(all of them unless `due`) POLL_LEASE seconds
+    ahead and return their uuids. Accounts are picked and leased in a
+    single statement, so ones whose poll is still running or waiting
+    for rate limit aren't dispatched again by the next run. A poll sets
+    next_poll once it is done, see schedule_next_poll.'''
+    now = timezone.now()
+    params = [now + datetime.timedelta(seconds=settings.POLL_LEASE)]
+    followers = ''
+    if auth_token_uuids is not None:
+        followers = 'AND followed_from.authtoken_id = ANY(%s)'
+        params.append([str(auth_token_uuid) for auth_token_uuid in auth_token_uuids])
+    where = ''
+    if due:
+        where = 'AND account.next_poll <= %s'
+        params.append(now)
+    sql = LEASE_SQL.format(account=TwitterAccount._meta.db_table,
+                           followed_from=TwitterAccount.followed_from.through._meta.db_table,
+                           followers=followers, due=where)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return sorted(str(row[0]) for row in cursor.fetchall())
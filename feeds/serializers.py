@@ -25,12 +25,20 @@ class TwitterAccountSerializer(serializers.ModelSerializer):
 
 class UrlSerializer(serializers.ModelSerializer):
     shared_from = TwitterAccountSerializer(many=True)
+    cleaned_text = serializers.CharField(source='content.cleaned_text', read_only=True)
+    url_json = serializers.JSONField(source='content.url_json', read_only=True)
 
     class Meta:
         model = UrlShared
         fields = ('uuid', 'url', 'shared_from', 'url_shared', 'url_seen', 'quoted_text', 'cleaned_text', 'url_json')
 
 
+class ClusterSerializer(UrlSerializer):
+    """Latest link of near-duplicates with accounts which shared any of
+    them, see feeds.neardup."""
+    shared_from = TwitterAccountSerializer(many=True, source='cluster_shared_from')
+
+
 class StatusSerializer(serializers.ModelSerializer):
     tweet_from = TwitterAccountSerializer()
 
@@ -0,0 +1,63 @@
+// Long running content extractor, see feeds/extract.py
+//
+// Reads requests as json lines from stdin:
+//   {"id": .., "url": .., "html": ..}  readability article of `html`, or
+//                                      of `url` when there is no html
+//   {"id": .., "ping": true}           health check
+// and writes a json line for each to stdout with the same id, the
+// article or an error and rss of the process.
+var path = require("path");
+var readline = require("readline");
+var url = require("url");
+var jsdom = require("jsdom");
+var readability = require(path.join(__dirname, "readability/index"));
+
+var Readability = readability.Readability;
+
+function respond(response) {
+  response.rss = process.memoryUsage().rss;
+  process.stdout.write(JSON.stringify(response) + "\n");
+}
+
+function extract(request) {
+  var config = {
+    url: request.url,
+    scripts: [],
+    done: function (err, window) {
+      if (!window) {
+        respond({id: request.id, error: String(err)});
+        return;
+      }
+      try {
+        respond({id: request.id, article: new Readability(url.parse(request.url), window.document).parse()});
+      } catch (e) {
+        respond({id: request.id, error: String(e)});
+      }
+      window.close();
+    }
+  };
+  if (request.html) {
+    config.html = request.html;
+  }
+  jsdom.env(config);
+}
+
+var lines = readline.createInterface({input: process.stdin});
+lines.on("line", function (line) {
+  var request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    respond({error: String(e)});
+    return;
+  }
+  if (request.ping) {
+    respond({id: request.id});
+  } else {
+    extract(request);
+  }
+});
+// Parent went away
+lines.on("close", function () {
+  process.exit(0);
+});
@@ -1,39 +1,29 @@
-from os import path
 import datetime
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element, SubElement, Comment
-from xml.dom import minidom
+import time
 from django.conf import settings
 from django.contrib.staticfiles.templatetags.staticfiles import static
-from feedgen.feed import FeedGenerator
-import pytz
 import tweepy
-from Naked.toolshed.shell import muterun_js
-import json
 from django.utils import timezone
-from feeds.models import AuthToken, TwitterAccount, UrlShared, TwitterStatus, PushNotificationToken
+from feeds.models import AuthToken, TwitterAccount, UrlContent, PushNotificationToken
+from feeds.canonical import get_status_id, is_shortened, resolve_content
+from feeds.extract import ExtractError, extract
+from feeds import contentstore, deadlinks, feedcache, fetchstate, httpcache, inbox, neardup, politeness
+from feeds.politeness import get_host
+from feeds.oembed import get_embeds
+from feeds.ingest import bulk_insert_ignore, ingest_timeline, parse_created_at
+from feeds.progress import ProgressReporter
+from feeds.ratelimit import RateLimited
+from feeds.schedule import lease_polls, schedule_next_poll
+from feeds.twitter import TwitterError, api_get, get_api, fetch_timelines
+from feeds.utils import get_redis
+from feeds.xmlwriter import write_opml
 from sofee.celery import app
+from celery import chord
+from celery.exceptions import Ignore
 import requests
-from urllib import parse
 from pyfcm import FCMNotification
 
 
-def valid_xml_char_ordinal(c):
-    '''function to avoid control characters from the cleaned_text taken
-    from SO:
-    http://stackoverflow.com/questions/8733233/filtering-out-certain-bytes-in-python
-
-    '''
-    codepoint = ord(c)
-    # conditions ordered by presumed frequency
-    return (
-        0x20 <= codepoint <= 0xD7FF or
-        codepoint in (0x9, 0xA, 0xD) or
-        0xE000 <= codepoint <= 0xFFFD or
-        0x10000 <= codepoint <= 0x10FFFF
-    )
-
-
 @app.task(bind=True)
 def update_user_cache(self, uuid):
     fcm_id_info_url = 'https://iid.googleapis.com/iid/info/'
@@ -78,170 +68,359 @@ def update_feed(self, uuid):
     accounts = TwitterAccount.objects.filter(followed_from__uuid=uuid)
     if not accounts:
         return
-    time_threshold = timezone.now() - datetime.timedelta(hours=24)
-    fg = FeedGenerator()
-    fg.id('https://twitter.com/%s' % auth_token.screen_name)
-    fg.description('Links shared by people you follow')
-    fg.title(auth_token.screen_name)
-    fg.link(href='https://twitter.com/%s' % auth_token.screen_name, rel='alternate')
-    # fg.language('en')
-    print('Parsing links shared by people followed from', auth_token.screen_name)
-    # FIXME: Distinct over url field to avoid duplicate entries.
-    for link in UrlShared.objects.filter(shared_from__in=[account.uuid for account in accounts], url_shared__gte=time_threshold):
-        fe = fg.add_entry()
-        fe.id(link.url)
-        fe.author({'name': ', '.join([shared_from.screen_name for shared_from in link.shared_from.all()])})
-        fe.title(link.url)
-        cleaned_string = 'Quote: ' + ''.join(c for c in link.quoted_text if valid_xml_char_ordinal(c)) + \
-                         '<br/>' + \
-                         ''.join(c for c in link.cleaned_text if valid_xml_char_ordinal(c))
-        fe.content(cleaned_string,
-                   type='html')
-        fe.published(link.url_shared)
-        fe.pubdate(link.url_shared)
-    print('Dumping links for', auth_token.screen_name, 'in feed file')
-    with open('feeds/static/xml/%s-feed.xml' % auth_token.uuid, 'wb') as feed:
-        feed.write(fg.atom_str(pretty=True))
+    feedcache.build(auth_token, accounts, 'feeds/static/xml/%s-feed.xml' % auth_token.uuid)
     print('Successfully updated feed for', auth_token.screen_name)
 
 
-@app.task(bind=True, time_limit=10)
-def fetch_links(self, link_uuid):
+def queue_fetches(content_uuids, refetch=False):
+    '''Queue fetch_links for content of `content_uuids` which isn't
+    fetched, queued or being fetched already, see feeds.fetchstate.
+    `refetch` queues fetched content as well. Statuses on Twitter are
+    embedded in batches of OEMBED_BATCH.'''
+    statuses = []
+    for content_uuid, canonical_url in sorted(fetchstate.mark_queued(content_uuids, refetch).items()):
+        if get_status_id(canonical_url):
+            statuses.append(content_uuid)
+        else:
+            fetch_links.apply_async([content_uuid])
+    for i in range(0, len(statuses), settings.OEMBED_BATCH):
+        fetch_embeds.apply_async([statuses[i:i + settings.OEMBED_BATCH]])
+
+
+@app.task(bind=True)
+def requeue_fetches_task(self):
+    '''Queue again failed fetches which are due and those whose task
+    got lost.'''
+    queue_fetches(fetchstate.due(settings.FETCH_REQUEUE_BATCH))
+
+
+@app.task(bind=True)
+def refresh_fetches_task(self):
+    '''Queue fetches again of links which are still being shared, so
+    that changed pages get extracted again.'''
+    queue_fetches(fetchstate.due_refresh(settings.FETCH_REQUEUE_BATCH), refetch=True)
+
+
+@app.task(bind=True)
+def collect_content_task(self):
+    '''Delete articles no content points to any more.'''
+    print('Deleted', contentstore.collect(), 'unused articles')
+
+
+def store_embeds(contents):
+    '''Store embed html of `contents`, statuses on Twitter being
+    fetched.'''
+    embeds = get_embeds([content.url for content in contents])
+    for content in contents:
+        html = embeds[content.url]
+        if isinstance(html, Exception):
+            print('Not able to embed url: %s for %s' % (content.url, html))
+            # Deleted or protected status
+            fetchstate.failed(content.uuid, content.fetch_failures + 1,
+                              permanent=getattr(html, 'status', None) in (403, 404))
+            continue
+        content.blob_id = contentstore.store(html)
+        content.save(update_fields=['blob'])
+        fetchstate.done(content.uuid)
+
+
+@app.task(bind=True, time_limit=60)
+def fetch_embeds(self, content_uuids):
+    '''Embed a batch of statuses on Twitter.'''
+    store_embeds(list(UrlContent.objects.filter(uuid__in=fetchstate.claim_all(content_uuids))))
+
+
+def fetch_failed(content, started, error, host_failure=False, permanent=False):
+    print('Not able to fetch url: %s for %s' % (content.url, error))
+    deadlinks.record(get_host(content.url), time.time() - started, failed=True, host_failure=host_failure)
+    fetchstate.failed(content.uuid, content.fetch_failures + 1, permanent=permanent)
+
+
+@app.task(bind=True, time_limit=15, max_retries=None)
+def fetch_links(self, content_uuid, reserved_at=None):
+    if not fetchstate.claim(content_uuid):
+        # Fetched or being fetched through another message
+        return
     try:
-        link_obj = UrlShared.objects.get(uuid=link_uuid)
-    except UrlShared.DoesNotExist:
+        content = UrlContent.objects.get(uuid=content_uuid)
+    except UrlContent.DoesNotExist:
         return
 
-    if link_obj.url.startswith('https://twitter.com/'):
-        tweet_embedded = requests.get('https://publish.twitter.com/oembed', {'url': link_obj.url})
-        if tweet_embedded.status_code == 200 and tweet_embedded.json():
-            link_obj.cleaned_text = tweet_embedded.json()['html']
-            link_obj.save()
+    if is_shortened(content.url):
+        content = resolve_content(content)
+        if str(content.uuid) != str(content_uuid):
+            # Shortened url has nothing of its own to fetch
+            fetchstate.done(content_uuid)
+            if not fetchstate.move(content.uuid, (fetchstate.NEW, fetchstate.FAILED), fetchstate.FETCHING):
+                # Shared earlier under its full url
+                return
+    if get_status_id(content.canonical_url):
+        store_embeds([content])
+        return
+    dead_for = deadlinks.dead_for(get_host(content.url))
+    if dead_for:
+        print('Not fetching url: %s of a dead host' % content.url)
+        fetchstate.failed(content.uuid, content.fetch_failures, retry_after=dead_for)
+        return
+    started = time.time()
+    try:
+        with politeness.slot(content.url, reserved_at):
+            page = httpcache.fetch(content.url, content.canonical_url)
+    except politeness.HostBusy as e:
+        fetchstate.requeue(content.uuid)
+        # Links of other hosts are fetched meanwhile, this one once its
+        # slot is due
+        raise self.retry(args=[content_uuid], kwargs={'reserved_at': e.reserved_at}, countdown=e.retry_after)
+    except requests.RequestException as e:
+        status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+        fetch_failed(content, started, e, host_failure=politeness.is_host_failure(e),
+                     permanent=status_code in settings.FETCH_PERMANENT_ERRORS)
+        return
+    if page is None:
+        print('Unchanged url: %s' % content.url)
+        deadlinks.record(get_host(content.url), time.time() - started)
+        fetchstate.done(content.uuid)
+        return
+    if not page.extractable:
+        print('Not extracting url: %s of type %s(%s bytes%s)' % (
+            content.url, page.content_type, page.size, ', too large' if page.too_large else ''))
+        content.url_json = page.get_metadata()
+        content.save(update_fields=['url_json'])
+        httpcache.remember(content.canonical_url, page)
+        deadlinks.record(get_host(content.url), time.time() - started)
+        fetchstate.done(content.uuid)
+        return
+    try:
+        parsed_content = extract(page.url, page.text)
+    except ExtractError as e:
+        fetch_failed(content, started, e)
+        return
+    if parsed_content:
+        content.blob_id = contentstore.store(parsed_content['content'], parsed_content['textContent'])
+        content.url_json = {'title': parsed_content['title'].strip(),
+                            'excerpt': parsed_content.get('excerpt', ''),
+                            'byline': parsed_content.get('byline', ''), }
+        content.save(update_fields=['blob', 'url_json'])
+        neardup.add(content, parsed_content['textContent'])
     else:
-        response = muterun_js('feeds/static/js/get_content.js', link_obj.url)
-        if response.exitcode == 0 and response.stdout:
-            # parsed_content = json.loads(response.stdout.decode('utf-8'))
-            # link_obj.cleaned_text = response.stdout.decode('utf-8')
-            # link_obj.save()
-            parsed_content = json.loads(response.stdout.decode('utf-8'))
-            if parsed_content:
-                link_obj.cleaned_text = parsed_content['content']
-                link_obj.url_json = {'title': parsed_content['title'].strip(),
-                                     'excerpt': parsed_content.get('excerpt', ''),
-                                     'byline': parsed_content.get('byline', ''),
-                                     'textContent': parsed_content['textContent'], }
-                link_obj.save()
-            else:
-                print('Got nothing from url: %s for %s' % (link_obj.url, response.stdout))
+        print('Got nothing from url: %s' % content.url)
+    httpcache.remember(content.canonical_url, page)
+    deadlinks.record(get_host(content.url), time.time() - started)
+    fetchstate.done(content.uuid)
+
+
+def sync_friends(task, auth_token):
+    '''Sync TwitterAccounts followed from `auth_token` with its friends on
+    Twitter.
+
+    Ids of friends(5000 a page) are diffed with stored follows and only
+    the follows which changed are written. Profiles are looked up, 100
+    at a time, only for accounts we don't know yet, batches none of
+    which exist any more(suspended or deleted) are skipped. When budget
+    of the token runs out RateLimited is raised, sync can simply be run
+    again as everything written so far stays valid.
+
+    '''
+    friend_ids = set()
+    cursor = -1
+    while cursor:
+        page = api_get(auth_token, 'friends/ids', cursor=cursor)
+        friend_ids.update(page['ids'])
+        cursor = page['next_cursor']
+    ProgressReporter(task, len(friend_ids)).finish(0, 'Found %d accounts you follow' % len(friend_ids))
+
+    through = TwitterAccount.followed_from.through
+    known = dict(TwitterAccount.objects.filter(twitter_id__in=friend_ids).values_list('twitter_id', 'uuid'))
+    unknown_ids = sorted(friend_ids - set(known))
+    progress = ProgressReporter(task, len(unknown_ids))
+    for i in range(0, len(unknown_ids), 100):
+        try:
+            users = api_get(auth_token, 'users/lookup', user_id=','.join(str(user_id) for user_id in unknown_ids[i:i + 100]))
+        except TwitterError as e:
+            if e.status != 404:
+                raise
+            # None of the batch exists any more(suspended or deleted)
+            users = []
+        existing = {twitter_account.screen_name: twitter_account for twitter_account in
+                    TwitterAccount.objects.filter(screen_name__in=[user['screen_name'] for user in users])}
+        for user in users:
+            twitter_account = existing.get(user['screen_name']) or \
+                TwitterAccount(screen_name=user['screen_name'],
+                               last_updated=timezone.now() - datetime.timedelta(days=365))
+            twitter_account.twitter_id = user['id']
+            twitter_account.account_json = user
+            twitter_account.save()
+            known[user['id']] = twitter_account.uuid
+        looked_up = min(i + 100, len(unknown_ids))
+        progress.update(looked_up, 'Looked up %d new accounts you follow' % looked_up,
+                        force=looked_up == len(unknown_ids))
+
+    followed = set(through.objects.filter(authtoken_id=auth_token.uuid).values_list('twitteraccount_id', flat=True))
+    following = set(str(account_uuid) for account_uuid in known.values())
+    bulk_insert_ignore(through,
+                       [through(twitteraccount_id=account_uuid, authtoken_id=str(auth_token.uuid))
+                        for account_uuid in following - followed],
+                       ('twitteraccount_id', 'authtoken_id'))
+    inbox.follow(auth_token.uuid, following - followed)
+    through.objects.filter(authtoken_id=auth_token.uuid, twitteraccount_id__in=followed - following).delete()
+    inbox.unfollow(auth_token.uuid, followed - following)
+    print('Synced follows of', auth_token.screen_name, len(following - followed), 'added',
+          len(followed - following), 'removed')
+
+
+def store_timeline(twitter_account, auth_token, statuses):
+    '''Store new `statuses`(raw json) of `twitter_account` fetched with
+    `auth_token` and schedule its next poll.
+
+    Returns True if new statuses were stored.
+
+    '''
+    # Check if there were no recent updates in the timeline by the author
+    tweeted_at = [parse_created_at(status['created_at']) for status in statuses
+                  if status['user']['screen_name'] == twitter_account.screen_name and parse_created_at(status['created_at']) > twitter_account.last_updated]
+    schedule_next_poll(twitter_account, twitter_account.last_updated, tweeted_at,
+                       full=len(statuses) >= settings.TIMELINE_COUNT)
+    if not tweeted_at:
+        twitter_account.save(update_fields=['next_poll', 'poll_interval'])
+        return False
+    count, content_uuids = ingest_timeline(twitter_account, auth_token, statuses)
+    queue_fetches(content_uuids)
+    print('Updated', twitter_account.screen_name, 'Added', count, 'Tweets')
+    return True
+
+
+@app.task(bind=True, max_retries=None)
+def poll_accounts_task(self, account_uuids, progress_id=None, total=0, updated_for=()):
+    '''Update timelines of a batch of TwitterAccounts.
+
+    Timelines are fetched concurrently, each with one of the tokens
+    following the account. Feeds of AuthTokens following accounts
+    which got new statuses are refreshed once the batch is done, their
+    uuids are returned. An account failing doesn't fail the batch.
+    Progress is accumulated on the coordinating task `progress_id` so
+    `get_status` can report it. Accounts none of whose followers have
+    budget left are retried once the earliest budget is back, keeping
+    the chord waiting on them.
+
+    '''
+    updated_for = set(updated_for)
+    deferred = []
+    retry_after = None
+    jobs = [(twitter_account, list(twitter_account.followed_from.all())) for twitter_account in
+            TwitterAccount.objects.filter(uuid__in=account_uuids).prefetch_related('followed_from')]
+    for (twitter_account, followers), result in zip(jobs, fetch_timelines(jobs)):
+        if isinstance(result, RateLimited):
+            deferred.append(str(twitter_account.uuid))
+            retry_after = result.retry_after if retry_after is None else min(retry_after, result.retry_after)
+        elif isinstance(result, Exception):
+            print('Failed to fetch timeline of', twitter_account.screen_name, result)
+            skip_poll(twitter_account)
         else:
-            print('Not able to fetch url: %s for %s' % (link_obj.url, response.stderr))
+            try:
+                if store_timeline(twitter_account, *result):
+                    updated_for.update(str(auth_token.uuid) for auth_token in followers)
+            except Exception as e:
+                print('Failed to store timeline of', twitter_account.screen_name, repr(e))
+                skip_poll(twitter_account)
+    for auth_token_uuid in updated_for:
+        update_feed.apply_async([auth_token_uuid])
+        update_user_cache.apply_async([auth_token_uuid])
+    if progress_id and len(account_uuids) > len(deferred):
+        key = 'progress:%s' % progress_id
+        redis = get_redis()
+        count = redis.incrby(key, len(account_uuids) - len(deferred))
+        redis.expire(key, settings.PROGRESS_TTL)
+        progress = ProgressReporter(self, total, task_id=progress_id, shared=True,
+                                    reported=count - len(account_uuids) + len(deferred))
+        progress.update(count, 'Fetched timelines of %d/%d accounts' % (count, total))
+    if deferred:
+        raise self.retry(args=[deferred, progress_id, total], countdown=retry_after)
+    return list(updated_for)
+
+
+def skip_poll(twitter_account):
+    '''Poll `twitter_account` again later as if nothing was new.'''
+    schedule_next_poll(twitter_account, twitter_account.last_updated, [])
+    twitter_account.save(update_fields=['next_poll', 'poll_interval'])
+
+
+@app.task(bind=True)
+def accounts_updated(self, results, synced, progress_id=None):
+    '''Chord callback of update_accounts_task, runs once all timelines
+    are fetched, refreshes feeds of users whose follows were synced
+    and marks the coordinating task `progress_id` done. Feeds of users
+    following updated accounts are refreshed by poll_accounts_task.
+
+    '''
+    for auth_token_uuid in synced:
+        update_feed.apply_async([auth_token_uuid])
+        update_user_cache.apply_async([auth_token_uuid])
+    message = 'Successfully updated accounts.'
+    if progress_id:
+        self.backend.mark_as_done(progress_id, message)
+    return message
 
 
 @app.task(bind=True)
+def polls_failed(self, failed_task_id, progress_id):
+    '''Error callback of the chord of update_accounts_task, marks the
+    coordinating task `progress_id` failed when a batch failed.'''
+    print('Polling timelines failed in', failed_task_id)
+    self.backend.mark_as_failure(progress_id, Exception('Failed to update accounts.'))
+
+
+@app.task(bind=True, max_retries=None)
 def update_accounts_task(self, uuid=''):
     try:
         auth_tokens = [AuthToken.objects.get(uuid=uuid)] if uuid else AuthToken.objects.all()
     except AuthToken.DoesNotExist:
         return 'Given account(%s) DoesNotExist' % uuid
+    synced = []
     for auth_token in auth_tokens:
-        auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY,
-                                   settings.TWITTER_CONSUMER_SECRET)
-        auth.set_access_token(auth_token.access_token,
-                              auth_token.access_token_secret)
         try:
-            api = tweepy.API(auth, wait_on_rate_limit=True)
-        except tweepy.TweepError:
+            sync_friends(self, auth_token)
+        except RateLimited as e:
+            if uuid:
+                raise self.retry(kwargs={'uuid': uuid}, countdown=e.retry_after)
+            # Follows and timelines of this user are updated by its
+            # own run once budget is back.
+            update_accounts_task.apply_async([str(auth_token.uuid)], countdown=e.retry_after)
+            continue
+        except TwitterError:
             print('Error! Failed to get access token for user %s.' %
                   auth_token.screen_name)
             continue
-        me = api.me()
-        friend_count = 0
-        for friend in tweepy.Cursor(api.friends).items():
-            friend_count += 1
-            meta = {'info': 'Processing user %s/<a href="https://twitter.com/%s">%s</a>' % (friend.name, friend.screen_name, friend.screen_name),
-                    'count': friend_count,
-                    'total': me.friends_count,
-                    }
-            self.update_state(state='PROGRESS', meta=meta)
-            if friend.screen_name is None or friend.name is None:
-                continue
-            try:
-                twitter_account = TwitterAccount.objects.get(screen_name=friend.screen_name)
-                if not twitter_account.followed_from.filter(uuid=auth_token.uuid).exists():
-                    twitter_account.followed_from.add(auth_token)
-            except TwitterAccount.DoesNotExist:
-                twitter_account, created = TwitterAccount.objects.get_or_create(screen_name=friend.screen_name,
-                                                                                defaults={'last_updated': timezone.now() - datetime.timedelta(days=365)})
-                twitter_account.save()
-                twitter_account.followed_from.add(auth_token)
-
-            twitter_account.account_json = friend._json
-            if TwitterStatus.objects.filter(tweet_from=twitter_account).exists():
-                recent_status = TwitterStatus.objects.filter(tweet_from=twitter_account).first()
-                status_id = path.split(recent_status.status_url)[-1]
-                statuses = api.user_timeline(screen_name=friend.screen_name, since_id=status_id)
-            else:
-                statuses = api.user_timeline(screen_name=friend.screen_name)
-            # Check if there were no recent updates in the timeline by the author
-            if not [status for status in statuses if status.author.screen_name == friend.screen_name and pytz.utc.localize(status.created_at) > twitter_account.last_updated]:
-                continue
-            count = 0
-            for status in statuses:
-                if not status.author.screen_name == friend.screen_name:
-                    # skipping tweets where someone else is talking to friend
-                    # FIXME: We have to consider case when user 'favourites' a tweet <- They could be treasure trove
-                    continue
-                if pytz.utc.localize(status.created_at) > twitter_account.last_updated:
-                    twitter_account.last_updated = pytz.utc.localize(status.created_at)
-                # FIXME: Should we have a different check to avoid duplicate tweets?
-                url = 'https://twitter.com/' + twitter_account.screen_name + '/status/' + status.id_str
-                count += 1
-                if TwitterStatus.objects.filter(status_url=url).exists():
-                    continue
-                if getattr(status, 'retweeted_status', None) and status.text.endswith(u'\u2026'):
-                    text = status.retweeted_status.author.screen_name + ': ' + status.retweeted_status.text
-                else:
-                    text = status.text
-                tweeted_at = pytz.utc.localize(status.created_at)
-                status_obj = TwitterStatus(
-                    tweet_from=twitter_account,
-                    followed_from=auth_token,
-                    status_text=text,
-                    status_url=url)
-                status_obj.status_created = tweeted_at
-                status_obj.save()
-
-                # In case of "quoted tweets" the original tweets is part of the url entities
-                # FIXME: I have to handle it better, in case quoted tweet has an external link?
-                # if status.is_quote_status:
-                #     continue
-                for url_entity in status._json['entities']['urls']:
-                    if url_entity.get('expanded_url', '').startswith('https://twitter.com/i/web/status/'):
-                        continue
-                    if url_entity.get('expanded_url', ''):
-                        if len(url_entity['expanded_url']) > 200:
-                            parsed_url = parse.urlparse(url_entity['expanded_url'])
-                            url_entity['expanded_url'] = parsed_url.scheme + "://" + parsed_url.netloc + parsed_url.path
-                        # If after cleaning parameters len is still
-                        # beyond 200 chars we skip it. Django URLField
-                        # has limit.
-                        if len(url_entity['expanded_url']) > 200:
-                            continue
-                        link_obj, created = UrlShared.objects.get_or_create(
-                            url=url_entity['expanded_url'],
-                            quoted_text=text,
-                            url_shared=pytz.utc.localize(status.created_at))
-                        if created:
-                            link_obj.save()
-                        if not link_obj.shared_from.filter(uuid=twitter_account.uuid).exists():
-                            link_obj.shared_from.add(twitter_account)
-                        link_obj.save()
-                    fetch_links.apply_async([link_obj.uuid])
-            print('Updated', friend.screen_name, 'Added', count, 'Tweets')
-            twitter_account.save()
-        update_feed.apply_async([str(auth_token.uuid)])
-        update_user_cache.apply_async([str(auth_token.uuid)])
-    return 'Successfully updated accounts.'
+        synced.append(str(auth_token.uuid))
+
+    # Every account is polled once no matter how many of our users
+    # follow it, new statuses are then fanned out to all followers
+    # once all batches are done. Scheduled runs poll only accounts
+    # which are due, accounts of a user who just signed in are all
+    # polled right away.
+    return dispatch_polls(self, lease_polls(synced, due=not uuid), synced)
+
+
+@app.task(bind=True)
+def poll_due_accounts_task(self):
+    '''Poll timelines of all followed accounts whose next poll is due.'''
+    return dispatch_polls(self, lease_polls(), [])
+
+
+def dispatch_polls(task, account_uuids, synced):
+    '''Poll `account_uuids`, leased with lease_polls, in batches of
+    poll_accounts_task with a chord to accounts_updated, reporting
+    progress on `task`.'''
+    if not account_uuids:
+        return accounts_updated([], synced)
+    batch_size = settings.ACCOUNTS_PER_TASK
+    progress_id = task.request.id
+    header = [poll_accounts_task.s(account_uuids[i:i + batch_size], progress_id, len(account_uuids))
+              for i in range(0, len(account_uuids), batch_size)]
+    chord(header)(accounts_updated.s(synced, progress_id).on_error(polls_failed.s(progress_id)))
+    ProgressReporter(task, len(account_uuids)).finish(0, 'Fetching timelines of %d accounts' % len(account_uuids))
+    # State is marked SUCCESS by accounts_updated once all batches are
+    # done.
+    raise Ignore()
 
 
 @app.task(bind=True)
@@ -254,7 +433,7 @@ def opml_task(self, token, verifier, host_uri):
     except tweepy.TweepError:
         raise
     try:
-        api = tweepy.API(auth, wait_on_rate_limit=True)
+        api = tweepy.API(auth)
     except tweepy.TweepError:
         raise
     me = api.me()
@@ -263,57 +442,34 @@ def opml_task(self, token, verifier, host_uri):
     auth_token.access_token = auth.access_token
     auth_token.access_token_secret = auth.access_token_secret
     auth_token.save()
-    root = Element('opml')
-    generated_on = str(datetime.datetime.now())
-    root.set('version', '1.0')
-    root.append(Comment('Feed list of all tweets'))
-
-    head = SubElement(root, 'head')
-    title = SubElement(head, 'title')
-    title.text = 'My Twitter Feed'
-    dc = SubElement(head, 'dateCreated')
-    dc.text = generated_on
-    dm = SubElement(head, 'dateModified')
-    dm.text = generated_on
-
-    body = SubElement(root, 'body')
-    count = 0
-    for friend in tweepy.Cursor(api.friends).items():
-        count += 1
-        if not friend.url:
-            continue
-        if friend.url:
-            meta = {'info': 'Processing user %s/<a href="https://twitter.com/%s">%s</a>' % (friend.name, friend.screen_name, friend.screen_name),
-                    'count': count,
-                    'total': me.friends_count,
-                    }
-            self.update_state(state='PROGRESS', meta=meta)
-            # timeline = friend.timeline()
-            # rss_task.apply_async([friend.url, friend.screen_name, friend.name, friend.id_str, timeline])
-            SubElement(body, 'outline',
-                       {'text': friend.name,
-                        'title': friend.name,
-                        'type': 'rss',
-                        'htmlUrl': friend.url,
-                        'xmlUrl': host_uri + static('xml/feed-%s.xml' % friend.screen_name),
-                        })
-
-            # XXX: Rate limiting(??)
-            last_updated = pytz.utc.localize(
-                datetime.datetime.now() - datetime.timedelta(days=365))
-            try:
-                twitter_account = TwitterAccount.objects.create(
-                    screen_name=friend.screen_name, followed_from=auth_token, last_updated=last_updated)
-                twitter_account.save()
-            except:
-                print('Skipping friend %s for now' % friend.screen_name)
-    with open('feeds/static/opml/%s.opml' % me.screen_name, 'w') as opml:
-        rough_string = ElementTree.tostring(root, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        opml.write(reparsed.toprettyxml(indent="  ").encode('utf8'))
-    api.send_direct_message(screen_name=me.screen_name,
+    compile_opml_task.apply_async([str(auth_token.uuid), host_uri])
+    return host_uri + static('opml/' + me.screen_name + '.opml')
+
+
+@app.task(bind=True, max_retries=None)
+def compile_opml_task(self, uuid, host_uri):
+    try:
+        auth_token = AuthToken.objects.get(uuid=uuid)
+    except AuthToken.DoesNotExist:
+        return 'Given account(%s) DoesNotExist' % uuid
+    try:
+        sync_friends(self, auth_token)
+    except RateLimited as e:
+        raise self.retry(countdown=e.retry_after)
+    friends = TwitterAccount.objects.filter(followed_from=auth_token).only('screen_name', 'account_json')
+    with open('feeds/static/opml/%s.opml' % auth_token.screen_name, 'wb') as opml:
+        write_opml(opml, 'My Twitter Feed', str(datetime.datetime.now()),
+                   ({'text': friend.account_json['name'],
+                     'title': friend.account_json['name'],
+                     'type': 'rss',
+                     'htmlUrl': friend.account_json['url'],
+                     'xmlUrl': host_uri + static('xml/feed-%s.xml' % friend.screen_name),
+                     } for friend in friends.iterator() if friend.account_json.get('url')),
+                   comment='Feed list of all tweets')
+    api = get_api(auth_token)
+    api.send_direct_message(screen_name=auth_token.screen_name,
                             text='''Hey there! We just finished compiling OPML file of the RSS feed
 based on people you follow. You can access it here
 %s Use this file with any feed
-reader of you choice.''' % (host_uri + static('opml/' + me.screen_name + '.opml')))
-    return host_uri + static('opml/' + me.screen_name + '.opml')
+reader of you choice.''' % (host_uri + static('opml/' + auth_token.screen_name + '.opml')))
+    return host_uri + static('opml/' + auth_token.screen_name + '.opml')
@@ -0,0 +1,41 @@
+from django.test import SimpleTestCase
+from unittest import mock
+from feeds.canonical import canonical_urls, canonicalize, clean_url
+
+
+class CanonicalTests(SimpleTestCase):
+    def test_canonicalize(self):
+        article = 'https://nytimes.com/2016/09/03/your-money/caregivers.html'
+        # Then: tracking parameters, mobile hosts, default ports and fragments don't matter
+        for url in ['https://www.nytimes.com/2016/09/03/your-money/caregivers.html?smid=tw-nythealth&smtyp=cur',
+                    'https://mobile.nytimes.com/2016/09/03/your-money/caregivers.html#story',
+                    'https://m.nytimes.com:443/2016/09/03/your-money/caregivers.html?utm_source=twitter&utm_medium=social',
+                    'HTTPS://WWW.NYTIMES.COM/2016/09/03/your-money/caregivers.html']:
+            self.assertEqual(canonicalize(url), article)
+        # Then: other parameters are kept, in order
+        self.assertEqual(canonicalize('https://www.youtube.com/watch?v=abc&utm_campaign=x&list=l'),
+                         'https://youtube.com/watch?list=l&v=abc')
+        # Then: statuses are keyed by their id
+        self.assertEqual(canonicalize('https://mobile.twitter.com/Someone/status/123?s=20'),
+                         'https://twitter.com/i/status/123')
+        # Then: clean_url keeps the host
+        self.assertEqual(clean_url('http://www.nytimes.com/a.html?smid=tw-nythealth&smtyp=cur'),
+                         'http://www.nytimes.com/a.html')
+
+    @mock.patch('feeds.canonical.get_redis')
+    def test_canonical_urls(self, get_redis):
+        get_redis.return_value.mget.return_value = [b'https://example.com/article', None]
+        # When: shortened urls are mapped, one of them resolved earlier
+        canonical = canonical_urls(['https://bit.ly/abc', 'https://bit.ly/new', 'https://example.com/other?utm_source=x'])
+        # Then: resolved url is used and the other is left to be resolved
+        self.assertEqual(canonical, {'https://bit.ly/abc': 'https://example.com/article',
+                                     'https://bit.ly/new': 'https://bit.ly/new',
+                                     'https://example.com/other?utm_source=x': 'https://example.com/other'})
+
+    @mock.patch('feeds.canonical.get_redis')
+    def test_long_canonical_urls(self, get_redis):
+        # Given: a url whose canonical form doesn't fit in canonical_url
+        url = 'https://example.com/%s' % ('a' * 200)
+        with mock.patch('feeds.canonical.canonicalize', return_value=url + '?' + 'a' * 100):
+            # Then: the url is kept as it was shared
+            self.assertEqual(canonical_urls([url]), {url: url})
@@ -0,0 +1,58 @@
+import datetime
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from feeds import contentstore
+from feeds.models import ContentBlob, UrlContent, UrlShared
+from feeds.serializers import UrlSerializer
+
+
+class ContentStoreTests(TestCase):
+    def test_same_article_is_stored_once(self):
+        # Given: the same article shared under two urls
+        first = UrlContent.objects.create(canonical_url='https://example.com/a', url='https://example.com/a')
+        second = UrlContent.objects.create(canonical_url='https://example.org/a', url='https://example.org/a')
+        html = '<p>%s</p>' % ('Lorem ipsum dolor sit amet. ' * 200)
+        # When: both get extracted
+        for content in (first, second):
+            content.blob_id = contentstore.store(html, 'Lorem ipsum')
+            content.save(update_fields=['blob'])
+        # Then: one compressed copy is kept
+        self.assertEqual(ContentBlob.objects.count(), 1)
+        blob = ContentBlob.objects.get()
+        self.assertLess(len(bytes(blob.html)), len(html) / 10)
+        self.assertEqual(blob.size, len(html) + len('Lorem ipsum'))
+        # Then: it is read back through the content
+        content = UrlContent.objects.get(uuid=second.uuid)
+        self.assertEqual(content.cleaned_text, html)
+        self.assertEqual(content.text_content, 'Lorem ipsum')
+
+    def test_serializer_reads_through_store(self):
+        # Given: a link whose content isn't fetched yet
+        content = UrlContent.objects.create(canonical_url='https://example.com/a', url='https://example.com/a')
+        link = UrlShared.objects.create(url=content.url, content=content, url_shared=timezone.now())
+        self.assertIsNone(contentstore.store('', ''))
+        self.assertEqual(UrlSerializer(link).data['cleaned_text'], '')
+        # When: it gets fetched
+        content.blob_id = contentstore.store('<p>Article</p>', 'Article')
+        content.save(update_fields=['blob'])
+        # Then: the serializer reads the article from the store
+        link = UrlShared.objects.select_related('content__blob').get(uuid=link.uuid)
+        self.assertEqual(UrlSerializer(link).data['cleaned_text'], '<p>Article</p>')
+
+    @override_settings(CONTENT_GC_GRACE=60 * 60, CONTENT_GC_BATCH=1)
+    def test_unused_articles_are_collected(self):
+        # Given: an article fetched again with changes
+        content = UrlContent.objects.create(canonical_url='https://example.com/a', url='https://example.com/a')
+        old = contentstore.store('<p>First</p>', 'First')
+        content.blob_id = contentstore.store('<p>Second</p>', 'Second')
+        content.save(update_fields=['blob'])
+        # Then: the old version is kept for a while
+        self.assertEqual(contentstore.collect(), 0)
+        # When: it is old enough
+        ContentBlob.objects.update(stored=timezone.now() - datetime.timedelta(hours=2))
+        # Then: only the version no content points to is deleted
+        self.assertEqual(contentstore.collect(), 1)
+        self.assertEqual(list(ContentBlob.objects.values_list('digest', flat=True)), [content.blob_id])
+        # Then: it is stored again when fetched again
+        self.assertEqual(contentstore.store('<p>First</p>', 'First'), old)
+        self.assertTrue(ContentBlob.objects.filter(digest=old).exists())
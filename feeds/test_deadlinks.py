@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase, override_settings
+from feeds import deadlinks
+from feeds.utils import get_redis
+
+
+@override_settings(HOST_DEAD_AFTER=3, HOST_DEAD_TTL=600, LINK_STATS_TTL=3600, LINK_STATS_HOSTS=100)
+class DeadLinksTests(SimpleTestCase):
+    host = 'dead.example.com'
+
+    def tearDown(self):
+        redis = get_redis()
+        redis.delete(deadlinks.stats_key(self.host), deadlinks.dead_key(self.host))
+        redis.zrem(deadlinks.FAILURES_KEY, self.host)
+        redis.zrem(deadlinks.WASTED_KEY, self.host)
+
+    def test_host_dies_after_failures_in_a_row(self):
+        # Given: a host failed twice in a row
+        deadlinks.record(self.host, 5, failed=True, host_failure=True)
+        deadlinks.record(self.host, 5, failed=True, host_failure=True)
+        self.assertEqual(deadlinks.dead_for(self.host), 0)
+        # When: it succeeds once, failures in a row start over
+        deadlinks.record(self.host, 1)
+        deadlinks.record(self.host, 5, failed=True, host_failure=True)
+        deadlinks.record(self.host, 5, failed=True, host_failure=True)
+        self.assertEqual(deadlinks.dead_for(self.host), 0)
+        # Then: HOST_DEAD_AFTER failures in a row make it dead
+        deadlinks.record(self.host, 5, failed=True, host_failure=True)
+        self.assertGreater(deadlinks.dead_for(self.host), 590)
+
+    def test_stats(self):
+        # When: a host fails on a link and on itself
+        deadlinks.record(self.host, 2.5, failed=True)
+        deadlinks.record(self.host, 4, failed=True, host_failure=True)
+        deadlinks.record(self.host, 1)
+        # Then: its fetches, failures and wasted time are counted
+        stats = [host for host in deadlinks.get_stats(100) if host['host'] == self.host]
+        self.assertEqual(stats, [{'host': self.host,
+                                  'fetches': 3,
+                                  'failures': 2,
+                                  'failed_seconds': 6.5,
+                                  'consecutive': 0,
+                                  'dead_for': 0}])
@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase, override_settings
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import threading
+import requests
+from feeds.download import download, parse_content_length, sniff
+
+HTML = b'<!DOCTYPE html><html><head><title>t</title></head><body><p>text</p></body></html>'
+
+
+class FakeResourceHandler(BaseHTTPRequestHandler):
+    # Path -> (Content-Type, body)
+    resources = {'/page': ('text/html; charset=utf-8', HTML),
+                 '/report.pdf': ('application/pdf', b'%PDF-1.4' + b'0' * 1000),
+                 '/mislabelled': ('text/html', b'\x89PNG\r\n\x1a\n' + b'0' * 1000),
+                 '/untold': ('application/octet-stream', HTML),
+                 '/huge': ('text/html', b'<html>' + b'0' * 5000)}
+
+    def do_GET(self):
+        content_type, body = self.resources[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if self.path != '/huge':
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@override_settings(LINK_MAX_BYTES=4000, LINK_FETCH_TIMEOUT=5)
+class DownloadTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(DownloadTests, cls).setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeResourceHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_port
+        cls.session = requests.Session()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(DownloadTests, cls).tearDownClass()
+
+    def test_sniff(self):
+        self.assertEqual(sniff(b'%PDF-1.4'), 'application/pdf')
+        self.assertEqual(sniff(b'\x00\x00\x00\x18ftypmp42'), 'video/mp4')
+        self.assertEqual(sniff(b'\xef\xbb\xbf\n<!DOCTYPE HTML>'), 'text/html')
+        self.assertIsNone(sniff(b'just text'))
+
+    def test_parse_content_length(self):
+        self.assertEqual(parse_content_length('1008'), 1008)
+        # Then: missing and malformed sizes are unknown
+        self.assertIsNone(parse_content_length(None))
+        self.assertIsNone(parse_content_length('0'))
+        self.assertIsNone(parse_content_length('12, 12'))
+        self.assertIsNone(parse_content_length('-5'))
+
+    def test_download(self):
+        # Then: html is downloaded for extraction
+        page = download(self.session, self.base_url + '/page')
+        self.assertTrue(page.extractable)
+        self.assertEqual(page.text, HTML.decode('utf-8'))
+        # Then: other resources only get metadata
+        page = download(self.session, self.base_url + '/report.pdf')
+        self.assertFalse(page.extractable)
+        self.assertEqual(page.get_metadata()['title'], 'report.pdf')
+        self.assertEqual(page.get_metadata()['size'], 1008)
+        # Then: type is sniffed when Content-Type is wrong or doesn't tell
+        page = download(self.session, self.base_url + '/mislabelled')
+        self.assertFalse(page.extractable)
+        self.assertEqual(page.content_type, 'image/png')
+        self.assertTrue(download(self.session, self.base_url + '/untold').extractable)
+        # Then: download stops at LINK_MAX_BYTES
+        page = download(self.session, self.base_url + '/huge')
+        self.assertFalse(page.extractable)
+        self.assertTrue(page.too_large)
@@ -0,0 +1,61 @@
+from django.test import SimpleTestCase, override_settings
+import os
+import sys
+import tempfile
+from feeds.extract import ExtractError, ExtractorPool
+
+FAKE_WORKER = '''
+import json, os, sys, time
+for line in sys.stdin:
+    request = json.loads(line)
+    response = {'id': request['id'], 'rss': 100 if 'big' in request.get('url', '') else 1}
+    if 'slow' in request.get('url', ''):
+        time.sleep(5)
+    elif 'broken' in request.get('url', ''):
+        response['error'] = 'broken page'
+    elif not request.get('ping'):
+        response['article'] = {'title': request['url'], 'pid': os.getpid()}
+    print(json.dumps(response), flush=True)
+'''
+
+
+class ExtractTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(ExtractTests, cls).setUpClass()
+        with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as script:
+            script.write(FAKE_WORKER)
+        cls.script = script.name
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.script)
+        super(ExtractTests, cls).tearDownClass()
+
+    def test_pool(self):
+        with override_settings(EXTRACT_WORKER_COMMAND=[sys.executable, self.script],
+                               EXTRACT_WORKER_MAX_RSS=50, EXTRACT_WORKER_MAX_JOBS=3,
+                               EXTRACT_PING_INTERVAL=60, EXTRACT_PING_TIMEOUT=1):
+            pool = ExtractorPool(size=1)
+            try:
+                # When: links are extracted one after the other
+                first = pool.extract('http://example.com/a')
+                second = pool.extract('http://example.com/b')
+                # Then: the same warm worker serves them
+                self.assertEqual(first['title'], 'http://example.com/a')
+                self.assertEqual(first['pid'], second['pid'])
+                # Then: errors of a page don't cost the worker
+                with self.assertRaises(ExtractError):
+                    pool.extract('http://example.com/broken')
+                # Then: worker is replaced after EXTRACT_WORKER_MAX_JOBS
+                third = pool.extract('http://example.com/c')
+                self.assertNotEqual(third['pid'], first['pid'])
+                # Then: worker which grew too big is replaced
+                big = pool.extract('http://example.com/big')
+                self.assertNotEqual(pool.extract('http://example.com/d')['pid'], big['pid'])
+                # Then: a hung worker times out and is replaced
+                with self.assertRaises(ExtractError):
+                    pool.extract('http://example.com/slow', timeout=0.5)
+                self.assertEqual(pool.extract('http://example.com/e')['title'], 'http://example.com/e')
+            finally:
+                pool.close()
@@ -0,0 +1,88 @@
+import datetime
+import os
+import tempfile
+from xml.etree import ElementTree
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from feeds import contentstore, feedcache
+from feeds.models import AuthToken, TwitterAccount, UrlContent, UrlShared
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+@override_settings(FEED_WINDOW=24 * 60 * 60, FEED_FRAGMENT_SLACK=60 * 60, FEED_CHANGE_SLACK=10 * 60)
+class FeedCacheTests(TestCase):
+    def setUp(self):
+        self.auth_token = AuthToken.objects.create(screen_name='reader')
+        self.account = TwitterAccount.objects.create(screen_name='sharer')
+        self.account.followed_from.add(self.auth_token)
+        self.path = os.path.join(tempfile.mkdtemp(), 'feed.xml')
+
+    def tearDown(self):
+        feedcache.reset(self.auth_token)
+        os.remove(self.path)
+        os.rmdir(os.path.dirname(self.path))
+
+    def share(self, url, hours_ago, text):
+        content = UrlContent.objects.create(canonical_url=url, url=url,
+                                            blob_id=contentstore.store('<p>%s</p>' % text, text))
+        link = UrlShared.objects.create(url=url, content=content, quoted_text='About \x0b%s' % text,
+                                        url_shared=timezone.now() - datetime.timedelta(hours=hours_ago))
+        link.shared_from.add(self.account)
+        return link
+
+    def get_entries(self):
+        feed = ElementTree.parse(self.path).getroot()
+        return [(entry.find(ATOM + 'id').text, entry.find(ATOM + 'author/' + ATOM + 'name').text,
+                 entry.find(ATOM + 'content').text) for entry in feed.findall(ATOM + 'entry')]
+
+    def test_only_new_links_are_rendered(self):
+        accounts = TwitterAccount.objects.filter(followed_from=self.auth_token)
+        self.share('https://example.com/old', 30, 'Old')
+        self.share('https://example.com/a', 2, 'A')
+        # When: feed is built
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 1)
+        self.assertEqual(self.get_entries(), [('https://example.com/a', 'sharer', 'Quote: About A<br/><p>A</p>')])
+        # Then: nothing is rendered again while nothing changes
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 0)
+        # When: a link is shared
+        self.share('https://example.com/b', 1, 'B')
+        # Then: only its entry is rendered and merged in, newest first
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 1)
+        self.assertEqual([entry[0] for entry in self.get_entries()],
+                         ['https://example.com/b', 'https://example.com/a'])
+        # Then: entries expire once out of the window
+        later = timezone.now() + datetime.timedelta(hours=22, minutes=30)
+        self.assertEqual(feedcache.update(self.auth_token, accounts, later), 0)
+        self.assertTrue(feedcache.write(self.auth_token, self.path, later))
+        self.assertEqual([entry[0] for entry in self.get_entries()], ['https://example.com/b'])
+
+    def test_cache_loss_rebuilds(self):
+        accounts = TwitterAccount.objects.filter(followed_from=self.auth_token)
+        link = self.share('https://example.com/a', 2, 'A')
+        feedcache.build(self.auth_token, accounts, self.path)
+        # When: a fragment is evicted from Redis
+        keys = feedcache.get_redis().hvals(feedcache.fragments_key(self.auth_token.uuid))
+        feedcache.get_redis().delete(*keys)
+        # Then: feed is rebuilt from scratch
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 1)
+        self.assertEqual([entry[0] for entry in self.get_entries()], [link.url])
+
+    def test_late_links_and_new_sharers(self):
+        other = TwitterAccount.objects.create(screen_name='another')
+        other.followed_from.add(self.auth_token)
+        accounts = TwitterAccount.objects.filter(followed_from=self.auth_token)
+        link = self.share('https://example.com/a', 2, 'A')
+        feedcache.build(self.auth_token, accounts, self.path)
+        # When: a link stamped before the last build is committed after it
+        late = self.share('https://example.com/late', 1, 'Late')
+        UrlShared.objects.filter(uuid=late.uuid).update(added=timezone.now() - datetime.timedelta(minutes=1))
+        # Then: next build still picks it up
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 1)
+        self.assertEqual([entry[0] for entry in self.get_entries()], [late.url, link.url])
+        # When: a link gets another sharer
+        link.shared_from.add(other)
+        UrlShared.objects.filter(uuid=link.uuid).update(added=timezone.now())
+        # Then: its entry is rendered again with both of them
+        self.assertEqual(feedcache.build(self.auth_token, accounts, self.path), 1)
+        self.assertEqual(self.get_entries()[1][:2], (link.url, 'another, sharer'))
@@ -0,0 +1,61 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+from feeds import contentstore, feedquery, inbox
+from feeds.models import AuthToken, TwitterAccount, UrlContent, UrlShared
+
+
+class FeedQueryTests(TestCase):
+    def setUp(self):
+        self.auth_token = AuthToken.objects.create(screen_name='reader')
+        self.accounts = []
+        for screen_name in ['bob', 'alice', 'stranger']:
+            account = TwitterAccount.objects.create(screen_name=screen_name)
+            if screen_name != 'stranger':
+                account.followed_from.add(self.auth_token)
+            self.accounts.append(account)
+        self.now = timezone.now()
+
+    def share(self, url, hours_ago, *accounts, cluster=None):
+        content, _ = UrlContent.objects.get_or_create(canonical_url=url, defaults={
+            'url': url, 'blob_id': contentstore.store('<p>%s</p>' % url), 'cluster': cluster})
+        link = UrlShared.objects.create(url=url, content=content, quoted_text='About %s' % url,
+                                        url_shared=self.now - datetime.timedelta(hours=hours_ago))
+        link.shared_from.add(*accounts)
+        for account in accounts:
+            inbox.deliver(account.uuid, [link.uuid])
+        return link
+
+    def test_links(self):
+        bob, alice, stranger = self.accounts
+        # Given: a url shared twice by people followed and once by a stranger
+        self.share('https://example.com/a', 3, bob)
+        self.share('https://example.com/a', 1, alice, stranger)
+        self.share('https://example.com/b', 2, bob)
+        self.share('https://example.com/old', 30, bob)
+        self.share('https://example.com/unfollowed', 1, stranger)
+        # When: links are queried
+        links = list(feedquery.get_links(self.auth_token.uuid, self.now - datetime.timedelta(hours=24)))
+        # Then: every url is listed once, newest first, with its sharers
+        self.assertEqual([(link.url, link.published, link.sharers) for link in links],
+                         [('https://example.com/a', self.now - datetime.timedelta(hours=1), 'alice, bob'),
+                          ('https://example.com/b', self.now - datetime.timedelta(hours=2), 'bob')])
+
+    def test_entries(self):
+        bob, alice, stranger = self.accounts
+        # Given: a story and its copy, clustered together, and another story
+        story = self.share('https://example.com/story', 3, bob)
+        copy = self.share('https://example.com/amp/story', 1, alice, cluster=story.content)
+        UrlContent.objects.filter(uuid=story.content.uuid).update(cluster=story.content.uuid)
+        other = self.share('https://example.com/other', 2, bob)
+        entries = list(feedquery.get_entries([bob.uuid, alice.uuid], self.now - datetime.timedelta(hours=24)))
+        # Then: there is an entry for every cluster, with its latest link
+        self.assertEqual([(entry.entry, entry.url, entry.sharers) for entry in entries],
+                         [(str(story.content.uuid), copy.url, 'alice, bob'),
+                          (str(other.content.uuid), other.url, 'bob')])
+        self.assertEqual(entries[0].links, ','.join(sorted([str(story.uuid), str(copy.uuid)])))
+        self.assertEqual(contentstore.decompress(entries[0].html), '<p>https://example.com/amp/story</p>')
+        # Then: entries can be limited to some clusters
+        entries = feedquery.get_entries([bob.uuid, alice.uuid], self.now - datetime.timedelta(hours=24),
+                                        [str(other.content.uuid)])
+        self.assertEqual([entry.url for entry in entries], [other.url])
@@ -0,0 +1,90 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from feeds import fetchstate
+from feeds.models import UrlContent, UrlShared
+
+
+class FetchStateTests(TestCase):
+    def setUp(self):
+        self.content = UrlContent.objects.create(canonical_url='https://example.com/a', url='https://example.com/a')
+        self.uuids = [str(self.content.uuid)]
+
+    def get_state(self):
+        return UrlContent.objects.get(uuid=self.content.uuid).fetch_state
+
+    def test_content_is_queued_once(self):
+        # When: same content is queued again and again
+        self.assertEqual(list(fetchstate.mark_queued(self.uuids)), self.uuids)
+        self.assertEqual(fetchstate.mark_queued(self.uuids), {})
+        # Then: only one message gets to fetch it
+        self.assertTrue(fetchstate.claim(self.content.uuid))
+        self.assertFalse(fetchstate.claim(self.content.uuid))
+        self.assertEqual(fetchstate.mark_queued(self.uuids), {})
+        # Then: fetched content is queued again only when asked to
+        self.assertTrue(fetchstate.done(self.content.uuid))
+        self.assertEqual(fetchstate.mark_queued(self.uuids), {})
+        self.assertEqual(list(fetchstate.mark_queued(self.uuids, refetch=True)), self.uuids)
+
+    def test_failed_content_is_retried(self):
+        fetchstate.mark_queued(self.uuids)
+        fetchstate.claim(self.content.uuid)
+        # When: fetch fails
+        fetchstate.failed(self.content.uuid, 1, retry_after=3600)
+        # Then: it isn't queued before its retry is due
+        self.assertEqual(self.get_state(), fetchstate.FAILED)
+        self.assertEqual(fetchstate.due(10), [])
+        self.assertEqual(fetchstate.mark_queued(self.uuids), {})
+        UrlContent.objects.filter(uuid=self.content.uuid).update(
+            fetch_retry_at=UrlContent.objects.get(uuid=self.content.uuid).fetch_updated)
+        self.assertEqual(fetchstate.due(10), self.uuids)
+        self.assertEqual(list(fetchstate.mark_queued(self.uuids)), self.uuids)
+
+    @override_settings(FETCH_STALE_AFTER=0)
+    def test_lost_fetches_are_queued_again(self):
+        fetchstate.mark_queued(self.uuids)
+        fetchstate.claim(self.content.uuid)
+        # Then: content whose task got lost is due again
+        self.assertEqual(fetchstate.due(10), self.uuids)
+
+    @override_settings(FETCH_RETRY_AFTER=60, FETCH_MAX_RETRY_AFTER=200, FETCH_MAX_FAILURES=4, FETCH_DEAD_TTL=10000)
+    def test_failures_back_off(self):
+        # Then: retries of failing content back off exponentially
+        self.assertEqual([fetchstate.get_retry_after(failures) for failures in range(1, 5)], [60, 120, 200, 200])
+        for failures in range(1, 5):
+            fetchstate.mark_queued(self.uuids)
+            UrlContent.objects.filter(uuid=self.content.uuid).update(fetch_state=fetchstate.QUEUED)
+            fetchstate.claim(self.content.uuid)
+            fetchstate.failed(self.content.uuid, failures)
+        # Then: content failing FETCH_MAX_FAILURES times is dead for FETCH_DEAD_TTL
+        content = UrlContent.objects.get(uuid=self.content.uuid)
+        self.assertEqual(content.fetch_state, fetchstate.DEAD)
+        self.assertEqual(content.fetch_failures, 4)
+        self.assertEqual(round((content.fetch_retry_at - content.fetch_updated).total_seconds()), 10000)
+        # Then: a success resets failures
+        UrlContent.objects.filter(uuid=self.content.uuid).update(fetch_state=fetchstate.FETCHING)
+        fetchstate.done(self.content.uuid)
+        self.assertEqual(UrlContent.objects.get(uuid=self.content.uuid).fetch_failures, 0)
+
+    def test_permanent_failure(self):
+        fetchstate.mark_queued(self.uuids)
+        fetchstate.claim(self.content.uuid)
+        fetchstate.failed(self.content.uuid, 1, permanent=True)
+        self.assertEqual(self.get_state(), fetchstate.DEAD)
+
+    @override_settings(FETCH_REFRESH_AFTER=0, FETCH_REFRESH_WINDOW=3600)
+    def test_shared_content_is_refreshed(self):
+        fetchstate.mark_queued(self.uuids)
+        fetchstate.claim(self.content.uuid)
+        fetchstate.done(self.content.uuid)
+        # Given: content last shared a day ago
+        link = UrlShared.objects.create(url=self.content.url, content=self.content,
+                                        url_shared=timezone.now() - datetime.timedelta(days=1))
+        # Then: it isn't fetched again
+        self.assertEqual(fetchstate.due_refresh(10), [])
+        # When: it is shared again
+        UrlShared.objects.filter(uuid=link.uuid).update(url_shared=timezone.now())
+        # Then: it is queued again
+        self.assertEqual([str(uuid) for uuid in fetchstate.due_refresh(10)], self.uuids)
+        self.assertEqual(list(fetchstate.mark_queued(fetchstate.due_refresh(10), refetch=True)), self.uuids)
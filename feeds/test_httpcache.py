@@ -0,0 +1,105 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import threading
+from unittest import mock
+from feeds import fetchstate, httpcache
+from feeds.models import UrlContent
+from feeds.tasks import fetch_links
+from feeds.utils import get_redis
+
+
+class FakePageHandler(BaseHTTPRequestHandler):
+    # Path -> (etag, body)
+    pages = {'/etag': ('"v1"', b'<p>tagged</p>'),
+             '/plain': (None, b'<p>no validators</p>')}
+    # Status codes answered
+    served = []
+
+    def do_GET(self):
+        etag, body = self.pages[self.path]
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.served.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.served.append(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakePagesMixin(object):
+    @classmethod
+    def setUpClass(cls):
+        super(FakePagesMixin, cls).setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakePageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(FakePagesMixin, cls).tearDownClass()
+
+    def tearDown(self):
+        redis = get_redis()
+        redis.delete(httpcache.LRU_KEY, *[httpcache.cache_key(self.base_url + path)
+                                          for path in FakePageHandler.pages])
+        del FakePageHandler.served[:]
+
+
+class HttpCacheTests(FakePagesMixin, SimpleTestCase):
+
+    def test_unchanged_pages_are_skipped(self):
+        for path in FakePageHandler.pages:
+            url = self.base_url + path
+            # When: page is fetched for the first time
+            page = httpcache.fetch(url, url)
+            # Then: it is to be extracted
+            self.assertEqual(page.body, FakePageHandler.pages[path][1])
+            httpcache.remember(url, page)
+            # Then: fetching it again, by ETag or by hash of the body, finds nothing new
+            self.assertIsNone(httpcache.fetch(url, url))
+
+    @override_settings(HTTP_CACHE_MAX_ENTRIES=1)
+    def test_least_recently_fetched_are_evicted(self):
+        etag_url, plain_url = self.base_url + '/etag', self.base_url + '/plain'
+        httpcache.remember(etag_url, httpcache.fetch(etag_url, etag_url))
+        httpcache.remember(plain_url, httpcache.fetch(plain_url, plain_url))
+        # Then: only the latest entry is kept
+        self.assertIsNotNone(httpcache.fetch(etag_url, etag_url))
+        self.assertIsNone(httpcache.fetch(plain_url, plain_url))
+
+
+@override_settings(HOST_MIN_DELAY=0)
+class FetchLinksTests(FakePagesMixin, TestCase):
+    @mock.patch('feeds.tasks.extract')
+    def test_refetch_of_unchanged_page(self, extract):
+        extract.return_value = {'title': 'Tagged', 'content': '<p>tagged</p>', 'textContent': 'tagged'}
+        url = self.base_url + '/etag'
+        content = UrlContent.objects.create(url=url, canonical_url=url)
+        # When: the link is fetched
+        fetchstate.mark_queued([content.uuid])
+        fetch_links(content.uuid)
+        # Then: the page is extracted
+        self.assertEqual(extract.call_count, 1)
+        # When: the link is fetched again, like by refresh_fetches_task
+        fetchstate.mark_queued([content.uuid], refetch=True)
+        fetch_links(content.uuid)
+        # Then: the page is asked for conditionally and not extracted again
+        self.assertEqual(FakePageHandler.served, [200, 304])
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(UrlContent.objects.get(uuid=content.uuid).fetch_state, fetchstate.DONE)
@@ -0,0 +1,56 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+from feeds import inbox
+from feeds.models import AuthToken, LinkInbox, TwitterAccount, UrlContent, UrlShared
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.auth_token = AuthToken.objects.create(screen_name='reader')
+        self.bob = TwitterAccount.objects.create(screen_name='bob')
+        self.alice = TwitterAccount.objects.create(screen_name='alice')
+        self.now = timezone.now()
+
+    def share(self, url, hours_ago, *accounts):
+        content = UrlContent.objects.create(canonical_url=url, url=url)
+        link = UrlShared.objects.create(url=url, content=content,
+                                        url_shared=self.now - datetime.timedelta(hours=hours_ago))
+        link.shared_from.add(*accounts)
+        for account in accounts:
+            inbox.deliver(account.uuid, [link.uuid])
+        return link
+
+    def get_inbox(self):
+        return list(inbox.get_links(self.auth_token.uuid).values_list('url', flat=True))
+
+    def test_deliver(self):
+        # Given: bob is followed, alice isn't
+        self.bob.followed_from.add(self.auth_token)
+        # When: both of them share links
+        self.share('https://example.com/old', 2, self.bob)
+        self.share('https://example.com/new', 1, self.bob, self.alice)
+        self.share('https://example.com/alice', 1, self.alice)
+        # Then: only links of bob are in the inbox, once, latest first
+        self.assertEqual(self.get_inbox(), ['https://example.com/new', 'https://example.com/old'])
+        self.assertEqual(LinkInbox.objects.filter(auth_token=self.auth_token).count(), 2)
+        # Then: links can be limited to a time range
+        since = self.now - datetime.timedelta(minutes=90)
+        self.assertEqual(list(inbox.get_links(self.auth_token.uuid, since).values_list('url', flat=True)),
+                         ['https://example.com/new'])
+
+    def test_follow_and_unfollow(self):
+        # Given: links shared by accounts before they are followed
+        self.share('https://example.com/bob', 2, self.bob)
+        self.share('https://example.com/both', 1, self.bob, self.alice)
+        # When: they are followed
+        for account in [self.bob, self.alice]:
+            account.followed_from.add(self.auth_token)
+        inbox.follow(self.auth_token.uuid, [self.bob.uuid, self.alice.uuid])
+        # Then: their links are in the inbox
+        self.assertEqual(self.get_inbox(), ['https://example.com/both', 'https://example.com/bob'])
+        # When: bob is unfollowed
+        self.bob.followed_from.remove(self.auth_token)
+        inbox.unfollow(self.auth_token.uuid, [self.bob.uuid])
+        # Then: links alice shared as well stay
+        self.assertEqual(self.get_inbox(), ['https://example.com/both'])
@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from feeds.models import AuthToken, TwitterAccount, TwitterStatus, UrlContent, UrlShared
+from feeds.ingest import ingest_timeline, parse_created_at
+import pytz
+import datetime
+
+
+def make_status(screen_name, status_id, urls=(), created_at='Wed Aug 27 13:08:45 +0000 2008'):
+    return {'id_str': str(status_id),
+            'created_at': created_at,
+            'text': 'status %s' % status_id,
+            'user': {'screen_name': screen_name},
+            'entities': {'urls': [{'expanded_url': url} for url in urls]}}
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.auth_token = AuthToken.objects.create(screen_name='reader')
+        self.account = TwitterAccount.objects.create(
+            screen_name='friend',
+            last_updated=pytz.utc.localize(datetime.datetime(2000, 1, 1)))
+        self.account.followed_from.add(self.auth_token)
+
+    def test_parse_created_at(self):
+        self.assertEqual(parse_created_at('Wed Aug 27 13:08:45 +0000 2008'),
+                         pytz.utc.localize(datetime.datetime(2008, 8, 27, 13, 8, 45)))
+
+    def test_ingest_timeline(self):
+        statuses = [make_status('friend', 1, ['http://example.com/a']),
+                    make_status('friend', 2, ['http://example.com/b', 'http://example.com/c']),
+                    make_status('someone_else', 3, ['http://example.com/d'])]
+        # When: we ingest a page of statuses
+        count, link_uuids = ingest_timeline(self.account, self.auth_token, statuses)
+        # Then: only statuses of the account are stored along with their links
+        self.assertEqual(count, 2)
+        self.assertEqual(TwitterStatus.objects.filter(tweet_from=self.account).count(), 2)
+        self.assertEqual(len(link_uuids), 3)
+        self.assertEqual(UrlShared.objects.filter(shared_from=self.account).count(), 3)
+        self.assertFalse(UrlShared.objects.filter(url='http://example.com/d').exists())
+        self.assertEqual(self.account.last_updated, parse_created_at(statuses[0]['created_at']))
+        self.assertEqual(TwitterAccount.objects.get(uuid=self.account.uuid).last_status_id, 2)
+
+        # When: same page is ingested again
+        count, link_uuids = ingest_timeline(self.account, self.auth_token, statuses)
+        # Then: nothing gets duplicated
+        self.assertEqual(link_uuids, [])
+        self.assertEqual(TwitterStatus.objects.count(), 2)
+        self.assertEqual(UrlShared.objects.count(), 3)
+
+    def test_ingest_shared_article(self):
+        other_account = TwitterAccount.objects.create(
+            screen_name='other_friend',
+            last_updated=pytz.utc.localize(datetime.datetime(2000, 1, 1)))
+        # When: an article is shared by two accounts under different urls
+        count, content_uuids = ingest_timeline(self.account, self.auth_token, [
+            make_status('friend', 1, ['https://www.example.com/article?utm_source=twitter'])])
+        other_count, other_content_uuids = ingest_timeline(other_account, self.auth_token, [
+            make_status('other_friend', 2, ['https://m.example.com/article#comments'])])
+        # Then: both shares point to a single content which is fetched once
+        self.assertEqual(len(content_uuids), 1)
+        self.assertEqual(other_content_uuids, [])
+        self.assertEqual(UrlShared.objects.count(), 2)
+        self.assertEqual(UrlContent.objects.get().canonical_url, 'https://example.com/article')
+        self.assertEqual(set(UrlShared.objects.values_list('content', flat=True)), set(content_uuids))
+
+    def test_ingest_timeline_queries(self):
+        small_page = [make_status('friend', status_id, ['http://example.com/%s' % status_id])
+                      for status_id in range(2)]
+        large_page = [make_status('friend', status_id, ['http://example.com/%s' % status_id])
+                      for status_id in range(10, 50)]
+        with CaptureQueriesContext(connection) as small:
+            ingest_timeline(self.account, self.auth_token, small_page)
+        with CaptureQueriesContext(connection) as large:
+            ingest_timeline(self.account, self.auth_token, large_page)
+        # Then: cost of ingesting doesn't depend on size of the page
+        self.assertEqual(len(small), len(large))
@@ -0,0 +1,71 @@
+import random
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from feeds import neardup
+from feeds.models import SimHashBand, TwitterAccount, UrlContent, UrlShared
+
+
+def get_article(seed, words=1500):
+    rnd = random.Random(seed)
+    return ['word%d' % rnd.randrange(3000) for i in range(words)]
+
+
+@override_settings(NEARDUP_DISTANCE=3, NEARDUP_MIN_WORDS=50, NEARDUP_MAX_CANDIDATES=200)
+class NearDuplicateTests(TestCase):
+    def add_content(self, url, words):
+        content = UrlContent.objects.create(canonical_url=url, url=url)
+        neardup.add(content, ' '.join(words))
+        return content
+
+    def test_simhash(self):
+        article = get_article(0)
+        copy = ['Syndicated', 'from', 'the', 'wire'] + article[:-5] + ['Read', 'more']
+        # Then: near-duplicates differ in a few bits and share a band
+        self.assertLessEqual(neardup.distance(neardup.simhash(' '.join(article)), neardup.simhash(' '.join(copy))), 3)
+        self.assertTrue(set(neardup.get_bands(neardup.simhash(' '.join(article))))
+                        & set(neardup.get_bands(neardup.simhash(' '.join(copy)))))
+        # Then: other articles differ in many
+        self.assertGreater(neardup.distance(neardup.simhash(' '.join(article)), neardup.simhash(' '.join(get_article(1)))), 10)
+        # Then: short texts aren't compared
+        self.assertIsNone(neardup.simhash('Too short'))
+        self.assertEqual(neardup.to_unsigned(neardup.to_signed(2 ** 64 - 1)), 2 ** 64 - 1)
+
+    def test_near_duplicates_are_clustered(self):
+        article = get_article(0)
+        # When: a story, its AMP page and another story are fetched
+        first = self.add_content('https://example.com/story', article)
+        amp = self.add_content('https://example.com/amp/story', article[:-3] + ['Share', 'this', 'story'])
+        other = self.add_content('https://example.com/other', get_article(1))
+        # Then: copies join the cluster of the first one
+        self.assertEqual(neardup.get_cluster(UrlContent.objects.get(uuid=first.uuid)), str(first.uuid))
+        self.assertEqual(neardup.get_cluster(UrlContent.objects.get(uuid=amp.uuid)), str(first.uuid))
+        self.assertEqual(neardup.get_cluster(UrlContent.objects.get(uuid=other.uuid)), str(other.uuid))
+        self.assertEqual(SimHashBand.objects.filter(content=amp.uuid).count(), 4)
+        # Then: links of a cluster collapse in one with all sharers
+        links = []
+        for i, content in enumerate([first, amp, other]):
+            link = UrlShared.objects.create(url=content.url, content=content, url_shared=timezone.now())
+            link.shared_from.add(TwitterAccount.objects.create(screen_name='account_%d' % i))
+            links.append(link)
+        latest = neardup.get_latest(UrlShared.objects.all())
+        self.assertEqual(sorted(latest), sorted([str(links[1].uuid), str(links[2].uuid)]))
+        collapsed = list(UrlShared.objects.filter(uuid__in=list(latest)).select_related('content'))
+        neardup.set_cluster_sharers(collapsed, latest)
+        sharers = {link.url: sorted(account.screen_name for account in link.cluster_shared_from) for link in collapsed}
+        self.assertEqual(sharers, {amp.url: ['account_0', 'account_1'],
+                                   other.url: ['account_2']})
+        self.assertEqual([[link.url for link in cluster] for cluster in neardup.collapse(
+            UrlShared.objects.select_related('content').order_by('url_shared'))],
+            [[first.url, amp.url], [other.url]])
+
+    def test_refetched_content_is_indexed_again(self):
+        article, changed = get_article(0), get_article(1)
+        content = self.add_content('https://example.com/story', article)
+        # When: the page changed when fetched again
+        neardup.add(content, ' '.join(changed))
+        # Then: only bands of the new text are kept
+        self.assertEqual(sorted(SimHashBand.objects.filter(content=content.uuid).values_list('key', flat=True)),
+                         sorted(neardup.get_bands(neardup.simhash(' '.join(changed)))))
+        # Then: copies of the old text are no longer clustered with it
+        copy = self.add_content('https://example.com/amp/story', article[:-3] + ['Share', 'this', 'story'])
+        self.assertEqual(neardup.get_cluster(UrlContent.objects.get(uuid=copy.uuid)), str(copy.uuid))
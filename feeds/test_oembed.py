@@ -0,0 +1,27 @@
+from django.test import SimpleTestCase, override_settings
+from feeds.oembed import OEmbedError, cache_key, get_embeds
+from feeds.replay import FakeTwitter
+from feeds.utils import get_redis
+
+
+class OEmbedTests(SimpleTestCase):
+    def tearDown(self):
+        get_redis().delete(cache_key('1000001'), cache_key('1000002'))
+
+    def test_get_embeds(self):
+        urls = ['https://twitter.com/account_0/status/1000001',
+                'https://mobile.twitter.com/Account_0/status/1000001?s=20',
+                'https://twitter.com/account_0/status/1000002']
+        with FakeTwitter() as twitter, override_settings(TWITTER_OEMBED_URL=twitter.oembed_url):
+            # When: statuses are embedded, one of them under two urls
+            embeds = get_embeds(urls)
+            # Then: every status is fetched once, in a single batch
+            self.assertEqual(twitter.requests['/oembed'], 2)
+            self.assertIn('blockquote', embeds[urls[0]])
+            self.assertEqual(embeds[urls[0]], embeds[urls[1]])
+            # Then: statuses embedded earlier come from the cache
+            self.assertEqual(get_embeds(urls[1:]), {url: embeds[url] for url in urls[1:]})
+            self.assertEqual(twitter.requests['/oembed'], 2)
+            # Then: failures are reported per url
+            embeds = get_embeds(['https://twitter.com/account_0/status/1000099'])
+            self.assertIsInstance(embeds['https://twitter.com/account_0/status/1000099'], OEmbedError)
@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase, override_settings
+from unittest import mock
+import requests
+from feeds import politeness
+from feeds.utils import get_redis
+
+
+@override_settings(HOST_CONCURRENCY=2, HOST_MIN_DELAY=10, HOST_MAX_BACKOFF=100, HOST_LEASE_TTL=30)
+class PolitenessTests(SimpleTestCase):
+    host = 'polite.example.com'
+
+    def tearDown(self):
+        get_redis().delete(politeness.inflight_key(self.host), politeness.state_key(self.host))
+
+    @mock.patch('feeds.politeness.time')
+    def test_host_limits(self, clock):
+        clock.time.return_value = 1000
+        # When: a host is fetched
+        lease = politeness.acquire(self.host)
+        # Then: next fetch has to wait HOST_MIN_DELAY
+        with self.assertRaises(politeness.HostBusy) as busy:
+            politeness.acquire(self.host)
+        self.assertEqual(busy.exception.retry_after, 10)
+        # Then: the slot reserved for the waiter is taken when it comes back
+        clock.time.return_value = 1010
+        politeness.acquire(self.host, busy.exception.reserved_at)
+        # Then: no more than HOST_CONCURRENCY fetches run at once
+        clock.time.return_value = 1020
+        with self.assertRaises(politeness.HostBusy) as busy:
+            politeness.acquire(self.host)
+        self.assertEqual(busy.exception.reserved_at, 1030)
+        politeness.release(self.host, lease)
+        clock.time.return_value = 1030
+        politeness.acquire(self.host, busy.exception.reserved_at)
+
+    @mock.patch('feeds.politeness.time')
+    def test_waiters_get_their_own_slots(self, clock):
+        clock.time.return_value = 1000
+        politeness.acquire(self.host)
+        # When: many fetches of a host wait at once
+        slots = []
+        for waiter in range(5):
+            with self.assertRaises(politeness.HostBusy) as busy:
+                politeness.acquire(self.host)
+            slots.append(busy.exception.reserved_at)
+        # Then: every one of them gets its own slot, HOST_MIN_DELAY apart
+        self.assertEqual(slots, [1010, 1020, 1030, 1040, 1050])
+        # Then: each of them starts at its slot with a single retry
+        for slot in slots:
+            clock.time.return_value = slot
+            politeness.release(self.host, politeness.acquire(self.host, slot))
+
+    @mock.patch('feeds.politeness.time')
+    def test_failing_host_backs_off(self, clock):
+        clock.time.return_value = 1000
+        # When: fetches of a host keep timing out
+        for attempt in range(3):
+            with self.assertRaises(requests.Timeout):
+                with politeness.slot('http://%s/page' % self.host):
+                    raise requests.Timeout()
+            clock.time.return_value += 1000
+        # Then: wait between fetches doubles with every failure
+        with politeness.slot('http://%s/page' % self.host):
+            pass
+        with self.assertRaises(politeness.HostBusy) as busy:
+            politeness.acquire(self.host)
+        self.assertEqual(busy.exception.retry_after, 80)
+        # Then: a page missing on the host is not the host's failure
+        self.assertFalse(politeness.is_host_failure(requests.HTTPError(response=mock.Mock(status_code=404))))
+        self.assertTrue(politeness.is_host_failure(requests.HTTPError(response=mock.Mock(status_code=503))))
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+from unittest import mock
+from feeds.progress import ProgressReporter
+
+
+class ProgressTests(SimpleTestCase):
+    @mock.patch('feeds.progress.time')
+    def test_updates_are_coalesced(self, clock):
+        task = mock.Mock()
+        clock.time.return_value = 0
+        progress = ProgressReporter(task, 2000, interval=2, step=5)
+        # When: progress is reported for every one of 2000 follows within a second
+        for count in range(1, 2001):
+            progress.update(count, 'Processing %d' % count)
+        # Then: backend is written once for first update and then for every 5%
+        self.assertEqual(task.update_state.call_count, 20)
+        self.assertEqual(task.update_state.call_args[1]['meta']['count'], 1901)
+
+        # When: task is finished
+        progress.finish(2000, 'Done')
+        # Then: final state is always written
+        self.assertEqual(task.update_state.call_args[1]['meta'],
+                         {'info': 'Done', 'count': 2000, 'total': 2000})
+
+    @mock.patch('feeds.progress.time')
+    def test_slow_updates_are_reported_by_interval(self, clock):
+        task = mock.Mock()
+        progress = ProgressReporter(task, 2000, interval=2, step=5)
+        for count in range(1, 11):
+            clock.time.return_value = count
+            progress.update(count, 'Processing %d' % count)
+        # Then: updates coming a second apart are written every 2 seconds
+        self.assertEqual(task.update_state.call_count, 5)
@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase, override_settings
+from unittest import mock
+from feeds.models import AuthToken, TwitterAccount
+from feeds.ratelimit import RateLimited
+from feeds.replay import FakeTwitter
+from feeds.twitter import api_get, fetch_timelines
+
+
+@mock.patch('feeds.twitter.ratelimit')
+class ReplayTests(SimpleTestCase):
+    def test_fake_twitter(self, budget):
+        budget.RateLimited = RateLimited
+        # Given: fake twitter with two users following ten accounts each
+        with FakeTwitter(users=2, follows=10, tweets=5) as twitter:
+            auth_token = AuthToken(screen_name='reader', access_token=twitter.access_token(1),
+                                   access_token_secret='secret')
+            with override_settings(TWITTER_API_URL=twitter.api_url,
+                                   TWITTER_CONSUMER_KEY='key', TWITTER_CONSUMER_SECRET='secret'):
+                # When: friends of the user are looked up
+                friend_ids = api_get(auth_token, 'friends/ids')['ids']
+                users = api_get(auth_token, 'users/lookup',
+                                user_id=','.join(str(friend_id) for friend_id in friend_ids))
+                account = TwitterAccount(screen_name=users[0]['screen_name'], last_status_id=None)
+                [(used_token, statuses)] = fetch_timelines([(account, [auth_token])])
+                account.last_status_id = int(statuses[1]['id_str'])
+                [(used_token, newer)] = fetch_timelines([(account, [auth_token])])
+        # Then: follows of users overlap and timelines are served latest first
+        self.assertEqual(friend_ids, twitter.friend_ids(1))
+        self.assertTrue(set(twitter.friend_ids(0)) & set(friend_ids))
+        self.assertEqual(len(users), 10)
+        self.assertEqual(len(statuses), 5)
+        self.assertGreater(int(statuses[0]['id_str']), int(statuses[1]['id_str']))
+        # Then: since_id is honoured
+        self.assertEqual(newer, statuses[:1])
+        self.assertEqual(twitter.requests['/1.1/statuses/user_timeline.json'], 2)
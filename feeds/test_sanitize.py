@@ -0,0 +1,10 @@
+from django.test import SimpleTestCase
+from feeds.sanitize import sanitize
+
+
+class SanitizeTests(SimpleTestCase):
+    def test_invalid_xml_characters_are_removed(self):
+        # Then: control characters, surrogates and non-characters go
+        self.assertEqual(sanitize('a\x00b\x0bc\x1fd\ud800e￾f'), 'abcdef')
+        # Then: whitespace, other scripts and astral characters stay
+        self.assertEqual(sanitize('a\tb\nc\rd ü साइट \U0001f600'), 'a\tb\nc\rd ü साइट \U0001f600')
@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from feeds.models import AuthToken, TwitterAccount
+from feeds.schedule import get_poll_interval, lease_polls
+import datetime
+
+
+@override_settings(POLL_INTERVAL_MIN=900, POLL_INTERVAL_MAX=86400,
+                   POLL_STATUSES_PER_POLL=10, POLL_RATE_WINDOW=7 * 86400,
+                   POLL_BACKOFF=2)
+class ScheduleTests(SimpleTestCase):
+    def test_busy_account_is_capped(self):
+        now = timezone.now()
+        account = TwitterAccount(screen_name='busy', poll_interval=900)
+        # When: account tweeted 20 times in last hour
+        tweeted_at = [now - datetime.timedelta(minutes=minutes) for minutes in range(0, 60, 3)]
+        interval = get_poll_interval(account, now - datetime.timedelta(hours=1), tweeted_at)
+        # Then: it is polled as often as allowed
+        self.assertEqual(interval, 900)
+
+    def test_interval_follows_posting_rate(self):
+        now = timezone.now()
+        account = TwitterAccount(screen_name='regular', poll_interval=900)
+        # When: account tweeted 2 times in last 2 hours
+        tweeted_at = [now, now - datetime.timedelta(hours=1)]
+        interval = get_poll_interval(account, now - datetime.timedelta(hours=2), tweeted_at)
+        # Then: it is polled after about 10 statuses
+        self.assertAlmostEqual(interval, 10 * 60 * 60, delta=60)
+
+    def test_full_page_of_new_account(self):
+        now = timezone.now()
+        account = TwitterAccount(screen_name='hourly', poll_interval=900)
+        last_updated = now - datetime.timedelta(days=365)
+        tweeted_at = [now - datetime.timedelta(hours=hours) for hours in range(20)]
+        # When: a page of an account seen for the first time is full
+        interval = get_poll_interval(account, last_updated, tweeted_at, full=True)
+        # Then: it may have tweeted more, it is polled as often as allowed
+        self.assertEqual(interval, 900)
+        # When: the page isn't full
+        interval = get_poll_interval(account, last_updated, tweeted_at)
+        # Then: rate is measured over the statuses found, not the year
+        self.assertAlmostEqual(interval, 19 * 60 * 60 / 20 * 10, delta=60)
+
+    def test_dormant_account_backs_off(self):
+        account = TwitterAccount(screen_name='dormant', poll_interval=3600)
+        last_updated = timezone.now() - datetime.timedelta(days=365)
+        # When: nothing new is found, interval doubles
+        self.assertEqual(get_poll_interval(account, last_updated, []), 7200)
+        # Then: up to the max
+        account.poll_interval = 80000
+        self.assertEqual(get_poll_interval(account, last_updated, []), 86400)
+
+
+@override_settings(POLL_LEASE=1800)
+class LeaseTests(TestCase):
+    def test_due_accounts_are_leased(self):
+        now = timezone.now()
+        auth_token = AuthToken.objects.create(screen_name='reader')
+        due = TwitterAccount.objects.create(screen_name='due', next_poll=now - datetime.timedelta(minutes=1))
+        later = TwitterAccount.objects.create(screen_name='later', next_poll=now + datetime.timedelta(hours=1))
+        TwitterAccount.objects.create(screen_name='unfollowed', next_poll=now - datetime.timedelta(minutes=1))
+        for account in [due, later]:
+            account.followed_from.add(auth_token)
+        # When: due accounts are leased
+        self.assertEqual(lease_polls(), [str(due.uuid)])
+        # Then: they aren't due again until the lease runs out
+        self.assertGreater(TwitterAccount.objects.get(uuid=due.uuid).next_poll, now + datetime.timedelta(minutes=29))
+        self.assertEqual(lease_polls(), [])
+        # Then: all accounts a user follows can be leased at once
+        self.assertEqual(lease_polls([auth_token.uuid], due=False), sorted([str(due.uuid), str(later.uuid)]))
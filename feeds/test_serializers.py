@@ -1,7 +1,8 @@
 from django.test import TestCase
 import os
 import tweepy
-from feeds.models import AuthToken, TwitterAccount, TwitterStatus, UrlShared
+from feeds.canonical import canonicalize
+from feeds.models import AuthToken, TwitterAccount, TwitterStatus, UrlContent, UrlShared
 from feeds.serializers import StatusSerializer, UrlSerializer
 import pytz
 import datetime
@@ -73,8 +74,11 @@ class SerializerTests(TestCase):
                 if len(url_entity['expanded_url']) > 200:
                     continue
                 shared_at = pytz.utc.localize(status.created_at)
+                content, _ = UrlContent.objects.get_or_create(
+                    canonical_url=canonicalize(url_entity['expanded_url']),
+                    defaults={'url': url_entity['expanded_url']})
                 link_obj, created = UrlShared.objects.get_or_create(
-                    url=url_entity['expanded_url'], defaults={'url_shared': shared_at})
+                    url=url_entity['expanded_url'], defaults={'url_shared': shared_at, 'content': content})
                 if created:
                     link_obj.save()
                 link_obj.shared_from.add(self.friend_account)
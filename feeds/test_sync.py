@@ -0,0 +1,38 @@
+from django.test import TestCase, override_settings
+from unittest import mock
+from feeds.models import AuthToken, TwitterAccount
+from feeds.ratelimit import RateLimited
+from feeds.replay import FakeTwitter
+from feeds.tasks import sync_friends
+
+
+@mock.patch('feeds.twitter.ratelimit')
+class SyncFriendsTests(TestCase):
+    def sync(self, twitter, auth_token):
+        with override_settings(TWITTER_API_URL=twitter.api_url,
+                               TWITTER_CONSUMER_KEY='key', TWITTER_CONSUMER_SECRET='secret'):
+            sync_friends(mock.Mock(), auth_token)
+        return set(TwitterAccount.objects.filter(followed_from=auth_token).values_list('twitter_id', flat=True))
+
+    def test_follows_are_synced(self, budget):
+        budget.RateLimited = RateLimited
+        # Given: a user following ten accounts, two of them suspended
+        with FakeTwitter(users=1, follows=10, tweets=1, suspended=[1008, 1009]) as twitter:
+            auth_token = AuthToken.objects.create(screen_name='reader', access_token=twitter.access_token(0),
+                                                  access_token_secret='secret')
+            # When: follows are synced
+            followed = self.sync(twitter, auth_token)
+            # Then: accounts which exist are followed
+            self.assertEqual(followed, set(range(1000, 1008)))
+            lookups = twitter.requests['/1.1/users/lookup.json']
+            # When: the user follows another account and unfollows one
+            twitter.friends[0] = list(range(1001, 1008)) + [1010]
+            followed = self.sync(twitter, auth_token)
+            # Then: only the new account is looked up and follows are updated
+            self.assertEqual(followed, set(range(1001, 1008)) | {1010})
+            self.assertEqual(twitter.requests['/1.1/users/lookup.json'], lookups + 1)
+            # When: every new account the user follows is suspended
+            twitter.friends[0] = list(range(1001, 1008)) + [1008, 1009]
+            followed = self.sync(twitter, auth_token)
+            # Then: the lookup answering 404 doesn't abort the sync
+            self.assertEqual(followed, set(range(1001, 1008)))
@@ -0,0 +1,88 @@
+from django.test import SimpleTestCase, override_settings
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from urllib import parse
+import json
+import threading
+from feeds.models import AuthToken, TwitterAccount
+from feeds.ratelimit import RateLimited
+from feeds.twitter import sign_request, fetch_timelines
+
+
+class FakeTimelineHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        parsed_url = parse.urlparse(self.path)
+        params = dict(parse.parse_qsl(parsed_url.query))
+        if 'oauth_signature=' not in self.headers.get('Authorization', ''):
+            self.send_response(401)
+            self.end_headers()
+            return
+        if params['screen_name'] == 'limited':
+            self.send_response(429)
+            self.end_headers()
+            return
+        statuses = [{'id_str': '%s' % status_id,
+                     'user': {'screen_name': params['screen_name']}}
+                    for status_id in range(int(params.get('since_id', 0)) + 1, 4)]
+        body = json.dumps(statuses).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TwitterTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TwitterTests, cls).setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTimelineHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = 'http://127.0.0.1:%s/1.1/' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(TwitterTests, cls).tearDownClass()
+
+    def test_sign_request(self):
+        """Example from https://dev.twitter.com/oauth/overview/creating-signatures"""
+        header = sign_request('POST', 'https://api.twitter.com/1.1/statuses/update.json',
+                              {'include_entities': 'true',
+                               'status': 'Hello Ladies + Gentlemen, a signed OAuth request!'},
+                              'xvz1evFS4wEEPTGEFPHBog', 'kAcSOqF21Fu85e7zjz7ZN2U4ZRhfV3WpwPAoE3Z7kBw',
+                              '370773112-GmHxMAgYyLbNEtIKZeRNFsMKPR9EyMZeS9weJAEb', 'LswwdoUaIvS8ltyTt5jkRh4J50vUPVVHtR2YPi5kE',
+                              nonce='kYjzVBB8Y0ZFabxSWbWovY3uYSQ2pTgmZeNu2VS4cg', timestamp=1318622958)
+        self.assertIn('oauth_signature="hCtSmYh%2BiHYCEqBWrE7C7hYmtUk%3D"', header)
+
+    @mock.patch('feeds.twitter.ratelimit')
+    def test_fetch_timelines(self, budget):
+        budget.RateLimited = RateLimited
+        budget.get_retry_after.return_value = 60
+        auth_token = AuthToken(screen_name='reader', access_token='token', access_token_secret='secret')
+        jobs = [(TwitterAccount(screen_name='friend_%s' % index), [auth_token]) for index in range(20)]
+        jobs.append((TwitterAccount(screen_name='friend', last_status_id=2), [auth_token]))
+        jobs.append((TwitterAccount(screen_name='limited'), [auth_token]))
+        # When: timelines are fetched from fake twitter
+        with override_settings(TWITTER_API_URL=self.api_url, TIMELINE_FETCH_CONCURRENCY=4,
+                               TWITTER_CONSUMER_KEY='key', TWITTER_CONSUMER_SECRET='secret'):
+            results = fetch_timelines(jobs)
+        # Then: every account gets its own statuses, in order of jobs
+        for (twitter_account, followers), (used_token, statuses) in zip(jobs[:20], results[:20]):
+            self.assertEqual(used_token, auth_token)
+            self.assertEqual([status['user']['screen_name'] for status in statuses],
+                             [twitter_account.screen_name] * 3)
+        # Then: only statuses since last_status_id are fetched
+        self.assertEqual([status['id_str'] for status in results[20][1]], ['3'])
+        # Then: rate limited account is reported to be retried later
+        self.assertIsInstance(results[21], RateLimited)
+        self.assertEqual(results[21].retry_after, 60)
@@ -0,0 +1,43 @@
+import datetime
+import io
+from xml.etree import ElementTree
+from django.test import SimpleTestCase
+from django.utils import timezone
+from feeds.xmlwriter import AtomWriter, write_opml
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class XMLWriterTests(SimpleTestCase):
+    def test_atom_feed(self):
+        published = datetime.datetime(2017, 3, 1, 10, 0, tzinfo=timezone.utc)
+        # Given: an entry rendered on its own
+        fragment = io.BytesIO()
+        AtomWriter(fragment).entry('https://example.com/b', 'B', published, 'bob', '<p>B & more</p>')
+        # When: a feed is streamed with it and another entry
+        stream = io.BytesIO()
+        writer = AtomWriter(stream)
+        writer.start_feed('https://twitter.com/reader', 'reader', published, 'https://twitter.com/reader',
+                          subtitle='Links', language='en')
+        writer.entry('https://example.com/a?x=1&y=2', 'A', published, 'alice, bob', '<p>A</p>')
+        writer.raw(fragment.getvalue())
+        writer.end_feed()
+        # Then: it is a valid Atom document with both entries escaped
+        feed = ElementTree.fromstring(stream.getvalue())
+        self.assertEqual(feed.find(ATOM + 'title').text, 'reader')
+        entries = [(entry.find(ATOM + 'id').text, entry.find(ATOM + 'content').text,
+                    entry.find(ATOM + 'published').text) for entry in feed.findall(ATOM + 'entry')]
+        self.assertEqual(entries, [('https://example.com/a?x=1&y=2', '<p>A</p>', '2017-03-01T10:00:00+00:00'),
+                                   ('https://example.com/b', '<p>B & more</p>', '2017-03-01T10:00:00+00:00')])
+
+    def test_opml(self):
+        stream = io.BytesIO()
+        # When: outlines are written as they come from a generator
+        write_opml(stream, 'My Twitter Feed', '2017-03-01',
+                   ({'text': name, 'type': 'rss', 'xmlUrl': 'https://example.com/%s.xml' % name}
+                    for name in ['alice', 'b&b']),
+                   comment='Feed list')
+        # Then: every one of them is listed
+        opml = ElementTree.fromstring(stream.getvalue())
+        self.assertEqual(opml.find('head/title').text, 'My Twitter Feed')
+        self.assertEqual([outline.get('text') for outline in opml.findall('body/outline')], ['alice', 'b&b'])
@@ -5,7 +5,8 @@ import pytz
 from django.contrib.staticfiles import finders
 from django.test import Client
 from django.core.urlresolvers import reverse
-from feeds import models
+from feeds import inbox, models
+from feeds.canonical import canonicalize
 import datetime
 from rest_framework import status
 from uuid import uuid4
@@ -74,8 +75,12 @@ class FeedsTest(TestCase):
                         if pytz.utc.localize(tweet.created_at) < time_threshold:
                             continue
                         if url_entity.get('expanded_url', ''):
+                            content, _ = models.UrlContent.objects.get_or_create(
+                                canonical_url=canonicalize(url_entity['expanded_url']),
+                                defaults={'url': url_entity['expanded_url']})
                             link_obj, created = models.UrlShared.objects.get_or_create(url=url_entity['expanded_url'],
-                                                                                       url_shared=pytz.utc.localize(tweet.created_at))
+                                                                                       url_shared=pytz.utc.localize(tweet.created_at),
+                                                                                       defaults={'content': content})
                             if created:
                                 link_obj.save()
                             if not link_obj.shared_from.filter(uuid=twitter_account.uuid).exists():
@@ -88,6 +93,8 @@ class FeedsTest(TestCase):
             friends_counter += 1
             # if friends_counter >= 3:
             #     break
+        inbox.follow(auth_token.uuid, models.TwitterAccount.objects.filter(
+            followed_from=auth_token).values_list('uuid', flat=True))
 
     @classmethod
     def tearDownClass(cls):
@@ -0,0 +1,188 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import time
+from urllib import parse
+import uuid
+
+import aiohttp
+from django.conf import settings
+import requests
+import tweepy
+
+from feeds import ratelimit
+
+TIMELINE = 'statuses/user_timeline'
+
+_session = None
+
+
+class TwitterError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        super(TwitterError, self).__init__('Twitter responded with %s: %s' % (status, message))
+
+
+def get_api(auth_token):
+    '''tweepy API for `auth_token`. It never sleeps on rate limits, calls
+    should go through `call` to keep within budget of the token.'''
+    auth = tweepy.OAuthHandler(settings.TWITTER_CONSUMER_KEY,
+                               settings.TWITTER_CONSUMER_SECRET)
+    auth.set_access_token(auth_token.access_token,
+                          auth_token.access_token_secret)
+    return tweepy.API(auth, wait_on_rate_limit=False)
+
+
+def update_budget(auth_token, endpoint, headers, limited=False):
+    '''Align budget of `auth_token` with x-rate-limit-* response headers.'''
+    if limited:
+        reset_at = None
+        if 'x-rate-limit-reset' in headers:
+            reset_at = int(headers['x-rate-limit-reset'])
+        ratelimit.exhaust(auth_token.uuid, endpoint, reset_at)
+    elif 'x-rate-limit-remaining' in headers and 'x-rate-limit-reset' in headers:
+        ratelimit.update(auth_token.uuid, endpoint,
+                         int(headers['x-rate-limit-remaining']),
+                         int(headers['x-rate-limit-reset']))
+
+
+def call(api, auth_token, endpoint, method, *args, **kwargs):
+    '''Call `method` of `api` charging it to `endpoint` budget of
+    `auth_token`.
+
+    Raises ratelimit.RateLimited instead of waiting when budget is
+    exhausted.
+
+    '''
+    ratelimit.acquire(auth_token.uuid, endpoint)
+    try:
+        result = getattr(api, method)(*args, **kwargs)
+    except tweepy.RateLimitError:
+        update_budget(auth_token, endpoint, getattr(getattr(api, 'last_response', None), 'headers', {}), limited=True)
+        raise ratelimit.RateLimited(endpoint, ratelimit.get_retry_after(auth_token.uuid, endpoint))
+    update_budget(auth_token, endpoint, getattr(getattr(api, 'last_response', None), 'headers', {}))
+    return result
+
+
+def quote(value):
+    '''Percent encoding of OAuth 1.0a(RFC 3986).'''
+    return parse.quote(str(value), safe='~')
+
+
+def sign_request(method, url, params, consumer_key, consumer_secret, token, token_secret,
+                 nonce=None, timestamp=None):
+    '''Authorization header of a HMAC-SHA1 signed OAuth 1.0a request, see
+    https://dev.twitter.com/oauth/overview/creating-signatures
+
+    '''
+    oauth_params = {'oauth_consumer_key': consumer_key,
+                    'oauth_nonce': nonce or uuid.uuid4().hex,
+                    'oauth_signature_method': 'HMAC-SHA1',
+                    'oauth_timestamp': str(int(timestamp or time.time())),
+                    'oauth_token': token,
+                    'oauth_version': '1.0'}
+    encoded_params = sorted((quote(key), quote(value)) for key, value in
+                            list(params.items()) + list(oauth_params.items()))
+    parameter_string = '&'.join('%s=%s' % param for param in encoded_params)
+    base_string = '&'.join([method.upper(), quote(url), quote(parameter_string)])
+    signing_key = quote(consumer_secret) + '&' + quote(token_secret)
+    signature = hmac.new(signing_key.encode('utf-8'), base_string.encode('utf-8'), hashlib.sha1)
+    oauth_params['oauth_signature'] = base64.b64encode(signature.digest()).decode('utf-8')
+    return 'OAuth ' + ', '.join('%s="%s"' % (quote(key), quote(value))
+                                for key, value in sorted(oauth_params.items()))
+
+
+def get_oauth_header(method, url, params, auth_token):
+    return sign_request(method, url, params,
+                        settings.TWITTER_CONSUMER_KEY, settings.TWITTER_CONSUMER_SECRET,
+                        auth_token.access_token, auth_token.access_token_secret)
+
+
+def api_get(auth_token, endpoint, **params):
+    '''Signed GET of `endpoint`(like 'friends/ids') of TWITTER_API_URL
+    charged to budget of `auth_token`, returns decoded json.
+
+    Raises ratelimit.RateLimited when budget is exhausted and
+    TwitterError on any other failure.
+
+    '''
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    ratelimit.acquire(auth_token.uuid, endpoint)
+    url = settings.TWITTER_API_URL + endpoint + '.json'
+    params = {key: str(value) for key, value in params.items()}
+    headers = {'Authorization': get_oauth_header('GET', url, params, auth_token)}
+    try:
+        response = _session.get(url, params=params, headers=headers, timeout=settings.TWITTER_API_TIMEOUT)
+    except requests.RequestException as e:
+        raise TwitterError(None, e)
+    update_budget(auth_token, endpoint, response.headers, limited=response.status_code == 429)
+    if response.status_code == 429:
+        raise ratelimit.RateLimited(endpoint, ratelimit.get_retry_after(auth_token.uuid, endpoint))
+    if response.status_code != 200:
+        raise TwitterError(response.status_code, response.text)
+    return response.json()
+
+
+async def fetch_timeline(session, semaphore, loop, twitter_account, followers):
+    '''Fetch statuses of `twitter_account` since its last_status_id with
+    the first of `followers` whose token has budget left.
+
+    Returns the AuthToken used and raw statuses, raises RateLimited
+    with the shortest wait if every follower is out of budget. Budgets
+    are kept in Redis by blocking calls, those run in the default
+    executor of `loop` so that other fetches go on meanwhile.
+
+    '''
+    url = settings.TWITTER_API_URL + TIMELINE + '.json'
+    params = {'screen_name': twitter_account.screen_name, 'count': str(settings.TIMELINE_COUNT)}
+    if twitter_account.last_status_id:
+        params['since_id'] = str(twitter_account.last_status_id)
+    retry_after = None
+    for auth_token in followers:
+        try:
+            await loop.run_in_executor(None, ratelimit.acquire, auth_token.uuid, TIMELINE)
+        except ratelimit.RateLimited as e:
+            retry_after = e.retry_after if retry_after is None else min(retry_after, e.retry_after)
+            continue
+        headers = {'Authorization': get_oauth_header('GET', url, params, auth_token)}
+        async with semaphore:
+            async with session.get(url, params=params, headers=headers) as response:
+                await loop.run_in_executor(None, update_budget, auth_token, TIMELINE, response.headers,
+                                           response.status == 429)
+                if response.status == 429:
+                    wait = await loop.run_in_executor(None, ratelimit.get_retry_after, auth_token.uuid, TIMELINE)
+                    retry_after = wait if retry_after is None else min(retry_after, wait)
+                    continue
+                if response.status != 200:
+                    raise TwitterError(response.status, await response.text())
+                return auth_token, await response.json()
+    if retry_after is not None:
+        raise ratelimit.RateLimited(TIMELINE, retry_after)
+    return None, []
+
+
+async def _fetch_timelines(jobs, loop):
+    semaphore = asyncio.Semaphore(settings.TIMELINE_FETCH_CONCURRENCY, loop=loop)
+    connector = aiohttp.TCPConnector(limit=settings.TIMELINE_FETCH_CONCURRENCY, loop=loop)
+    async with aiohttp.ClientSession(connector=connector, loop=loop) as session:
+        return await asyncio.gather(*[fetch_timeline(session, semaphore, loop, twitter_account, followers)
+                                      for twitter_account, followers in jobs],
+                                    loop=loop, return_exceptions=True)
+
+
+def fetch_timelines(jobs):
+    '''Fetch timelines for `jobs`, a list of (TwitterAccount, followers),
+    concurrently over a pool of keep-alive connections.
+
+    Returns, in order of `jobs`, either result of `fetch_timeline` or
+    the exception it raised.
+
+    '''
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_fetch_timelines(jobs, loop))
+    finally:
+        loop.close()
@@ -36,6 +36,7 @@ urlpatterns = [
         name='get_status',
     ),
     url(r'^index/(?P<uuid>[a-zA-Z0-9-]+)/$', views.index, name='index'),
+    url(r'^rate_limits/(?P<uuid>[a-zA-Z0-9-]+)/$', views.rate_limits, name='rate_limits'),
     url(r'^opml/(?P<uuid>[a-zA-Z0-9-]+)/$', views.opml, name='opml'),
     url(r'^status/(?P<uuid>[a-zA-Z0-9-]+)/$', status_list, name='statuses'),
     url(r'^urls/(?P<uuid>[a-zA-Z0-9-]+)/$', url_listing, name='urls'),
@@ -0,0 +1,12 @@
+from django.conf import settings
+import redis
+
+_connection_pool = None
+
+
+def get_redis():
+    '''Redis client sharing a connection pool within the process.'''
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = redis.ConnectionPool.from_url(settings.REDIS_URL)
+    return redis.StrictRedis(connection_pool=_connection_pool)
@@ -5,20 +5,18 @@ from django.core.urlresolvers import reverse
 from rest_framework.serializers import ValidationError
 import tweepy
 from feeds.tasks import update_accounts_task
+from feeds import feedquery, inbox, neardup, ratelimit
 from django.contrib.auth import logout
-from feeds.models import AuthToken, TwitterAccount, UrlShared, \
+from feeds.canonical import canonical_urls, clean_url
+from feeds.models import AuthToken, TwitterAccount, UrlContent, UrlShared, \
     TwitterStatus, PushNotificationToken
-from feeds.serializers import UrlSerializer, StatusSerializer, \
+from feeds.xmlwriter import AtomWriter, write_opml
+from feeds.serializers import ClusterSerializer, UrlSerializer, StatusSerializer, \
     PushNotificationSerializer
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from urllib import parse
 from rest_framework.decorators import api_view, detail_route
-from feedgen.feed import FeedGenerator
-from xml.etree.ElementTree import Element, SubElement, Comment
-from xml.dom import minidom
-from xml.etree import ElementTree
 import datetime
 from django.utils import timezone
 from dateutil import parser
@@ -47,14 +45,42 @@ class UrlViewSet(viewsets.ModelViewSet):
         if not AuthToken.objects.filter(uuid=uuid).exists():
             raise Http404
         links_of = self.request.query_params.get('links_of', '')
+        collapse = self.request.query_params.get('collapse', '')
+        since = None
+        if collapse:
+            # Near-duplicates are collapsed among links shared since
+            # `since`, FEED_WINDOW seconds by default, so that it costs
+            # no more than the range asked for
+            since = self.request.query_params.get('since', '')
+            since = parser.parse(since) if since else timezone.now() - datetime.timedelta(seconds=settings.FEED_WINDOW)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
         if links_of:
             if TwitterAccount.objects.filter(uuid=links_of).exists():
                 links = UrlShared.objects.filter(shared_from=links_of)
+                if since is not None:
+                    links = links.filter(url_shared__gte=since)
             else:
                 raise Http404
         else:
-            links = UrlShared.objects.filter(shared_from__followed_from__uuid=uuid)
-        return links
+            links = inbox.get_links(uuid, since)
+        self.latest = None
+        if collapse:
+            # Only the latest link of near-duplicates, see feeds.neardup
+            self.latest = neardup.get_latest(links)
+            links = UrlShared.objects.filter(uuid__in=list(self.latest))
+        return links.select_related('content__blob')
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('collapse', ''):
+            return ClusterSerializer
+        return UrlSerializer
+
+    def paginate_queryset(self, queryset):
+        page = super(UrlViewSet, self).paginate_queryset(queryset)
+        if page is not None and getattr(self, 'latest', None) is not None:
+            neardup.set_cluster_sharers(page, self.latest)
+        return page
 
     @detail_route()
     def get_feed(self, request, uuid=None):
@@ -65,22 +91,14 @@ class UrlViewSet(viewsets.ModelViewSet):
         screen_name = AuthToken.objects.get(uuid=uuid).screen_name
         feed_date = parser.parse(self.request.query_params.get('date',
                                                                datetime.date.today().strftime('%d-%b-%Y')))
-        fg = FeedGenerator()
-        fg.id('https://twitter.com/%s' % screen_name)
-        fg.description('Links shared by people you follow')
-        fg.title(screen_name)
-        fg.author({'name': screen_name})
-        fg.link(href='https://twitter.com/%s' % screen_name, rel='alternate')
-        fg.language('en')
-        for link in UrlShared.objects.filter(shared_from__followed_from__uuid=uuid, url_shared__gte=feed_date).order_by('url').distinct('url'):
-            fe = fg.add_entry()
-            fe.id(link.url)
-            fe.author({'name': ', '.join([shared_from.screen_name for shared_from in link.shared_from.all()])})
-            fe.title(link.url)
-            fe.content(link.url)
-            fe.pubdate(link.url_shared)
         with open('feeds/static/xml/%s-feed.xml' % uuid, 'wb') as feed:
-            feed.write(fg.atom_str(pretty=True))
+            writer = AtomWriter(feed)
+            writer.start_feed('https://twitter.com/%s' % screen_name, screen_name, timezone.now(),
+                              'https://twitter.com/%s' % screen_name,
+                              subtitle='Links shared by people you follow', author=screen_name, language='en')
+            for link in feedquery.get_links(uuid, feed_date):
+                writer.entry(link.url, link.url, link.published, link.sharers, link.url, content_type='text')
+            writer.end_feed()
         return Response({'xml_file': 'xml/%s-feed.xml' % uuid,
                          'date': feed_date.strftime('%d %b %Y')},
                         status=status.HTTP_200_OK)
@@ -97,16 +115,19 @@ class UrlViewSet(viewsets.ModelViewSet):
             twitter_account = TwitterAccount.objects.get(screen_name=oauth_account.screen_name)
         except AuthToken.DoesNotExist:
             raise ValidationError('You are not authorized to archive link on this service')
-        parsed_url = parse.urlparse(url_shared)
-        # FIXME: YouTube URLs would be totally screwed by this.
-        cleaned_url = parsed_url.scheme + "://" + parsed_url.netloc + parsed_url.path
-        if cleaned_url:
-            if UrlShared.objects.filter(url=cleaned_url).exists():
-                url_obj = UrlShared.objects.get(url=cleaned_url)
-            else:
-                url_obj = UrlShared.objects.create(url=cleaned_url, url_shared=timezone.now())
+        if url_shared:
+            cleaned_url = clean_url(url_shared)
+            content, _ = UrlContent.objects.get_or_create(canonical_url=canonical_urls([url_shared])[url_shared],
+                                                          defaults={'url': cleaned_url})
+            url_obj = UrlShared.objects.filter(url=cleaned_url, content=content).first()
+            if url_obj is None:
+                url_obj = UrlShared.objects.create(url=cleaned_url, url_shared=timezone.now(), content=content,
+                                                   sanitized=True)
             url_obj.shared_from.add(twitter_account)
+            # Sharers of the link changed, see feeds.feedcache
+            url_obj.added = timezone.now()
             url_obj.save()
+            inbox.deliver(twitter_account.uuid, [url_obj.uuid])
             serialized_obj = UrlSerializer(url_obj)
             return Response(serialized_obj.data, status=status.HTTP_201_CREATED)
         else:
@@ -122,41 +143,25 @@ class StatusViewSet(viewsets.ModelViewSet):
         if not AuthToken.objects.filter(uuid=uuid).exists():
             raise Http404
         if seen:
-            statuses = TwitterStatus.objects.filter(followed_from__uuid=uuid, status_seen=seen)
+            statuses = TwitterStatus.objects.filter(tweet_from__followed_from__uuid=uuid, status_seen=seen)
         else:
-            statuses = TwitterStatus.objects.filter(followed_from__uuid=uuid)
+            statuses = TwitterStatus.objects.filter(tweet_from__followed_from__uuid=uuid)
         return statuses
 
 
 @api_view(['GET'])
 def opml(request, uuid):
     if TwitterAccount.objects.filter(followed_from__uuid=uuid).exists():
-        root = Element('opml')
-        generated_on = str(datetime.datetime.now())
-        root.set('version', '1.0')
-        root.append(Comment('Feed list of all tweets'))
-
-        head = SubElement(root, 'head')
-        title = SubElement(head, 'title')
-        title.text = 'My Twitter Feed'
-        dc = SubElement(head, 'dateCreated')
-        dc.text = generated_on
-        dm = SubElement(head, 'dateModified')
-        dm.text = generated_on
-
-        body = SubElement(root, 'body')
         host_uri = 'https://' + request.get_host()
-        SubElement(body, 'outline',
-                   {'text': 'Links',
-                    'title': 'Feeds of all links shared by people you follow.',
-                    'type': 'rss',
-                    'htmlUrl': host_uri + 'links/%s/' % uuid,
-                    'xmlUrl': host_uri + 'links/%s/?feed=1' % uuid,
-                    })
         with open('feeds/static/opml/%s.opml' % uuid, 'wb') as opml:
-            rough_string = ElementTree.tostring(root, 'utf-8')
-            reparsed = minidom.parseString(rough_string)
-            opml.write(reparsed.toprettyxml(indent="  ").encode('utf8'))
+            write_opml(opml, 'My Twitter Feed', str(datetime.datetime.now()),
+                       [{'text': 'Links',
+                         'title': 'Feeds of all links shared by people you follow.',
+                         'type': 'rss',
+                         'htmlUrl': host_uri + 'links/%s/' % uuid,
+                         'xmlUrl': host_uri + 'links/%s/?feed=1' % uuid,
+                         }],
+                       comment='Feed list of all tweets')
         return Response({'xml_file': 'opml/%s.opml' % uuid}, status=status.HTTP_200_OK)
     else:
         raise Http404
@@ -173,7 +178,7 @@ def timeline(request):
         access_key = request.session['access_key_tw']
         access_secret = request.session['access_secret_tw']
         auth.set_access_token(access_key, access_secret)
-        api = tweepy.API(auth, wait_on_rate_limit=True)
+        api = tweepy.API(auth)
         user = api.me()
         return render_to_response('info.html', {'name': user.screen_name})
     else:
@@ -239,7 +244,7 @@ def get_verification(request):
     except tweepy.TweepError:
         raise
     try:
-        api = tweepy.API(auth, wait_on_rate_limit=True)
+        api = tweepy.API(auth)
     except tweepy.TweepError:
         raise
     me = api.me()
@@ -266,6 +271,8 @@ def get_status(request):
     task = update_accounts_task.AsyncResult(task_id)
     if task.state == 'PROGRESS':
         return JsonResponse({'task_status': task.state, 'info': task.info['info'], 'count': task.info['count'], 'total_count': task.info['total']})
+    elif task.state == 'RETRY':
+        return JsonResponse({'task_status': task.state, 'info': 'Waiting for Twitter rate limits to reset', 'count': 0, 'total_count': 0})
     elif task.state == 'FAILURE':
         return JsonResponse({'task_status': task.state, }, status=400)
     elif task.state == 'SUCCESS':
@@ -274,6 +281,12 @@ def get_status(request):
         return JsonResponse({'task_status': task.state, 'message': 'It is lost'})
 
 
+def rate_limits(request, uuid):
+    if not AuthToken.objects.filter(uuid=uuid).exists():
+        raise Http404
+    return JsonResponse({'rate_limits': ratelimit.get_budget(uuid)})
+
+
 class PushTokenList(APIView):
     """
     Create PushToken for WebPush.
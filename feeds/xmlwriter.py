@@ -0,0 +1,112 @@
+'''Streaming writers of Atom feeds and OPML.
+
+Documents are written element by element to a binary stream(a file or
+a response) as rows come in, only the element being written is held in
+memory whatever the size of the document.
+
+'''
+from xml.sax.saxutils import XMLGenerator
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+
+class XMLWriter(object):
+    def __init__(self, stream):
+        self.generator = XMLGenerator(stream, 'utf-8', short_empty_elements=True)
+
+    def start_document(self):
+        self.generator.startDocument()
+
+    def end_document(self):
+        self.generator.endDocument()
+
+    def start(self, name, attrs=None):
+        self.generator.startElement(name, attrs or {})
+
+    def end(self, name, newline=False):
+        self.generator.endElement(name)
+        if newline:
+            self.newline()
+
+    def element(self, name, text='', attrs=None):
+        self.start(name, attrs)
+        if text:
+            self.generator.characters(text)
+        self.end(name)
+
+    def newline(self):
+        self.generator.ignorableWhitespace('\n')
+
+    def raw(self, data):
+        '''Write `data`, str or utf-8 bytes, which is XML already.'''
+        self.generator.ignorableWhitespace(data)
+
+    def comment(self, text):
+        self.raw('<!--%s-->' % text.replace('--', '- -'))
+
+
+class AtomWriter(XMLWriter):
+    def start_feed(self, id, title, updated, link, subtitle=None, author=None, language=None):
+        self.start_document()
+        attrs = {'xmlns': ATOM_NS}
+        if language:
+            attrs['xml:lang'] = language
+        self.start('feed', attrs)
+        self.newline()
+        self.element('id', id)
+        self.element('title', title)
+        self.element('updated', format_date(updated))
+        if author:
+            self.start('author')
+            self.element('name', author)
+            self.end('author')
+        self.element('link', attrs={'href': link, 'rel': 'alternate'})
+        if subtitle:
+            self.element('subtitle', subtitle)
+        self.newline()
+
+    def entry(self, id, title, published, author=None, content=None, content_type='html'):
+        self.start('entry')
+        self.element('id', id)
+        self.element('title', title)
+        self.element('updated', format_date(published))
+        if author:
+            self.start('author')
+            self.element('name', author)
+            self.end('author')
+        if content is not None:
+            self.element('content', content, {'type': content_type})
+        self.element('published', format_date(published))
+        self.end('entry', newline=True)
+
+    def end_feed(self):
+        self.end('feed', newline=True)
+        self.end_document()
+
+
+def format_date(value):
+    return value.isoformat()
+
+
+def write_opml(stream, title, generated_on, outlines, comment=None):
+    '''OPML of `outlines`, an iterable of dicts of outline attributes.'''
+    writer = XMLWriter(stream)
+    writer.start_document()
+    writer.start('opml', {'version': '1.0'})
+    writer.newline()
+    if comment:
+        writer.comment(comment)
+        writer.newline()
+    writer.start('head')
+    writer.element('title', title)
+    writer.element('dateCreated', generated_on)
+    writer.element('dateModified', generated_on)
+    writer.end('head', newline=True)
+    writer.start('body')
+    writer.newline()
+    for outline in outlines:
+        writer.element('outline', attrs=outline)
+        writer.newline()
+    writer.end('body', newline=True)
+    writer.end('opml', newline=True)
+    writer.end_document()
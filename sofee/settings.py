@@ -147,24 +147,180 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ROUTES = {
     'feeds.tasks.update_feed': {'queue': 'feed_queue'},
     'feeds.tasks.update_accounts_task': {'queue': 'default'},
+    'feeds.tasks.poll_accounts_task': {'queue': 'default'},
+    'feeds.tasks.poll_due_accounts_task': {'queue': 'default'},
+    'feeds.tasks.accounts_updated': {'queue': 'default'},
+    'feeds.tasks.polls_failed': {'queue': 'default'},
+    'feeds.tasks.compile_opml_task': {'queue': 'default'},
     'feeds.tasks.update_user_cache': {'queue': 'default'},
     'feeds.tasks.fetch_links': {'queue': 'fetch_link'},
+    'feeds.tasks.fetch_embeds': {'queue': 'fetch_link'},
+    'feeds.tasks.requeue_fetches_task': {'queue': 'default'},
+    'feeds.tasks.refresh_fetches_task': {'queue': 'default'},
+    'feeds.tasks.collect_content_task': {'queue': 'default'},
     'feeds.tasks.update_rss_task': {'queue': 'rss_queue'},
 }
 
 CELERY_TIMEZONE = 'Asia/Calcutta'
 CELERY_ENABLE_UTC = True
 CELERYBEAT_SCHEDULE = {
-    # Executes updates every 3 hours
+    # Syncs follows of all users every 2 hours
     'update-feeds': {
         'task': 'feeds.tasks.update_accounts_task',
         'schedule': crontab(minute='0', hour='*/2'),
     },
+    # Polls timelines of accounts which are due, see feeds.schedule
+    'poll-accounts': {
+        'task': 'feeds.tasks.poll_due_accounts_task',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Queues failed and lost link fetches again, see feeds.fetchstate
+    'requeue-fetches': {
+        'task': 'feeds.tasks.requeue_fetches_task',
+        'schedule': crontab(minute='*/15'),
+    },
+    # Fetches links which are still being shared again, see
+    # feeds.fetchstate
+    'refresh-fetches': {
+        'task': 'feeds.tasks.refresh_fetches_task',
+        'schedule': crontab(minute='45'),
+    },
+    # Deletes articles no content points to, see feeds.contentstore
+    'collect-content': {
+        'task': 'feeds.tasks.collect_content_task',
+        'schedule': crontab(minute='30', hour='3'),
+    },
 }
 
+# Number of TwitterAccounts polled by a single poll_accounts_task and
+# how many of their timelines are fetched at once
+ACCOUNTS_PER_TASK = 100
+TIMELINE_FETCH_CONCURRENCY = 10
+# Statuses asked for in a page of a timeline, 200 at most
+TIMELINE_COUNT = 200
+# Seconds for which progress counters of update_accounts_task are kept
+PROGRESS_TTL = 24 * 60 * 60
+# Task progress is written at most every PROGRESS_INTERVAL seconds
+# unless it moved by PROGRESS_STEP percent
+PROGRESS_INTERVAL = 2
+PROGRESS_STEP = 5
+REDIS_URL = BROKER_URL
+# Bounds in seconds of how often a timeline is polled, accounts are
+# polled after about POLL_STATUSES_PER_POLL statuses(measured over
+# POLL_RATE_WINDOW seconds) and back off by POLL_BACKOFF when a poll
+# finds nothing new.
+POLL_INTERVAL_MIN = 15 * 60
+POLL_INTERVAL_MAX = 24 * 60 * 60
+POLL_STATUSES_PER_POLL = 10
+POLL_RATE_WINDOW = 7 * 24 * 60 * 60
+POLL_BACKOFF = 2
+# Accounts dispatched for a poll aren't dispatched again for
+# POLL_LEASE seconds unless the poll is done, see feeds.schedule
+POLL_LEASE = 30 * 60
+# Content of links is extracted by up to EXTRACT_WORKERS node workers
+# per celery process, see feeds.extract. Workers are replaced after
+# EXTRACT_WORKER_MAX_JOBS links or once they grow past
+# EXTRACT_WORKER_MAX_RSS bytes. LINK_FETCH_TIMEOUT and EXTRACT_TIMEOUT
+# together stay below time_limit of fetch_links.
+EXTRACT_WORKER_COMMAND = ['node', os.path.join(BASE_DIR, 'feeds', 'static', 'js', 'extract_worker.js')]
+EXTRACT_WORKERS = 1
+EXTRACT_WORKER_MAX_JOBS = 500
+EXTRACT_WORKER_MAX_RSS = 300 * 1024 * 1024
+EXTRACT_TIMEOUT = 8
+EXTRACT_PING_INTERVAL = 60
+EXTRACT_PING_TIMEOUT = 2
+LINK_FETCH_TIMEOUT = 5
+# Bigger pages aren't downloaded, see feeds.download
+LINK_MAX_BYTES = 2 * 1024 * 1024
+# Validators of fetched links are cached for HTTP_CACHE_TTL seconds, for
+# at most HTTP_CACHE_MAX_ENTRIES links, see feeds.httpcache
+HTTP_CACHE_TTL = 30 * 24 * 60 * 60
+HTTP_CACHE_MAX_ENTRIES = 200000
+# zlib level of articles in the content store, see feeds.contentstore
+CONTENT_COMPRESS_LEVEL = 6
+# Articles no content points to any more(fetched again with changes)
+# are deleted CONTENT_GC_GRACE seconds after they were last stored,
+# CONTENT_GC_BATCH at a time
+CONTENT_GC_GRACE = 24 * 60 * 60
+CONTENT_GC_BATCH = 1000
+# Articles whose simhash differs in at most NEARDUP_DISTANCE bits are
+# near-duplicates, texts shorter than NEARDUP_MIN_WORDS aren't compared,
+# see feeds.neardup
+NEARDUP_DISTANCE = 3
+NEARDUP_MIN_WORDS = 50
+NEARDUP_MAX_CANDIDATES = 200
+# Feeds list links shared in last FEED_WINDOW seconds, rendered entries
+# are cached FEED_FRAGMENT_SLACK seconds longer, see feeds.feedcache
+FEED_WINDOW = 24 * 60 * 60
+FEED_FRAGMENT_SLACK = 60 * 60
+# Builds look for changes since FEED_CHANGE_SLACK seconds before the
+# last build, links are timestamped before their transaction commits
+FEED_CHANGE_SLACK = 10 * 60
+# Rows fetched at a time from server side cursors of feeds.feedquery
+FEED_CURSOR_ITERSIZE = 500
+# Links of a host are fetched at most HOST_CONCURRENCY at a time and
+# HOST_MIN_DELAY seconds apart, backing off up to HOST_MAX_BACKOFF
+# seconds while the host fails, see feeds.politeness
+HOST_CONCURRENCY = 2
+HOST_MIN_DELAY = 1
+HOST_MAX_BACKOFF = 10 * 60
+HOST_LEASE_TTL = 30
+# Failed link fetches are retried after FETCH_RETRY_AFTER seconds,
+# doubling up to FETCH_MAX_RETRY_AFTER, links are dead for
+# FETCH_DEAD_TTL seconds after FETCH_MAX_FAILURES failures in a row or
+# one of FETCH_PERMANENT_ERRORS. Queued ones are queued again if not
+# fetched in FETCH_STALE_AFTER seconds, FETCH_REQUEUE_BATCH at a time.
+# Links shared in last FETCH_REFRESH_WINDOW seconds are fetched again
+# once FETCH_REFRESH_AFTER seconds old. See feeds.fetchstate
+FETCH_RETRY_AFTER = 15 * 60
+FETCH_MAX_RETRY_AFTER = 24 * 60 * 60
+FETCH_MAX_FAILURES = 6
+FETCH_DEAD_TTL = 30 * 24 * 60 * 60
+FETCH_PERMANENT_ERRORS = (404, 410, 451)
+FETCH_STALE_AFTER = 6 * 60 * 60
+FETCH_REQUEUE_BATCH = 1000
+FETCH_REFRESH_AFTER = 6 * 60 * 60
+FETCH_REFRESH_WINDOW = 24 * 60 * 60
+# Hosts failing HOST_DEAD_AFTER times in a row aren't fetched for
+# HOST_DEAD_TTL seconds. Fetch counts of LINK_STATS_HOSTS worst hosts
+# are kept, see feeds.deadlinks
+HOST_DEAD_AFTER = 20
+HOST_DEAD_TTL = 24 * 60 * 60
+LINK_STATS_TTL = 30 * 24 * 60 * 60
+LINK_STATS_HOSTS = 10000
+# Rules of canonical urls, see feeds.canonical
+CANONICAL_DROP_PARAMS = ['utm_*', 'fbclid', 'gclid', 'dclid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'ref_src',
+                         'ref_url', 'smid', 'smtyp', 'cmpid', 'ocid', 'share', 'mbid', 'rss', 'feed_*']
+CANONICAL_HOST_ALIASES = {'mobile.twitter.com': 'twitter.com',
+                          'mobile.nytimes.com': 'nytimes.com'}
+CANONICAL_STRIP_HOST_PREFIXES = ['www.', 'm.', 'mobile.']
+SHORTENER_HOSTS = ['bit.ly', 'buff.ly', 'ow.ly', 'goo.gl', 'tinyurl.com', 'dlvr.it', 'ift.tt',
+                   'fb.me', 'trib.al', 'lnkd.in', 'wp.me', 'j.mp', 'po.st', 'shar.es']
+REDIRECT_TIMEOUT = 5
+REDIRECT_CACHE_TTL = 30 * 24 * 60 * 60
+
 # Twitter settings
 TWITTER_CONSUMER_KEY = get_env('TWITTER_CONSUMER_KEY')
 TWITTER_CONSUMER_SECRET = get_env('TWITTER_CONSUMER_SECRET')
+TWITTER_API_URL = 'https://api.twitter.com/1.1/'
+TWITTER_API_TIMEOUT = 30
+TWITTER_OEMBED_URL = 'https://publish.twitter.com/oembed'
+# Embeds of statuses are cached for OEMBED_CACHE_TTL seconds and fetched
+# OEMBED_BATCH statuses a task, OEMBED_CONCURRENCY at a time
+OEMBED_CACHE_TTL = 7 * 24 * 60 * 60
+OEMBED_BATCH = 50
+OEMBED_CONCURRENCY = 10
+# Calls allowed per token in a rate limit window, see
+# https://dev.twitter.com/rest/public/rate-limits
+TWITTER_RATE_LIMIT_WINDOW = 15 * 60
+TWITTER_RATE_LIMITS = {
+    'default': 15,
+    'account/verify_credentials': 75,
+    'friends/ids': 15,
+    'friends/list': 15,
+    'users/lookup': 900,
+    'statuses/user_timeline': 900,
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',